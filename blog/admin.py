@@ -1,6 +1,10 @@
+from django import forms
+from django.apps import apps
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Post, Comment, Page, SiteSettings, Media, Section, PageSection, Theme
+from taggit.admin import TagAdmin as BaseTagAdmin
+from taggit.models import Tag
+from .models import Category, Post, Comment, Page, SiteSettings, Media, Section, PageSection, Theme, TagPostCount
 
 
 @admin.register(Category)
@@ -9,9 +13,22 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
 
+
+admin.site.unregister(Tag)
+
+
+@admin.register(Tag)
+class TagAdmin(BaseTagAdmin):
+    list_display = ['name', 'slug', 'post_count']
+    list_select_related = ['post_stats']
+
     def post_count(self, obj):
-        return obj.posts.count()
+        try:
+            return obj.post_stats.post_count
+        except TagPostCount.DoesNotExist:
+            return 0
     post_count.short_description = 'Nº de Posts'
+    post_count.admin_order_field = 'post_stats__post_count'
 
 
 @admin.register(Post)
@@ -226,9 +243,23 @@ class SectionAdmin(admin.ModelAdmin):
             'fields': ('custom_html',),
             'classes': ('collapse',),
             'description': 'Use apenas se o tipo de seção for "HTML Customizado"'
+        }),
+        ('Produtos', {
+            'fields': ('products_category', 'products_featured', 'items_limit'),
+            'classes': ('collapse',),
+            'description': 'Use apenas se o tipo de seção for "Produtos"'
         })
     )
 
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        # Categoria escolhida em uma lista, quando o e-commerce está instalado
+        if db_field.name == 'products_category' and apps.is_installed('ecommerce'):
+            categories = apps.get_model('ecommerce', 'ProductCategory').objects.order_by('name')
+            kwargs['widget'] = forms.Select(choices=[('', 'Todas as categorias')] + list(
+                categories.values_list('slug', 'name')
+            ))
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
     def preview_image(self, obj):
         if obj.image:
             return format_html('<img src="{}" style="max-width: 80px; max-height: 80px;" />', obj.image.url)
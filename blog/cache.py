@@ -0,0 +1,144 @@
+"""
+Camada de cache do blog.
+
+Os dados globais do site (configurações, menu, categorias e tema) mudam poucas
+vezes por dia, mas são lidos em todas as requisições públicas. Eles ficam no
+cache do Django sob uma chave versionada; os signals em ``blog.signals``
+incrementam a versão sempre que um dos models envolvidos é alterado, o que
+invalida o contexto anterior sem precisar apagar chaves.
+
+A instância de ``SiteSettings`` e o tema ativo também são mantidos em memória
+em cada processo (``site_settings_cache``). Um contador de versão no cache
+compartilhado mantém todos os workers sincronizados: quando um processo salva
+as configurações, os demais percebem a versão nova na próxima leitura.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+SITE_CONTEXT_VERSION_KEY = 'blog:site_context:version'
+SITE_CONTEXT_KEY = 'blog:site_context:v{version}'
+SITE_SETTINGS_VERSION_KEY = 'blog:site_settings:version'
+
+
+def get_cache_timeout():
+    """Tempo de vida (em segundos) das entradas do cache do blog"""
+    return getattr(settings, 'BLOG_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def new_version():
+    """
+    Valor inicial de um contador de versão.
+
+    Usa o relógio em nanossegundos em vez de uma constante: se a chave for
+    descartada pelo cache, o contador recomeça num valor que nunca foi usado,
+    e entradas guardadas sob versões antigas não voltam a valer.
+    """
+    return time.time_ns()
+
+
+def get_version(key):
+    """Retorna a versão atual armazenada em ``key`` (cria a chave se não existir)"""
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    """Incrementa a versão armazenada em ``key``, invalidando as entradas antigas"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # A chave expirou ou o cache foi limpo: recomeça num valor inédito
+        version = new_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def build_site_context():
+    """Monta o contexto global do site direto do banco de dados"""
+    from .models import SiteSettings, Page, Category, Theme
+
+    return {
+        'site_settings': SiteSettings.get_settings(),
+        'menu_pages': list(Page.objects.filter(is_published=True, show_in_menu=True)),
+        'categories': list(Category.objects.filter(post_count__gt=0)),
+        'active_theme': Theme.get_active_theme(),
+    }
+
+
+def get_site_context():
+    """Retorna o contexto global do site, reconstruindo apenas quando a versão muda"""
+    version = get_version(SITE_CONTEXT_VERSION_KEY)
+    key = SITE_CONTEXT_KEY.format(version=version)
+
+    context = cache.get(key)
+    if context is None:
+        context = build_site_context()
+        cache.set(key, context, timeout=get_cache_timeout())
+
+    # Cópia rasa: as views adicionam chaves próprias ao dicionário retornado
+    return dict(context)
+
+
+def invalidate_site_context():
+    """Invalida o contexto global do site em todos os processos"""
+    bump_version(SITE_CONTEXT_VERSION_KEY)
+
+
+class SiteSettingsCache:
+    """Cache em memória, por processo, das configurações do site e do tema ativo"""
+
+    def __init__(self):
+        # RLock: carregar as configurações pode criá-las e disparar clear() no mesmo thread
+        self._lock = threading.RLock()
+        self._version = None
+        self._settings = None
+        self._theme = None
+        self._theme_loaded = False
+
+    def _sync(self):
+        """Descarta os valores locais se outro processo publicou uma versão nova"""
+        version = get_version(SITE_SETTINGS_VERSION_KEY)
+        if version != self._version:
+            self._version = version
+            self._settings = None
+            self._theme = None
+            self._theme_loaded = False
+
+    def get_settings(self):
+        """Retorna a instância única de SiteSettings"""
+        with self._lock:
+            self._sync()
+            if self._settings is None:
+                from .models import SiteSettings
+                self._settings = SiteSettings.load_settings()
+            return self._settings
+
+    def get_active_theme(self):
+        """Retorna o tema ativo já resolvido (pode ser None)"""
+        settings_obj = self.get_settings()
+        with self._lock:
+            if not self._theme_loaded:
+                from .models import Theme
+                self._theme = Theme.resolve_active_theme(settings_obj)
+                self._theme_loaded = True
+            return self._theme
+
+    def clear(self):
+        """Limpa os valores locais e invalida os dos outros processos"""
+        with self._lock:
+            bump_version(SITE_SETTINGS_VERSION_KEY)
+            self._version = None
+            self._settings = None
+            self._theme = None
+            self._theme_loaded = False
+
+
+site_settings_cache = SiteSettingsCache()
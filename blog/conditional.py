@@ -0,0 +1,122 @@
+"""
+GET condicional (``ETag``/``Last-Modified``) para as páginas públicas.
+
+Antes de renderizar, a view calcula um estado barato do que a página mostra
+(ex.: ``updated_at`` do objeto e número de comentários aprovados, ou o
+``updated_at`` mais recente e o total dos posts de uma listagem), ao qual se
+somam a versão do contexto global do site (``blog.cache``) e o caminho com a
+query string. Se o cliente já tem essa versão, a resposta é um 304 sem
+consultar o objeto completo nem tocar em templates.
+
+Como o cache de páginas, só vale para GET/HEAD anônimos e sem mensagens
+pendentes: páginas de usuários autenticados mudam com o usuário (menu, carrinho).
+Nas views com cache de páginas, os validadores ficam guardados junto com a
+página (``blog.page_cache``) e o estado só é calculado quando a página precisa
+ser renderizada.
+
+O ``Last-Modified`` vem apenas das datas do banco; alterações que não têm data
+(configurações do site, menu) mudam só o ``ETag``, que tem precedência quando o
+cliente envia os dois cabeçalhos.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import SITE_CONTEXT_VERSION_KEY, get_version
+from .page_cache import is_cacheable_request
+
+
+def latest(*dates):
+    """A data mais recente entre as informadas (ignorando None)"""
+    dates = [date for date in dates if date]
+    return max(dates) if dates else None
+
+
+def get_validators(request, state):
+    """Retorna (etag, last_modified em segundos) para o estado ``(última data, partes)``"""
+    last_modified, parts = state
+    version = repr((request.get_full_path(), get_version(SITE_CONTEXT_VERSION_KEY), parts))
+    etag = quote_etag(hashlib.md5(version.encode('utf-8')).hexdigest())
+    return etag, timegm(last_modified.utctimetuple()) if last_modified else None
+
+
+def set_validators(response, etag, last_modified):
+    if not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def evaluate_conditional(request, get_state, render, not_modified=None):
+    """
+    Responde 304 se o cliente já tem a versão atual; senão chama ``render()``.
+
+    ``get_state()`` retorna ``(última data, partes)`` ou None para pular a
+    verificação (ex.: objeto inexistente, que a view responde com 404).
+    """
+    if request.method not in ('GET', 'HEAD') or not is_cacheable_request(request):
+        return render()
+    state = get_state()
+    if state is None:
+        return render()
+
+    etag, last_modified = get_validators(request, state)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+    elif response.status_code == 304 and not_modified is not None:
+        not_modified(state)
+    return set_validators(response, etag, last_modified)
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional para views baseadas em classe.
+
+    A view implementa ``get_conditional_state()`` (com ``self.kwargs`` já
+    disponível) e, se precisar, ``not_modified(state)`` para o que deve
+    acontecer mesmo quando a resposta é 304. Deve vir depois de
+    ``PageCacheMixin``: uma página em cache já responde à revalidação com os
+    validadores guardados, e o estado só é calculado quando ela é renderizada.
+    """
+
+    def get_conditional_state(self):
+        """Retorna ``(última data, partes)`` do que a página mostra, ou None"""
+        return None
+
+    def not_modified(self, state):
+        pass
+
+    def dispatch(self, request, *args, **kwargs):
+        return evaluate_conditional(
+            request,
+            self.get_conditional_state,
+            lambda: super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs),
+            self.not_modified,
+        )
+
+
+def conditional_page(get_state, not_modified=None):
+    """
+    GET condicional para views funcionais.
+
+    ``get_state(request, *args, **kwargs)`` retorna ``(última data, partes)``
+    ou None; ``not_modified(request, state)`` roda quando a resposta é 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return evaluate_conditional(
+                request,
+                lambda: get_state(request, *args, **kwargs),
+                lambda: view(request, *args, **kwargs),
+                (lambda state: not_modified(request, state)) if not_modified else None,
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,74 @@
+"""
+Contagem desnormalizada de posts publicados por categoria e por tag.
+
+``Category.post_count`` e ``TagPostCount.post_count`` guardam quantos posts
+publicados cada categoria/tag possui, para que sidebars e listas do admin não
+precisem agregar a tabela de posts a cada requisição.
+
+Os contadores são recalculados (e não incrementados) apenas para as
+categorias/tags afetadas, dentro da mesma transação da alteração do post, pelos
+signals em ``blog.signals``. Alterações que não disparam signals (como
+``QuerySet.update()``) podem ser corrigidas com o comando ``recount_posts``.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from taggit.models import Tag, TaggedItem
+
+
+def get_post_tag_ids(post):
+    """Ids das tags atualmente associadas ao post"""
+    if post.pk is None:
+        return set()
+    return set(post.tags.values_list('pk', flat=True))
+
+
+def recount_categories(pks=None):
+    """Recalcula ``post_count`` das categorias informadas (todas, se ``pks`` for None)"""
+    from .models import Category, Post
+
+    published = Post.objects.filter(
+        status='published', category=OuterRef('pk')
+    ).order_by().values('category').annotate(total=Count('pk')).values('total')
+
+    queryset = Category.objects.all()
+    if pks is not None:
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return 0
+        queryset = queryset.filter(pk__in=pks)
+    with transaction.atomic():
+        return queryset.update(post_count=Coalesce(Subquery(published), Value(0)))
+
+
+def recount_tags(pks=None):
+    """Recalcula ``TagPostCount`` das tags informadas (todas, se ``pks`` for None)"""
+    from .models import Post, TagPostCount
+
+    tags = Tag.objects.all()
+    items = TaggedItem.objects.all()
+    if pks is not None:
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return 0
+        tags = tags.filter(pk__in=pks)
+        items = items.filter(tag_id__in=pks)
+    tag_ids = list(tags.values_list('pk', flat=True))
+
+    counts = dict(
+        items.filter(
+            content_type__app_label=Post._meta.app_label,
+            content_type__model=Post._meta.model_name,
+            object_id__in=Post.objects.filter(status='published').values('pk'),
+        ).order_by().values('tag_id').annotate(total=Count('pk')).values_list('tag_id', 'total')
+    )
+
+    with transaction.atomic():
+        TagPostCount.objects.bulk_create(
+            [TagPostCount(tag_id=pk, post_count=counts.get(pk, 0)) for pk in tag_ids],
+            update_conflicts=True,
+            unique_fields=['tag'],
+            update_fields=['post_count'],
+            batch_size=500,
+        )
+    return len(tag_ids)
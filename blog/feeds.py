@@ -0,0 +1,247 @@
+"""
+Feeds RSS e Atom dos posts (todos, por categoria e por tag).
+
+As views de feed respondem a GETs condicionais: o ``ETag`` e o
+``Last-Modified`` vêm do ``updated_at`` mais recente (e do número de posts)
+do conjunto do feed, calculados com uma única agregação antes de montar o
+feed; se nada mudou o leitor recebe 304 sem que os posts sejam carregados.
+Como em ``blog.conditional``, o ``ETag`` também inclui a versão do contexto
+global do site, para que uma mudança no nome ou na descrição do site (que
+estão no cabeçalho do feed) não seja respondida com 304.
+
+O XML é enviado por uma ``StreamingHttpResponse``: o cabeçalho do feed, cada
+item e o fechamento são gerados sob demanda, sem montar o documento inteiro
+na memória. Os itens (no máximo ``FEED_ITEMS``) são lidos do banco antes do
+envio, como no ``Feed`` do Django.
+"""
+import hashlib
+import io
+
+from django.contrib.syndication.views import Feed
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import http_date
+from django.utils.xmlutils import SimplerXMLGenerator
+from django.views.decorators.http import condition
+from taggit.models import Tag
+
+from .cache import SITE_CONTEXT_VERSION_KEY, get_version
+from .models import Category, Post, SiteSettings
+
+
+FEED_ITEMS = 20
+
+
+def get_feed_queryset(category_slug=None, tag_slug=None):
+    """Posts publicados de um feed"""
+    queryset = Post.objects.filter(status='published')
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    if tag_slug:
+        queryset = queryset.filter(tags__slug=tag_slug)
+    return queryset
+
+
+def get_feed_freshness(request, category_slug=None, tag_slug=None):
+    """Retorna (último updated_at, ETag) do feed, calculados uma vez por requisição"""
+    key = ('feed', category_slug, tag_slug)
+    cached = getattr(request, '_feed_freshness', {})
+    if key not in cached:
+        info = get_feed_queryset(category_slug, tag_slug).aggregate(
+            last_modified=Max('updated_at'), total=Count('pk')
+        )
+        last_modified = info['last_modified']
+        version = repr((
+            request.path, get_version(SITE_CONTEXT_VERSION_KEY),
+            last_modified.isoformat() if last_modified else '', info['total'],
+        ))
+        cached[key] = (last_modified, hashlib.md5(version.encode('utf-8')).hexdigest())
+        request._feed_freshness = cached
+    return cached[key]
+
+
+def conditional_feed(feed, scope=None):
+    """Envolve um feed com ETag/Last-Modified (``scope``: 'category', 'tag' ou None)"""
+    def freshness(request, slug=None):
+        return get_feed_freshness(request, **({f'{scope}_slug': slug} if scope else {}))
+
+    return condition(
+        etag_func=lambda request, **kwargs: freshness(request, **kwargs)[1],
+        last_modified_func=lambda request, **kwargs: freshness(request, **kwargs)[0],
+    )(feed)
+
+
+class StreamingFeedMixin:
+    """Gera o XML do feed em partes: abertura e elementos do feed, um item por vez, fechamento"""
+
+    item_element = None
+
+    def start_root(self, handler):
+        raise NotImplementedError
+
+    def end_root(self, handler):
+        raise NotImplementedError
+
+    def stream(self, encoding='utf-8'):
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(buffer, encoding, short_empty_elements=True)
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk.encode(encoding)
+
+        handler.startDocument()
+        self.start_root(handler)
+        yield flush()
+        for item in self.items:
+            handler.startElement(self.item_element, self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield flush()
+        self.end_root(handler)
+        yield flush()
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    """RSS 2.0 (mesmo XML de ``Rss201rev2Feed.write``)"""
+
+    item_element = 'item'
+
+    def start_root(self, handler):
+        self.add_stylesheets(handler)
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_root(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    """Atom 1.0 (mesmo XML de ``Atom1Feed.write``)"""
+
+    item_element = 'entry'
+
+    def start_root(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_root(self, handler):
+        handler.endElement('feed')
+
+
+class LatestPostsFeed(Feed):
+    """Últimos posts publicados (RSS 2.0)"""
+
+    feed_type = StreamingRssFeed
+
+    def __call__(self, request, *args, **kwargs):
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404('Feed object does not exist.')
+        feedgen = self.get_feed(obj, request)
+        response = StreamingHttpResponse(feedgen.stream('utf-8'), content_type=feedgen.content_type)
+        response['Last-Modified'] = http_date(feedgen.latest_post_date().timestamp())
+        return response
+
+    def title(self):
+        return SiteSettings.get_settings().site_name
+
+    def description(self):
+        return SiteSettings.get_settings().site_description
+
+    def link(self):
+        return reverse('blog:post_list')
+
+    def get_queryset(self, obj):
+        return get_feed_queryset()
+
+    def items(self, obj=None):
+        return self.get_queryset(obj).select_related('author').prefetch_related('tags').defer(
+            'content', 'plain_text'
+        ).order_by('-published_at')[:FEED_ITEMS]
+
+    def item_title(self, post):
+        return post.title
+
+    def item_description(self, post):
+        return post.excerpt
+
+    def item_pubdate(self, post):
+        return post.published_at
+
+    def item_updateddate(self, post):
+        return post.updated_at
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [tag.name for tag in post.tags.all()]
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = StreamingAtomFeed
+
+    def subtitle(self):
+        return self.description()
+
+
+class CategoryPostsFeed(LatestPostsFeed):
+    """Últimos posts de uma categoria"""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Category, slug=slug)
+
+    def title(self, category):
+        return f'{SiteSettings.get_settings().site_name} - {category.name}'
+
+    def description(self, category=None):
+        return category.description if category else ''
+
+    def link(self, category):
+        return category.get_absolute_url()
+
+    def get_queryset(self, category):
+        return get_feed_queryset(category_slug=category.slug)
+
+
+class CategoryPostsAtomFeed(CategoryPostsFeed):
+    feed_type = StreamingAtomFeed
+
+    def subtitle(self, category):
+        return self.description(category)
+
+
+class TagPostsFeed(LatestPostsFeed):
+    """Últimos posts de uma tag"""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Tag, slug=slug)
+
+    def title(self, tag):
+        return f'{SiteSettings.get_settings().site_name} - #{tag.name}'
+
+    def description(self, tag=None):
+        return f'Posts com a tag {tag.name}' if tag else ''
+
+    def link(self, tag):
+        return reverse('blog:tag', kwargs={'slug': tag.slug})
+
+    def get_queryset(self, tag):
+        return get_feed_queryset(tag_slug=tag.slug)
+
+
+class TagPostsAtomFeed(TagPostsFeed):
+    feed_type = StreamingAtomFeed
+
+    def subtitle(self, tag):
+        return self.description(tag)
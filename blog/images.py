@@ -0,0 +1,246 @@
+"""
+Versões redimensionadas (renditions) das imagens enviadas.
+
+Ao salvar um model com uma imagem nova em algum ``ImageField``, a imagem
+original é redimensionada para
+as larguras de ``RESPONSIVE_IMAGE_WIDTHS`` nos formatos de
+``RESPONSIVE_IMAGE_FORMATS`` (WebP e JPEG). As versões ficam ao lado do
+original, no mesmo storage: ``posts/2024/05/foto.jpg`` gera
+``posts/2024/05/foto.640w.webp``, ``posts/2024/05/foto.640w.jpg`` etc.
+
+O processamento roda em um pool de processos (``RESPONSIVE_IMAGE_WORKERS``)
+para não atrasar o upload; com ``RESPONSIVE_IMAGE_WORKERS = 0`` ele é feito
+na própria requisição. Imagens já existentes podem ser processadas com o
+comando ``generate_renditions`` (ver ``process_renditions``).
+
+A template tag ``{% responsive_image %}`` (em ``blog_tags``) monta o
+``<picture>`` com ``srcset``/``sizes`` a partir das versões disponíveis.
+"""
+import atexit
+import logging
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import bump_version, get_version
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow é exigido pelo ImageField
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_KEY = 'renditions:v{version}:{name}'
+RENDITIONS_VERSION_KEY = 'renditions:version:{name}'
+
+# Uma lista vazia ("ainda não gerado") vale só por pouco tempo: com cache por
+# processo, a geração feita em outro processo não tem como substituí-la
+EMPTY_RENDITIONS_TIMEOUT = 60
+
+# Tag EXIF de orientação; nos valores 5 a 8 a foto está girada 90°
+ORIENTATION_TAG = 0x0112
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Extensão e formato do Pillow de cada formato configurável
+FORMATS = {
+    'webp': ('.webp', 'WEBP', 'image/webp'),
+    'jpeg': ('.jpg', 'JPEG', 'image/jpeg'),
+}
+
+_executor = None
+
+
+def get_widths():
+    return sorted(getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', [320, 640, 960, 1280]))
+
+
+def get_formats():
+    return [fmt for fmt in getattr(settings, 'RESPONSIVE_IMAGE_FORMATS', ['webp', 'jpeg']) if fmt in FORMATS]
+
+
+def get_quality():
+    return getattr(settings, 'RESPONSIVE_IMAGE_QUALITY', 80)
+
+
+def get_rendition_name(name, width, fmt):
+    """Caminho da versão de ``name`` com a largura e o formato informados"""
+    root, _ = posixpath.splitext(name)
+    return f'{root}.{width}w{FORMATS[fmt][0]}'
+
+
+def is_rendition(name):
+    """Indica se o arquivo é uma versão gerada (e não um original)"""
+    root, ext = posixpath.splitext(name)
+    suffix = root.rsplit('.', 1)[-1]
+    return suffix.endswith('w') and suffix[:-1].isdigit() and ext in {e for e, _, _ in FORMATS.values()}
+
+
+def _encode(image, fmt, quality):
+    _, pil_format, _ = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        # JPEG não tem canal alfa: compõe sobre fundo branco
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(name, widths=None, formats=None, quality=None):
+    """
+    Gera as versões que ainda não existem de ``name`` e retorna a lista
+    ``[(formato, largura, caminho)]`` de todas as versões disponíveis.
+    """
+    widths = widths or get_widths()
+    formats = formats or get_formats()
+    quality = quality or get_quality()
+
+    with default_storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        # Nunca amplia: larguras maiores que o original são ignoradas
+        targets = [
+            (fmt, target, get_rendition_name(name, target, fmt))
+            for target in widths if target < width
+            for fmt in formats
+        ]
+        missing = [target for target in targets if not default_storage.exists(target[2])]
+        if missing:
+            # Só decodifica a imagem se alguma versão precisar ser gerada
+            image.load()
+    if not missing:
+        return targets
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    resized = {}
+    for fmt, target, rendition in missing:
+        if target not in resized:
+            resized[target] = image.resize((target, round(height * target / width)), Image.LANCZOS)
+        default_storage.save(rendition, ContentFile(_encode(resized[target], fmt, quality)))
+    return targets
+
+
+def _init_worker():
+    # Com o método "spawn" (Windows/macOS) o processo filho começa sem o Django
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _worker(name):
+    return generate_renditions(name)
+
+
+def get_executor():
+    """Pool de processos compartilhado (criado no primeiro uso)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'RESPONSIVE_IMAGE_WORKERS', 2),
+            initializer=_init_worker,
+        )
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def _get_renditions_key(name, version=None):
+    if version is None:
+        version = get_version(RENDITIONS_VERSION_KEY.format(name=name))
+    return RENDITIONS_KEY.format(version=version, name=name)
+
+
+def _store(name, available):
+    # Versão nova: a lista consultada antes da geração (vazia ou parcial) deixa de valer
+    version = bump_version(RENDITIONS_VERSION_KEY.format(name=name))
+    cache.set(_get_renditions_key(name, version), available, timeout=None if available else EMPTY_RENDITIONS_TIMEOUT)
+
+
+def schedule_renditions(name):
+    """Agenda a geração das versões de ``name`` (no pool ou imediatamente)"""
+    if Image is None or not name or is_rendition(name):
+        return
+    if not getattr(settings, 'RESPONSIVE_IMAGE_WORKERS', 2):
+        try:
+            _store(name, generate_renditions(name))
+        except Exception:
+            logger.exception('Falha ao gerar as versões de %s', name)
+        return
+
+    def done(future):
+        try:
+            _store(name, future.result())
+        except Exception:
+            logger.exception('Falha ao gerar as versões de %s', name)
+
+    get_executor().submit(_worker, name).add_done_callback(done)
+
+
+def process_renditions(names, workers=None):
+    """
+    Gera as versões de ``names`` em um pool de ``workers`` processos e registra
+    as listas no cache; gera ``(nome, exceção ou None)`` na ordem de ``names``.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [(name, executor.submit(_worker, name)) for name in names]
+        for name, future in futures:
+            try:
+                _store(name, future.result())
+            except Exception as exc:
+                yield name, exc
+            else:
+                yield name, None
+
+
+def get_renditions(name):
+    """
+    Retorna ``[(formato, largura, caminho)]`` das versões de ``name`` já geradas.
+
+    A lista fica no cache; se não estiver lá (outro processo gerou as versões,
+    ou o cache foi limpo), ela é montada verificando o storage. A chave inclui
+    uma versão incrementada a cada geração, que substitui a lista anterior; uma
+    lista vazia expira em ``EMPTY_RENDITIONS_TIMEOUT`` segundos, para que as
+    versões geradas em outro processo apareçam mesmo com cache por processo.
+    """
+    key = _get_renditions_key(name)
+    available = cache.get(key)
+    if available is None:
+        available = [
+            (fmt, width, get_rendition_name(name, width, fmt))
+            for width in get_widths()
+            for fmt in get_formats()
+            if default_storage.exists(get_rendition_name(name, width, fmt))
+        ]
+        # add(): não sobrescreve a lista gravada por uma geração que terminou nesse meio tempo
+        cache.add(key, available, timeout=None if available else EMPTY_RENDITIONS_TIMEOUT)
+    return available
+
+
+def iter_image_fields(model):
+    """ImageFields de um model"""
+    from django.db.models import ImageField
+
+    return [field for field in model._meta.get_fields() if isinstance(field, ImageField)]
+
+
+def get_image_names(instance):
+    """Arquivos das imagens do objeto: ``{attname: nome}``"""
+    return {
+        field.attname: getattr(instance, field.attname).name or ''
+        for field in iter_image_fields(type(instance))
+    }
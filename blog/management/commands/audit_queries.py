@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.query_audit import PROBLEM_LABELS, PROBLEM_PATTERNS, get_targets
+
+
+class Command(BaseCommand):
+    help = (
+        'Requisita as views públicas, mostra o plano de execução (EXPLAIN) das consultas executadas '
+        'e aponta varreduras completas de tabela e ordenações sem índice'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-fail', action='store_true',
+            help='Apenas relata os problemas, sem terminar com erro',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in PROBLEM_PATTERNS:
+            self.stdout.write(self.style.WARNING(
+                f'Banco "{connection.vendor}" sem padrões conhecidos: os planos são exibidos sem análise.'
+            ))
+
+        failures = 0
+        for target in get_targets():
+            result = target.run()
+            problems = result.problems
+            if result.error:
+                self.stdout.write(self.style.WARNING(f'? {target.label}: {result.error}'))
+            elif problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'✗ {target.label}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {target.label} ({len(result.queries)} consulta(s))'))
+
+            for sql, plan, query_problems in result.queries:
+                if not query_problems and options['verbosity'] < 2:
+                    continue
+                self.stdout.write(f'    {sql[:200]}')
+                for kind, line in query_problems:
+                    self.stdout.write(f'      {PROBLEM_LABELS[kind]}: {line}')
+                if options['verbosity'] > 1:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'        {line}')
+
+        if failures and not options['no_fail']:
+            raise CommandError(f'{failures} página(s) com consultas sem índice adequado.')
+        self.stdout.write(self.style.SUCCESS('Auditoria concluída.'))
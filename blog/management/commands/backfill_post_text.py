@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+from blog.text import make_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Calcula texto puro, resumo, nº de palavras e tempo de leitura dos posts existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Quantidade de posts processados por transação (padrão: 500)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fields = ['plain_text', 'word_count', 'reading_time', 'excerpt', 'meta_description']
+        total = 0
+        last_pk = 0
+
+        while True:
+            posts = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'content', 'excerpt', 'meta_description')[:chunk_size]
+            )
+            if not posts:
+                break
+
+            for post in posts:
+                post.update_derived_text()
+                # Resumos gerados pela versão antiga eram os 200 primeiros caracteres do HTML
+                if not post.excerpt or post.excerpt == post.content[:200]:
+                    if not post.meta_description or post.meta_description == post.excerpt:
+                        post.meta_description = make_excerpt(post.plain_text, 160)
+                    post.excerpt = make_excerpt(post.plain_text)
+
+            with transaction.atomic():
+                Post.objects.bulk_update(posts, fields)
+
+            total += len(posts)
+            last_pk = posts[-1].pk
+            self.stdout.write(f'{total} post(s) processado(s)...')
+
+        self.stdout.write(self.style.SUCCESS(f'Texto derivado atualizado em {total} post(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.storage import collect_unreferenced_blobs
+
+
+class Command(BaseCommand):
+    help = 'Apaga os blobs do storage endereçado por conteúdo que ficaram sem referências'
+
+    def handle(self, *args, **options):
+        total = collect_unreferenced_blobs()
+        self.stdout.write(self.style.SUCCESS(f'{total} blob(s) apagado(s).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog import related
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os posts relacionados de todos os posts publicados'
+
+    def handle(self, *args, **options):
+        count = related.rebuild_related_posts()
+        method = 'NumPy' if related.numpy is not None else 'Python puro'
+        self.stdout.write(self.style.SUCCESS(
+            f'Posts relacionados calculados para {count} post(s) ({method}).'
+        ))
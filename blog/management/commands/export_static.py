@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.static_export import export_site, get_output_dir
+
+
+class Command(BaseCommand):
+    help = 'Exporta o conteúdo publicado como HTML estático, renderizando só o que mudou'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=None,
+            help='Diretório de saída (padrão: STATIC_EXPORT_ROOT ou static_export/)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Processos de renderização (padrão: nº de CPUs; 0 renderiza neste processo)',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host usado nas URLs absolutas das páginas (padrão: localhost)',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Ignora o manifesto e renderiza tudo de novo',
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output'] or get_output_dir()
+        rendered, removed, errors = export_site(
+            output_dir, workers=options['workers'], host=options['host'], force=options['force']
+        )
+        if options['verbosity'] > 1:
+            for path in rendered:
+                self.stdout.write(f'Renderizado: {path}')
+            for path in removed:
+                self.stdout.write(f'Removido: {path}')
+        for path, error in errors:
+            self.stderr.write(self.style.ERROR(f'{path}: {error}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(rendered)} arquivo(s) renderizado(s), {len(removed)} removido(s) em {output_dir}.'
+        ))
+        if errors:
+            raise CommandError(f'{len(errors)} caminho(s) com erro.')
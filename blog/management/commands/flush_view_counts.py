@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.view_counter import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco as visualizações de posts e produtos acumuladas no cache'
+
+    def handle(self, *args, **options):
+        total = flush_views()
+        if total is None:
+            self.stdout.write(self.style.WARNING('Outro processo já está gravando as visualizações.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'{total} visualização(ões) gravada(s).'))
@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from blog.images import iter_image_fields, process_renditions
+
+
+class Command(BaseCommand):
+    help = 'Gera as versões responsivas (WebP/JPEG) de todas as imagens já enviadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Número de processos (padrão: número de CPUs)')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in apps.get_models():
+            for field in iter_image_fields(model):
+                names.update(
+                    name for name in model._default_manager.exclude(**{field.attname: ''})
+                    .exclude(**{f'{field.attname}__isnull': True}).values_list(field.attname, flat=True)
+                )
+
+        names = sorted(names)
+        failed = 0
+        for name, error in process_renditions(names, workers=options['workers']):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names) - failed} imagem(ns) processada(s), {failed} com erro.'
+        ))
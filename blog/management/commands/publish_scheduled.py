@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from blog.scheduler import BATCH_SIZE, get_next_publication, publish_due_posts
+
+
+class Command(BaseCommand):
+    help = 'Publica os posts agendados cuja data de publicação já chegou'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Continua rodando e publica cada post agendado quando chegar a hora',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=60,
+            help='Intervalo máximo (segundos) entre verificações no modo --loop (padrão: 60)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Posts publicados por transação (padrão: {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            total = self.publish(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{total} post(s) publicado(s).'))
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                self.publish(options['batch_size'])
+                time.sleep(self.get_sleep_time(options['interval']))
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
+
+    def publish(self, batch_size):
+        total = 0
+        while True:
+            posts = publish_due_posts(batch_size=batch_size)
+            for post in posts:
+                self.stdout.write(f'Publicado: {post.title}')
+            total += len(posts)
+            if len(posts) < batch_size:
+                return total
+
+    def get_sleep_time(self, interval):
+        """Dorme até o próximo post agendado, no máximo ``interval`` segundos"""
+        next_publication = get_next_publication()
+        if next_publication is None:
+            return interval
+        return min(interval, max(1, (next_publication - timezone.now()).total_seconds()))
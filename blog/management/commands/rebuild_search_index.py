@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca com todos os posts publicados'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild(Post.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} post(s) indexado(s) com {backend.__class__.__name__}.'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import recount_categories, recount_tags
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o número de posts publicados de todas as categorias e tags'
+
+    def handle(self, *args, **options):
+        categories = recount_categories()
+        tags = recount_tags()
+        self.stdout.write(self.style.SUCCESS(
+            f'Contagens recalculadas: {categories} categoria(s), {tags} tag(s).'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_alter_section_section_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='theme',
+            name='css_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Hash do CSS'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+import html
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def html_to_text(value):
+    # Cópia congelada de blog.text.html_to_text: a migração não depende do código do app
+    text = html.unescape(strip_tags(value or ''))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def create_fts_table(apps, schema_editor):
+    """Cria a tabela FTS5 de busca de posts (apenas em SQLite) e indexa os posts publicados"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5("
+        "title, excerpt, body, tokenize='unicode61 remove_diacritics 2')"
+    )
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.filter(status='published').iterator(chunk_size=500):
+        schema_editor.execute(
+            'INSERT INTO blog_post_fts (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+            [post.pk, post.title, html_to_text(post.excerpt), html_to_text(post.content)]
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS blog_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_theme_css_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_post_counts(apps, schema_editor):
+    """Calcula os contadores iniciais de posts publicados"""
+    Category = apps.get_model('blog', 'Category')
+    Post = apps.get_model('blog', 'Post')
+    TagPostCount = apps.get_model('blog', 'TagPostCount')
+    Tag = apps.get_model('taggit', 'Tag')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+
+    published = Post.objects.filter(status='published')
+    category_counts = published.order_by().values('category').annotate(total=Count('pk'))
+    for row in category_counts:
+        if row['category'] is not None:
+            Category.objects.filter(pk=row['category']).update(post_count=row['total'])
+
+    tag_counts = dict(
+        TaggedItem.objects.filter(
+            content_type__app_label='blog',
+            content_type__model='post',
+            object_id__in=published.values('pk'),
+        ).order_by().values('tag_id').annotate(total=Count('pk')).values_list('tag_id', 'total')
+    )
+    TagPostCount.objects.bulk_create(
+        [TagPostCount(tag_id=pk, post_count=tag_counts.get(pk, 0)) for pk in Tag.objects.values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_backfill_post_published_at'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagPostCount',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='post_stats', serialize=False, to='taggit.tag', verbose_name='Tag')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Nº de Posts')),
+            ],
+            options={
+                'verbose_name': 'Contagem de Posts por Tag',
+                'verbose_name_plural': 'Contagens de Posts por Tag',
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Nº de Posts'),
+        ),
+        migrations.RunPython(fill_post_counts, migrations.RunPython.noop),
+    ]
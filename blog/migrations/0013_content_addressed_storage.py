@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:30
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_derived_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Caminho')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Tamanho')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Tipo MIME')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Referências')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Arquivo Armazenado',
+                'verbose_name_plural': 'Arquivos Armazenados',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='media',
+            name='file',
+            field=models.FileField(storage=blog.storage.get_content_storage, upload_to='media/%Y/%m/%d/', verbose_name='Arquivo'),
+        ),
+        migrations.AlterField(
+            model_name='page',
+            name='featured_image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='pages/', verbose_name='Imagem Destacada'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='featured_image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='posts/%Y/%m/%d/', verbose_name='Imagem Destacada'),
+        ),
+        migrations.AlterField(
+            model_name='section',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='sections/', verbose_name='Imagem'),
+        ),
+        migrations.AlterField(
+            model_name='sitesettings',
+            name='site_favicon',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='site/', verbose_name='Favicon'),
+        ),
+        migrations.AlterField(
+            model_name='sitesettings',
+            name='site_logo',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='site/', verbose_name='Logo do Site'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='section',
+            name='items_limit',
+            field=models.PositiveSmallIntegerField(default=15, verbose_name='Quantidade de Itens'),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='products_category',
+            field=models.SlugField(blank=True, help_text='Vazio mostra produtos de todas as categorias', max_length=100, verbose_name='Categoria de Produtos'),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='products_featured',
+            field=models.BooleanField(default=False, verbose_name='Apenas Produtos em Destaque'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_section_product_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPostFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('term', 'Termo'), ('tag', 'Tag')], max_length=10, verbose_name='Tipo')),
+                ('key', models.CharField(max_length=100, verbose_name='Chave')),
+                ('idf', models.FloatField(verbose_name='IDF')),
+            ],
+            options={
+                'verbose_name': 'Feature dos Posts Relacionados',
+                'verbose_name_plural': 'Features dos Posts Relacionados',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='blog_relatedpostfeature_unique')],
+            },
+        ),
+    ]
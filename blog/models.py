@@ -1,9 +1,17 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 from ckeditor_uploader.fields import RichTextUploadingField
 from taggit.managers import TaggableManager
+from taggit.models import Tag
+
+from .storage import get_content_storage, sniff_file
+from .text import count_words, get_reading_time, html_to_text, make_excerpt
+from .theme_css import compile_theme_css
 
 
 class Category(models.Model):
@@ -11,6 +19,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nome")
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True, verbose_name="Descrição")
+    # Mantido por blog.counters (posts publicados)
+    post_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Nº de Posts")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
 
     class Meta:
@@ -43,7 +53,11 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', verbose_name="Autor")
     content = RichTextUploadingField(verbose_name="Conteúdo")
     excerpt = models.TextField(max_length=500, blank=True, verbose_name="Resumo")
-    featured_image = models.ImageField(upload_to='posts/%Y/%m/%d/', blank=True, null=True, verbose_name="Imagem Destacada")
+    # Derivados do conteúdo em save() (ver blog.text)
+    plain_text = models.TextField(blank=True, editable=False, verbose_name="Texto puro")
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Nº de palavras")
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Tempo de leitura (min)")
+    featured_image = models.ImageField(upload_to='posts/%Y/%m/%d/', storage=get_content_storage, blank=True, null=True, verbose_name="Imagem Destacada")
 
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts', verbose_name="Categoria")
     tags = TaggableManager(blank=True, verbose_name="Tags")
@@ -66,18 +80,42 @@ class Post(models.Model):
         verbose_name = "Post"
         verbose_name_plural = "Posts"
         ordering = ['-published_at', '-created_at']
+        indexes = [
+            # Listagens (status='published' por data) e publicação agendada (blog.scheduler)
+            models.Index(fields=['status', 'published_at'], name='blog_post_status_pub_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        if not self.excerpt and self.content:
-            self.excerpt = self.content[:200]
+        # Texto derivado do conteúdo, gravado uma vez aqui em vez de a cada renderização
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.update_derived_text()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'plain_text', 'word_count', 'reading_time'}
+        if not self.excerpt and self.plain_text:
+            self.excerpt = make_excerpt(self.plain_text)
         if not self.meta_title:
             self.meta_title = self.title
         if not self.meta_description:
-            self.meta_description = self.excerpt
+            self.meta_description = make_excerpt(self.excerpt, 160)
+        # Listagens e paginação por cursor dependem de published_at
+        if self.status == 'published' and not self.published_at:
+            self.published_at = timezone.now()
         super().save(*args, **kwargs)
 
+    def clean(self):
+        # Sem data o post agendado nunca seria publicado (ver blog.scheduler)
+        if self.status == 'scheduled' and not self.published_at:
+            raise ValidationError({'published_at': 'Informe a data de publicação do post agendado.'})
+
+    def update_derived_text(self):
+        """Recalcula texto puro, nº de palavras e tempo de leitura a partir do conteúdo"""
+        self.plain_text = html_to_text(self.content)
+        self.word_count = count_words(self.plain_text)
+        self.reading_time = get_reading_time(self.word_count)
+
     def __str__(self):
         return self.title
 
@@ -85,6 +123,63 @@ class Post(models.Model):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
 
 
+class RelatedPost(models.Model):
+    """Posts relacionados pré-calculados (mantidos por blog.related)"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_posts', verbose_name="Post")
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_from', verbose_name="Relacionado")
+    score = models.FloatField(verbose_name="Pontuação")
+    rank = models.PositiveSmallIntegerField(verbose_name="Posição")
+
+    class Meta:
+        verbose_name = "Post Relacionado"
+        verbose_name_plural = "Posts Relacionados"
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='blog_relatedpost_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['post', 'rank'], name='blog_relatedpost_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} → {self.related}'
+
+
+class RelatedPostFeature(models.Model):
+    """IDF dos termos e tags do último cálculo completo dos posts relacionados (mantido por blog.related)"""
+    KIND_CHOICES = [
+        ('term', 'Termo'),
+        ('tag', 'Tag'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Tipo")
+    key = models.CharField(max_length=100, verbose_name="Chave")
+    idf = models.FloatField(verbose_name="IDF")
+
+    class Meta:
+        verbose_name = "Feature dos Posts Relacionados"
+        verbose_name_plural = "Features dos Posts Relacionados"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='blog_relatedpostfeature_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.key} ({self.idf:.3f})'
+
+
+class TagPostCount(models.Model):
+    """Nº de posts publicados por tag (mantido por blog.counters)"""
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name='post_stats', verbose_name="Tag")
+    post_count = models.PositiveIntegerField(default=0, verbose_name="Nº de Posts")
+
+    class Meta:
+        verbose_name = "Contagem de Posts por Tag"
+        verbose_name_plural = "Contagens de Posts por Tag"
+
+    def __str__(self):
+        return f'{self.tag.name} ({self.post_count})'
+
+
 class Comment(models.Model):
     """Comentários em posts"""
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', verbose_name="Post")
@@ -101,6 +196,12 @@ class Comment(models.Model):
         verbose_name = "Comentário"
         verbose_name_plural = "Comentários"
         ordering = ['created_at']
+        indexes = [
+            # Comentários aprovados de um post, em ordem de criação (PostDetailView).
+            # Parcial: no SQLite, filter(is_approved=True) vira WHERE "is_approved",
+            # que só aproveita um índice com a mesma condição
+            models.Index(fields=['post', 'created_at'], condition=Q(is_approved=True), name='blog_comment_approved_idx'),
+        ]
 
     def __str__(self):
         return f'Comentário de {self.get_author_name()} em {self.post.title}'
@@ -118,7 +219,7 @@ class Page(models.Model):
     content = RichTextUploadingField(verbose_name="Conteúdo")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pages', verbose_name="Autor")
 
-    featured_image = models.ImageField(upload_to='pages/', blank=True, null=True, verbose_name="Imagem Destacada")
+    featured_image = models.ImageField(upload_to='pages/', storage=get_content_storage, blank=True, null=True, verbose_name="Imagem Destacada")
 
     is_published = models.BooleanField(default=True, verbose_name="Publicado")
     show_in_menu = models.BooleanField(default=False, verbose_name="Mostrar no Menu")
@@ -183,7 +284,7 @@ class Section(models.Model):
     content = RichTextUploadingField(blank=True, verbose_name="Conteúdo")
 
     # Imagens
-    image = models.ImageField(upload_to='sections/', blank=True, null=True, verbose_name="Imagem")
+    image = models.ImageField(upload_to='sections/', storage=get_content_storage, blank=True, null=True, verbose_name="Imagem")
     image_position = models.CharField(max_length=10, choices=[('left', 'Esquerda'), ('right', 'Direita')], default='right', verbose_name="Posição da Imagem")
 
     # Botão CTA
@@ -197,6 +298,12 @@ class Section(models.Model):
     # HTML customizado (para section_type='html')
     custom_html = models.TextField(blank=True, verbose_name="HTML Customizado")
 
+    # Produtos (para section_type='products'; ver ecommerce.sections)
+    products_category = models.SlugField(max_length=100, blank=True, verbose_name="Categoria de Produtos",
+                                         help_text="Vazio mostra produtos de todas as categorias")
+    products_featured = models.BooleanField(default=False, verbose_name="Apenas Produtos em Destaque")
+    items_limit = models.PositiveSmallIntegerField(default=15, verbose_name="Quantidade de Itens")
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
@@ -230,8 +337,8 @@ class SiteSettings(models.Model):
     """Configurações gerais do site"""
     site_name = models.CharField(max_length=100, default="Meu Blog", verbose_name="Nome do Site")
     site_description = models.TextField(blank=True, verbose_name="Descrição do Site")
-    site_logo = models.ImageField(upload_to='site/', blank=True, null=True, verbose_name="Logo do Site")
-    site_favicon = models.ImageField(upload_to='site/', blank=True, null=True, verbose_name="Favicon")
+    site_logo = models.ImageField(upload_to='site/', storage=get_content_storage, blank=True, null=True, verbose_name="Logo do Site")
+    site_favicon = models.ImageField(upload_to='site/', storage=get_content_storage, blank=True, null=True, verbose_name="Favicon")
 
     footer_text = models.TextField(blank=True, verbose_name="Texto do Rodapé")
 
@@ -276,7 +383,14 @@ class SiteSettings(models.Model):
 
     @classmethod
     def get_settings(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
+        """Retorna as configurações do site (em cache no processo)"""
+        from .cache import site_settings_cache
+        return site_settings_cache.get_settings()
+
+    @classmethod
+    def load_settings(cls):
+        """Carrega as configurações direto do banco, criando-as se necessário"""
+        obj, created = cls.objects.select_related('home_page', 'active_theme').get_or_create(pk=1)
         return obj
 
 
@@ -334,6 +448,9 @@ class Theme(models.Model):
     is_default = models.BooleanField(default=False, verbose_name="Tema Padrão",
                                       help_text="Tema usado quando nenhum está configurado")
 
+    # Hash do CSS compilado (gerado ao salvar, usado na URL versionada do theme.css)
+    css_hash = models.CharField(max_length=16, blank=True, editable=False, verbose_name="Hash do CSS")
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
@@ -359,14 +476,34 @@ class Theme(models.Model):
         if self.is_default:
             Theme.objects.filter(is_default=True).exclude(pk=self.pk).update(is_default=False)
 
+        # Compila o CSS do tema (minificado e com hash do conteúdo)
+        self.css_hash = compile_theme_css(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'css_hash'}
+
         super().save(*args, **kwargs)
 
+    def get_css_hash(self, recompile=False):
+        """Retorna o hash do CSS compilado, compilando se ainda não existir"""
+        if recompile or not self.css_hash:
+            self.css_hash = compile_theme_css(self)
+            if self.pk:
+                Theme.objects.filter(pk=self.pk).update(css_hash=self.css_hash)
+        return self.css_hash
+
     @classmethod
     def get_active_theme(cls):
-        """Retorna o tema ativo (prioridade: SiteSettings > is_active > is_default)"""
+        """Retorna o tema ativo (em cache no processo)"""
+        from .cache import site_settings_cache
+        return site_settings_cache.get_active_theme()
+
+    @classmethod
+    def resolve_active_theme(cls, site_settings=None):
+        """Resolve o tema ativo no banco (prioridade: SiteSettings > is_active > is_default)"""
         # Primeiro verifica se há tema configurado nas configurações do site
         try:
-            site_settings = SiteSettings.get_settings()
+            if site_settings is None:
+                site_settings = SiteSettings.load_settings()
             if site_settings.active_theme:
                 return site_settings.active_theme
         except:
@@ -383,7 +520,7 @@ class Theme(models.Model):
 class Media(models.Model):
     """Biblioteca de mídia"""
     title = models.CharField(max_length=200, verbose_name="Título")
-    file = models.FileField(upload_to='media/%Y/%m/%d/', verbose_name="Arquivo")
+    file = models.FileField(upload_to='media/%Y/%m/%d/', storage=get_content_storage, verbose_name="Arquivo")
     file_type = models.CharField(max_length=50, blank=True, verbose_name="Tipo")
     file_size = models.IntegerField(default=0, verbose_name="Tamanho")
 
@@ -404,15 +541,25 @@ class Media(models.Model):
     def save(self, *args, **kwargs):
         if self.file:
             self.file_size = self.file.size
-            # Determinar tipo de arquivo
-            if self.file.name:
-                ext = self.file.name.split('.')[-1].lower()
-                if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                    self.file_type = 'image'
-                elif ext in ['mp4', 'avi', 'mov', 'wmv']:
-                    self.file_type = 'video'
-                elif ext in ['pdf', 'doc', 'docx']:
-                    self.file_type = 'document'
-                else:
-                    self.file_type = 'other'
+            # Tipo pelos primeiros bytes do arquivo (a extensão pode mentir)
+            if not self.file._committed or not self.file_type:
+                self.file_type = sniff_file(self.file)[2]
         super().save(*args, **kwargs)
+
+
+class StoredBlob(models.Model):
+    """Arquivo guardado uma única vez pelo storage endereçado por conteúdo (blog.storage)"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="Caminho")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.BigIntegerField(default=0, verbose_name="Tamanho")
+    content_type = models.CharField(max_length=100, blank=True, verbose_name="Tipo MIME")
+    refcount = models.PositiveIntegerField(default=0, verbose_name="Referências")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Arquivo Armazenado"
+        verbose_name_plural = "Arquivos Armazenados"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.name
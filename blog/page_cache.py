@@ -0,0 +1,151 @@
+"""
+Cache de página inteira para visitantes anônimos.
+
+Views com ``PageCacheMixin`` guardam a resposta renderizada no cache do Django
+junto com as suas dependências: etiquetas como ``site``, ``posts``,
+``post:42``, ``category:3`` ou ``page:7``. Cada etiqueta tem um contador de
+versão no cache; os signals em ``blog.signals`` incrementam as etiquetas dos
+objetos salvos ou excluídos. Uma entrada só é servida se as versões de todas
+as suas etiquetas continuam iguais às registradas, então uma alteração
+descarta apenas as páginas que dependem do objeto alterado. Uma página durante
+cuja renderização alguma etiqueta foi invalidada não é guardada, pois pode ter
+sido montada com os dados anteriores à alteração.
+
+Requisições de usuários autenticados, com mensagens pendentes, da exportação
+estática ou que não sejam GET/HEAD nunca passam pelo cache.
+
+Os validadores do GET condicional (``ETag``/``Last-Modified``, ver
+``blog.conditional``) são guardados com a página: numa entrada válida, a
+revalidação é respondida com 304 sem calcular o estado da view.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .cache import bump_version, get_version, new_version
+
+
+PAGE_KEY = 'page_cache:page:{digest}'
+TAG_VERSION_KEY = 'page_cache:tag:{tag}'
+# Incrementado a cada invalidação, de qualquer etiqueta
+CLOCK_KEY = 'page_cache:clock'
+
+# Cabeçalhos da resposta original repetidos nas respostas servidas do cache
+CACHED_HEADERS = ('Content-Type', 'Content-Language', 'Vary', 'ETag', 'Last-Modified')
+
+
+def get_page_cache_timeout():
+    """Tempo de vida (segundos) das páginas em cache"""
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_tag_versions(tags):
+    """Retorna {etiqueta: versão atual} (etiquetas novas começam num valor inédito)"""
+    keys = {TAG_VERSION_KEY.format(tag=tag): tag for tag in tags}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # add() + releitura, como em blog.cache.get_version: se dois processos criam
+        # a mesma etiqueta ao mesmo tempo, os dois ficam com a versão de quem gravou primeiro
+        for key in missing:
+            cache.add(key, new_version(), timeout=None)
+        created = cache.get_many(missing)
+        for key in missing:
+            found[key] = created.get(key) or new_version()
+    return {keys[key]: version for key, version in found.items()}
+
+
+def invalidate_tags(*tags):
+    """Invalida todas as páginas que dependem de alguma das etiquetas"""
+    # O relógio antes das etiquetas: quem ler uma versão nova já vê o relógio mudado
+    bump_version(CLOCK_KEY)
+    for tag in tags:
+        bump_version(TAG_VERSION_KEY.format(tag=tag))
+
+
+def is_cacheable_request(request):
+    """Somente GET/HEAD anônimos e sem mensagens pendentes usam o cache"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # A renderização do export_static difere da página servida (sem formulários)
+    if getattr(request, 'static_export', False):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # len() carrega as mensagens sem marcá-las como lidas
+    if len(messages.get_messages(request)):
+        return False
+    return True
+
+
+def is_cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header('Cache-Control')
+    )
+
+
+def get_page_key(request):
+    url = f'{request.get_host()}{request.get_full_path()}'
+    return PAGE_KEY.format(digest=hashlib.md5(url.encode('utf-8')).hexdigest())
+
+
+class PageCacheMixin:
+    """
+    Cache de página inteira para views baseadas em classe.
+
+    As views informam suas dependências em ``get_cache_dependencies()``, que é
+    chamado depois que a resposta foi gerada (com ``self.object``,
+    ``self.category`` etc. já disponíveis).
+    """
+
+    def get_cache_dependencies(self):
+        """Etiquetas das quais a página depende"""
+        return {'site'}
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = get_page_key(request)
+        entry = cache.get(key)
+        if entry is not None and get_tag_versions(entry['tags']) == entry['tags']:
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in entry['headers'].items():
+                response[header] = value
+            response['X-Page-Cache'] = 'HIT'
+            last_modified = response.get('Last-Modified')
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+                response=response,
+            )
+
+        # As dependências só são conhecidas depois da renderização; o relógio lido
+        # antes dela diz se alguma etiqueta foi invalidada enquanto a página era montada
+        clock = get_version(CLOCK_KEY)
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+
+        if is_cacheable_response(response):
+            tags = get_tag_versions(self.get_cache_dependencies())
+            if get_version(CLOCK_KEY) != clock:
+                # A página pode ter sido montada com dados anteriores à alteração
+                return response
+            cache.set(key, {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': {h: response[h] for h in CACHED_HEADERS if response.has_header(h)},
+                'tags': tags,
+            }, timeout=get_page_cache_timeout())
+            response['X-Page-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,140 @@
+"""
+Paginação por cursor (keyset) das listagens de posts.
+
+A paginação numerada do Django faz ``COUNT(*)`` e ``OFFSET n``, que ficam mais
+lentos a cada página. As listagens usam a paginação numerada apenas nas
+primeiras ``BLOG_MAX_OFFSET_PAGE`` páginas; a partir daí o link "Próxima"
+passa a usar um cursor opaco (``?cursor=...``) com a posição do último post
+exibido em ``(published_at, id)``, e a consulta seguinte é um
+``WHERE (published_at, id) < (...)`` servido pelo índice, sem contagem.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+def get_max_offset_page():
+    """Última página acessível pela paginação numerada"""
+    return getattr(settings, 'BLOG_MAX_OFFSET_PAGE', 20)
+
+
+def encode_cursor(post, direction):
+    """Gera o token opaco de um cursor ('n' = próximos, 'p' = anteriores)"""
+    payload = json.dumps([post.published_at.isoformat(), post.pk, direction])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Retorna (published_at, pk, direction) de um token, ou levanta ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        published_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        published_at = parse_datetime(published_at)
+    except Exception as e:
+        raise ValueError('Cursor inválido') from e
+    if published_at is None or not isinstance(pk, int) or direction not in ('n', 'p'):
+        raise ValueError('Cursor inválido')
+    return published_at, pk, direction
+
+
+class CursorPage:
+    """Página de resultados da paginação por cursor (sem contagem total)"""
+
+    paginator = None
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = encode_cursor(object_list[-1], 'n') if has_next else None
+        self.previous_cursor = encode_cursor(object_list[0], 'p') if has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def paginate_by_cursor(queryset, token, page_size):
+    """Retorna a CursorPage de ``queryset`` (ordenado por -published_at, -id) a partir do token"""
+    try:
+        published_at, pk, direction = decode_cursor(token)
+    except ValueError:
+        raise Http404('Cursor de paginação inválido.')
+
+    queryset = queryset.filter(published_at__isnull=False)
+    if direction == 'n':
+        rows = list(queryset.filter(
+            Q(published_at__lt=published_at) | Q(published_at=published_at, pk__lt=pk)
+        ).order_by('-published_at', '-pk')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = True
+    else:
+        rows = list(queryset.filter(
+            Q(published_at__gt=published_at) | Q(published_at=published_at, pk__gt=pk)
+        ).order_by('published_at', 'pk')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+
+    if not rows:
+        raise Http404('Página vazia.')
+    return CursorPage(rows, has_next=has_next, has_previous=has_previous)
+
+
+class CursorPaginationMixin:
+    """
+    Paginação numerada nas primeiras páginas e por cursor nas demais.
+
+    Para ``ListView`` cujo queryset é ordenado por ``-published_at, -pk``, a
+    mesma ordem do cursor: com datas empatadas, a passagem da última página
+    numerada para o cursor não pula nem repete posts. Páginas numeradas acima
+    de ``BLOG_MAX_OFFSET_PAGE`` retornam 404; a navegação além desse ponto é
+    feita pelo cursor do link "Próxima".
+    """
+
+    def paginate_queryset(self, queryset, page_size):
+        token = self.request.GET.get('cursor')
+        if token:
+            page = paginate_by_cursor(queryset, token, page_size)
+            return None, page, page.object_list, page.has_other_pages()
+
+        max_page = get_max_offset_page()
+        page_number = self.request.GET.get(self.page_kwarg) or 1
+        if str(page_number).isdigit() and int(page_number) > max_page:
+            raise Http404('Página muito distante; use a navegação por cursor.')
+
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        if page.number > max_page:
+            # ?page=last em uma listagem longa
+            raise Http404('Página muito distante; use a navegação por cursor.')
+
+        page.next_cursor = None
+        page.previous_cursor = None
+        if page.number >= max_page and page.has_next():
+            # Continua a navegação pelo cursor a partir do último post desta página
+            object_list = list(page.object_list)
+            page.object_list = object_list
+            if object_list[-1].published_at is not None:
+                page.next_cursor = encode_cursor(object_list[-1], 'n')
+        return paginator, page, object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['max_offset_page'] = get_max_offset_page()
+        return context
@@ -0,0 +1,307 @@
+"""
+Auditoria dos planos de execução das consultas das views públicas.
+
+``TARGETS`` lista as páginas mais acessadas do site (listagens, detalhes,
+carrinho, mensagens, painel...) e as rotinas periódicas. Cada página é
+requisitada de verdade pelo ``django.test.Client`` (com dados existentes no
+banco: o primeiro post publicado, a primeira categoria com posts etc.) e as
+rotinas são chamadas diretamente; as consultas executadas são capturadas com
+``CaptureQueriesContext`` e passam por ``EXPLAIN``. O comando
+``audit_queries`` aponta as varreduras completas de tabela e as ordenações sem
+índice (``USE TEMP B-TREE`` no SQLite), para que um índice removido ou uma
+consulta nova sem índice seja percebida antes do deploy.
+
+Como as consultas auditadas são as das próprias views, não há cópia dos
+querysets para manter em dia. Cada alvo roda numa transação desfeita ao final
+(sessões de login, marcações de lida etc. não ficam gravadas) e sem o cache,
+para que todas as consultas da página sejam executadas.
+"""
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+# Padrões de plano problemáticos por banco: (tipo, expressão)
+PROBLEM_PATTERNS = {
+    'sqlite': [
+        ('scan', re.compile(r'\bSCAN (?P<table>\w+)$')),
+        ('sort', re.compile(r'\bUSE TEMP B-TREE\b')),
+    ],
+    'postgresql': [
+        ('scan', re.compile(r'\bSeq Scan on (?P<table>\w+)')),
+        ('sort', re.compile(r'\bSort\b')),
+    ],
+}
+
+PROBLEM_LABELS = {
+    'scan': 'varredura completa da tabela',
+    'sort': 'ordenação sem índice',
+}
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+# Comandos auditados (INSERT não tem plano de busca)
+AUDITED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+# Tabelas com poucas linhas (configurações, menu, categorias), lidas inteiras
+SMALL_TABLES = {'blog_sitesettings', 'blog_theme', 'blog_page', 'blog_category', 'ecommerce_productcategory'}
+# Ordenações limitadas ao que a página exibe (ex.: tags dos posts da página, via prefetch)
+BOUNDED_SORT_TABLES = {'taggit_tag'}
+# Primeira tabela do FROM (ou do UPDATE/DELETE) de uma consulta
+MAIN_TABLE = re.compile(r'\b(?:FROM|UPDATE)\s+"?(?P<table>\w+)"?', re.IGNORECASE)
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class AuditResult:
+    """Consultas executadas por um alvo: ``[(sql, plano, problemas)]``"""
+
+    def __init__(self, target, queries=(), error=None):
+        self.target = target
+        self.queries = list(queries)
+        self.error = error
+
+    @property
+    def problems(self):
+        return [(sql, problem) for sql, plan, problems in self.queries for problem in problems]
+
+
+class AuditTarget:
+    """Uma página ou rotina auditada"""
+
+    def __init__(self, label, app_label='blog', allow_scans=(), allow_sort=()):
+        """
+        ``allow_scans``: tabelas que podem ser varridas. ``allow_sort``: True, ou as
+        tabelas (primeira do FROM) cujas consultas podem ordenar sem índice.
+        """
+        self.label = label
+        self.app_label = app_label
+        self.allow_scans = set(allow_scans)
+        self.allow_sort = allow_sort if allow_sort is True else BOUNDED_SORT_TABLES | set(allow_sort)
+
+    def is_available(self):
+        return apps.is_installed(self.app_label)
+
+    def get_model(self, name):
+        return apps.get_model(self.app_label, name)
+
+    def prepare(self):
+        """Monta o que a execução precisa (fora da captura); retorna uma mensagem se não for possível"""
+        return None
+
+    def execute(self):
+        """Executa a página ou rotina; retorna uma mensagem de erro, None se tudo correu bem"""
+        raise NotImplementedError
+
+    def run(self):
+        """Executa o alvo e retorna um ``AuditResult`` com o plano de cada consulta"""
+        with override_settings(CACHES=NO_CACHE, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            with transaction.atomic():
+                error = self.prepare()
+                if error:
+                    transaction.set_rollback(True)
+                    return AuditResult(self, error=error)
+                with CaptureQueriesContext(connection) as captured:
+                    error = self.execute()
+                queries = []
+                for sql in dict.fromkeys(query['sql'] for query in captured):
+                    if not sql.lstrip().upper().startswith(AUDITED_STATEMENTS):
+                        continue
+                    plan = explain_sql(sql)
+                    queries.append((sql, plan, self.find_problems(plan, sql=sql)))
+                transaction.set_rollback(True)
+        return AuditResult(self, queries, error)
+
+    def find_problems(self, plan, vendor=None, sql=''):
+        """Retorna ``[(tipo, linha do plano)]`` dos trechos problemáticos de ``plan``"""
+        match = MAIN_TABLE.search(sql)
+        table = match.group('table') if match else None
+        if table in SMALL_TABLES:
+            # Varrer ou ordenar uma tabela de poucas linhas não é problema
+            return []
+        allow_sort = self.allow_sort is True or table in self.allow_sort
+        problems = []
+        for line in plan.splitlines():
+            for kind, pattern in PROBLEM_PATTERNS.get(vendor or connection.vendor, []):
+                match = pattern.search(line)
+                if not match:
+                    continue
+                if kind == 'scan' and match.group('table') in self.allow_scans:
+                    continue
+                if kind == 'sort' and allow_sort:
+                    continue
+                problems.append((kind, line.strip()))
+        return problems
+
+
+class AuditPage(AuditTarget):
+    """
+    Uma página requisitada pelo ``Client``.
+
+    ``url(get_model)`` monta o caminho a partir dos dados do banco (None se não
+    houver dados para a página); ``user(get_model)``, se informado, retorna o
+    usuário logado na requisição.
+    """
+
+    def __init__(self, label, url, user=None, **kwargs):
+        super().__init__(label, **kwargs)
+        self.url = url
+        self.user = user
+        self.path = None
+        self.client = None
+
+    def prepare(self):
+        self.path = self.url(self.get_model)
+        if self.path is None:
+            return 'sem dados no banco para montar a página'
+        # Erros da view viram HTTP 500 no resultado, sem interromper a auditoria
+        self.client = Client(raise_request_exception=False)
+        if self.user is not None:
+            user = self.user(self.get_model)
+            if user is None:
+                return 'sem usuário no banco para a página'
+            self.client.force_login(user)
+        return None
+
+    def execute(self):
+        response = self.client.get(self.path)
+        if response.streaming:
+            # Sitemaps: as consultas acontecem ao consumir a resposta
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            return f'HTTP {response.status_code} em {self.path}'
+        return None
+
+
+class AuditCall(AuditTarget):
+    """Uma rotina (comando periódico) chamada diretamente"""
+
+    def __init__(self, label, call, **kwargs):
+        super().__init__(label, **kwargs)
+        self.call = call
+
+    def execute(self):
+        self.call()
+        return None
+
+
+def explain_sql(sql):
+    """Plano de execução de ``sql`` (texto, uma linha por passo)"""
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor, 'EXPLAIN ')
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        rows = cursor.fetchall()
+    # SQLite: (id, parent, notused, detalhe); PostgreSQL: uma coluna de texto
+    return '\n'.join(str(row[-1]) if connection.vendor == 'sqlite' else ' '.join(map(str, row)) for row in rows)
+
+
+def _url(name, **kwargs):
+    return reverse(name, kwargs=kwargs)
+
+
+def _first_slug(queryset, name, field='slug'):
+    slug = queryset.values_list(field, flat=True).first()
+    return None if slug is None else _url(name, slug=slug)
+
+
+def _staff_user(get):
+    from django.contrib.auth import get_user_model
+
+    return get_user_model().objects.filter(is_staff=True, is_active=True).first()
+
+
+def _cart_user(get):
+    from django.contrib.auth import get_user_model
+
+    user_ids = get('Cart').objects.filter(is_active=True).values('user_id')
+    users = get_user_model().objects.filter(is_active=True)
+    return users.filter(pk__in=user_ids).first() or users.first()
+
+
+def _conversation(get):
+    return get('Conversation').objects.filter(participants__isnull=False).order_by('pk').first()
+
+
+def _conversation_user(get):
+    conversation = _conversation(get)
+    return conversation.participants.first() if conversation else None
+
+
+def _conversation_url(get):
+    conversation = _conversation(get)
+    return _url('messaging:conversation_detail', conversation_id=conversation.pk) if conversation else None
+
+
+def _publish_due_posts():
+    from .scheduler import publish_due_posts
+
+    publish_due_posts()
+
+
+def _release_expired_reservations():
+    from ecommerce.reservations import release_expired_reservations
+
+    release_expired_reservations()
+
+
+TARGETS = [
+    # blog
+    AuditPage('blog:home', lambda get: _url('blog:home')),
+    AuditPage('blog:post_list', lambda get: _url('blog:post_list')),
+    AuditPage('blog:category', lambda get: _first_slug(
+        get('Category').objects.filter(post_count__gt=0), 'blog:category'
+    )),
+    AuditPage('blog:tag', lambda get: _first_slug(
+        get('Post').objects.filter(status='published', tags__isnull=False), 'blog:tag', 'tags__slug'
+    )),
+    AuditPage('blog:post_detail', lambda get: _first_slug(
+        get('Post').objects.filter(status='published'), 'blog:post_detail'
+    ), allow_sort=['blog_post']),  # GROUP BY do estado condicional, de um único post
+    AuditPage('blog:page_detail', lambda get: _first_slug(
+        get('Page').objects.filter(is_published=True), 'blog:page_detail'
+    ), allow_sort=['blog_pagesection']),  # poucas seções por página
+    AuditPage('blog:feed', lambda get: _url('blog:feed')),
+    # Índice e partições agrupam/ordenam pelo id calculado da partição
+    AuditPage('blog:sitemap', lambda get: _url('blog:sitemap'), allow_sort=True),
+    AuditPage('blog:sitemap_section', lambda get: _url(
+        'blog:sitemap_section', section='posts', partition=0
+    ), allow_sort=True),
+    AuditCall('publish_scheduled', _publish_due_posts),
+
+    # e-commerce
+    AuditPage('ecommerce:product_list', lambda get: _url('ecommerce:product_list'), app_label='ecommerce'),
+    AuditPage('ecommerce:product_detail', lambda get: _first_slug(
+        get('Product').objects.filter(is_active=True), 'ecommerce:product_detail'
+    ), app_label='ecommerce'),
+    AuditPage('ecommerce:category_products', lambda get: _first_slug(
+        get('ProductCategory').objects.filter(is_active=True), 'ecommerce:category_products'
+    ), app_label='ecommerce', allow_sort=True),  # categoria e subcategorias
+    AuditPage('ecommerce:cart_view', lambda get: _url('ecommerce:cart_view'), user=_cart_user, app_label='ecommerce'),
+    AuditCall('release_expired_reservations', _release_expired_reservations, app_label='ecommerce'),
+
+    # painel: contagens e rankings de tabelas inteiras, só para a equipe
+    AuditPage('dashboard:stats', lambda get: _url('dashboard:stats'), user=_staff_user, app_label='dashboard', allow_scans=[
+        'auth_user', 'blog_post', 'blog_comment', 'ecommerce_product', 'ecommerce_order', 'modules_module',
+    ], allow_sort=True),
+
+    # mensagens
+    # Conversas do usuário ordenadas pela última mensagem (agregada)
+    AuditPage('messaging:conversation_list', lambda get: _url('messaging:conversation_list'),
+              user=_conversation_user, app_label='messaging', allow_sort=['messaging_conversation']),
+    # O outro participante: ordenação limitada aos participantes da conversa
+    AuditPage('messaging:conversation_detail', _conversation_url, user=_conversation_user,
+              app_label='messaging', allow_sort=['auth_user']),
+]
+
+
+def get_targets():
+    return [target for target in TARGETS if target.is_available()]
@@ -0,0 +1,365 @@
+"""
+Posts relacionados pré-calculados.
+
+Cada post publicado é representado por um vetor esparso com três blocos:
+termos do texto (TF-IDF sobre título, resumo e texto puro do conteúdo), tags (ponderadas
+pelo IDF da tag) e categoria. Cada bloco é normalizado e multiplicado pela
+raiz do seu peso, de modo que o produto escalar entre dois vetores é a soma
+ponderada das similaridades de cosseno de texto, tags e categoria.
+
+O comando ``compute_related_posts`` calcula os vizinhos de todos os posts e
+grava os ``BLOG_RELATED_POSTS`` mais próximos de cada um na tabela
+``RelatedPost``. A similaridade é calculada por um índice invertido (feature
+-> posts que a têm), de modo que cada post só é comparado com os que têm algo
+em comum com ele e a memória cresce com o número de features presentes, não
+com posts × vocabulário; com NumPy (``requirements.txt``) as listas do índice
+são arrays e a soma é vetorizada.
+
+O cálculo completo também grava o IDF dos termos do vocabulário e das tags
+(``RelatedPostFeature``). Ao salvar um post publicado, são atualizadas a lista
+dele e as dos posts que compartilham alguma tag ou a categoria (ou que já o
+listavam): o post salvo entra na lista de cada um deles se estiver entre os
+mais próximos (ver ``blog.signals``). Os vetores da atualização usam o IDF
+gravado, de modo que as pontuações novas são comparáveis às já guardadas.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from taggit.models import TaggedItem
+
+from .text import html_to_text
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - NumPy é opcional
+    numpy = None
+
+
+# Peso de cada bloco do vetor na pontuação final
+TEXT_WEIGHT = 1.0
+TAG_WEIGHT = 2.0
+CATEGORY_WEIGHT = 0.5
+
+# Tamanho máximo do vocabulário (termos mais frequentes) usado no TF-IDF
+MAX_TERMS = 2000
+# Termos presentes em mais que essa fração dos posts não diferenciam nada
+MAX_TERM_DF = 0.5
+# Limite de candidatos comparados na atualização incremental
+MAX_CANDIDATES = 500
+# Tamanho máximo de um termo do vocabulário (``RelatedPostFeature.key``)
+MAX_TERM_LENGTH = 100
+
+TOKEN_RE = re.compile(r'[^\W\d_]{3,}')
+
+
+def get_related_count():
+    """Quantos posts relacionados são guardados e exibidos por post"""
+    return getattr(settings, 'BLOG_RELATED_POSTS', 3)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def get_documents(queryset):
+    """Retorna [(pk, termos, tags, categoria)] dos posts do queryset"""
+    from .models import Post
+
+    rows = list(queryset.values_list('pk', 'title', 'excerpt', 'plain_text', 'category_id'))
+    tags = defaultdict(set)
+    items = TaggedItem.objects.filter(
+        content_type__app_label=Post._meta.app_label,
+        content_type__model=Post._meta.model_name,
+        object_id__in=[row[0] for row in rows],
+    ).values_list('object_id', 'tag_id')
+    for object_id, tag_id in items:
+        tags[object_id].add(tag_id)
+
+    return [
+        (pk, Counter(tokenize(f'{title} {html_to_text(excerpt)} {plain_text}')), tags[pk], category_id)
+        for pk, title, excerpt, plain_text, category_id in rows
+    ]
+
+
+def _normalize(block, weight):
+    norm = math.sqrt(sum(value * value for value in block.values()))
+    if not norm:
+        return {}
+    scale = math.sqrt(weight) / norm
+    return {feature: value * scale for feature, value in block.items()}
+
+
+def compute_idf(documents):
+    """Retorna ``(IDF dos termos do vocabulário, IDF das tags)`` calculados sobre os documentos"""
+    total = len(documents)
+    term_df = Counter()
+    tag_df = Counter()
+    for _, terms, tags, _ in documents:
+        term_df.update(terms.keys())
+        tag_df.update(tags)
+
+    # Termos que aparecem em um único post ou em quase todos não ajudam a relacionar
+    vocabulary = [
+        term for term, df in term_df.most_common()
+        if 1 < df <= max(2, total * MAX_TERM_DF) and len(term) <= MAX_TERM_LENGTH
+    ][:MAX_TERMS]
+    term_idf = {term: math.log(total / term_df[term]) + 1 for term in vocabulary}
+    tag_idf = {tag: math.log(total / df) + 1 for tag, df in tag_df.items()}
+    return term_idf, tag_idf
+
+
+def load_idf():
+    """IDF gravado pelo último cálculo completo (None se ainda não houve um)"""
+    from .models import RelatedPostFeature
+
+    term_idf = {}
+    tag_idf = {}
+    for kind, key, idf in RelatedPostFeature.objects.values_list('kind', 'key', 'idf'):
+        if kind == 'term':
+            term_idf[key] = idf
+        else:
+            tag_idf[int(key)] = idf
+    if not term_idf and not tag_idf:
+        return None
+    return term_idf, tag_idf
+
+
+def _save_idf(idf):
+    from .models import RelatedPostFeature
+
+    term_idf, tag_idf = idf
+    RelatedPostFeature.objects.all().delete()
+    RelatedPostFeature.objects.bulk_create([
+        *(RelatedPostFeature(kind='term', key=term, idf=value) for term, value in term_idf.items()),
+        *(RelatedPostFeature(kind='tag', key=str(tag), idf=value) for tag, value in tag_idf.items()),
+    ], batch_size=500)
+
+
+def build_vectors(documents, idf=None):
+    """
+    Converte os documentos em vetores esparsos {feature: peso}.
+
+    ``idf`` é o par retornado por ``compute_idf``; sem ele, o IDF é calculado
+    sobre os próprios documentos. Tags criadas depois do cálculo do IDF recebem
+    o maior IDF conhecido (são as mais raras).
+    """
+    term_idf, tag_idf = idf or compute_idf(documents)
+    new_tag_idf = max(tag_idf.values(), default=1.0)
+
+    vectors = []
+    for _, terms, tags, category_id in documents:
+        text = {
+            ('term', term): (1 + math.log(count)) * term_idf[term]
+            for term, count in terms.items() if term in term_idf
+        }
+        vector = _normalize(text, TEXT_WEIGHT)
+        vector.update(_normalize({('tag', tag): tag_idf.get(tag, new_tag_idf) for tag in tags}, TAG_WEIGHT))
+        if category_id is not None:
+            vector[('category', category_id)] = math.sqrt(CATEGORY_WEIGHT)
+        vectors.append(vector)
+    return vectors
+
+
+def _postings(vectors):
+    """Índice invertido: {feature: [(índice do post, peso)]}"""
+    postings = defaultdict(list)
+    for index, vector in enumerate(vectors):
+        for feature, value in vector.items():
+            postings[feature].append((index, value))
+    return postings
+
+
+def _top(scores, count):
+    """Os ``count`` maiores ``(índice, pontuação)``, desempatando pelo menor índice"""
+    return heapq.nlargest(count, scores, key=lambda item: (item[1], -item[0]))
+
+
+def _neighbors_python(vectors, rows, count):
+    """Vizinhos pelo índice invertido, com dicionários"""
+    postings = _postings(vectors)
+    result = {}
+    for index in rows:
+        scores = defaultdict(float)
+        for feature, value in vectors[index].items():
+            for other, other_value in postings[feature]:
+                if other != index:
+                    scores[other] += value * other_value
+        result[index] = _top(scores.items(), count)
+    return result
+
+
+def _neighbors_numpy(vectors, rows, count):
+    """Vizinhos pelo índice invertido, com as listas de cada feature em arrays"""
+    postings = {
+        feature: (
+            numpy.fromiter((other for other, _ in items), dtype=numpy.int64, count=len(items)),
+            numpy.fromiter((value for _, value in items), dtype=numpy.float32, count=len(items)),
+        )
+        for feature, items in _postings(vectors).items()
+    }
+    # Acumulador reaproveitado entre os posts; só as posições tocadas são lidas e zeradas
+    scores = numpy.zeros(len(vectors), dtype=numpy.float32)
+    result = {}
+    for index in rows:
+        touched = []
+        for feature, value in vectors[index].items():
+            others, values = postings[feature]
+            scores[others] += value * values
+            touched.append(others)
+        if not touched:
+            result[index] = []
+            continue
+        touched = numpy.unique(numpy.concatenate(touched))
+        touched = touched[touched != index]
+        found = scores[touched]
+        scores[touched] = 0
+        scores[index] = 0
+        result[index] = _top(
+            ((int(other), float(score)) for other, score in zip(touched, found) if score > 0), count
+        )
+    return result
+
+
+def compute_neighbors(documents, rows=None, count=None, idf=None):
+    """Retorna {pk: [(pk relacionado, pontuação)]} para os documentos em ``rows`` (índices)"""
+    count = count or get_related_count()
+    vectors = build_vectors(documents, idf)
+    rows = range(len(documents)) if rows is None else rows
+    find = _neighbors_numpy if numpy is not None else _neighbors_python
+    neighbors = find(vectors, rows, count)
+    return {
+        documents[index][0]: [(documents[other][0], score) for other, score in found]
+        for index, found in neighbors.items()
+    }
+
+
+def _save_neighbors(neighbors):
+    from .models import RelatedPost
+
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=pk, related_id=related_pk, score=score, rank=rank)
+        for pk, found in neighbors.items()
+        for rank, (related_pk, score) in enumerate(found)
+    ], batch_size=500)
+
+
+def rebuild_related_posts():
+    """Recalcula os posts relacionados de todos os posts publicados e grava o IDF usado"""
+    from .models import Post, RelatedPost
+
+    documents = get_documents(Post.objects.filter(status='published'))
+    idf = compute_idf(documents)
+    neighbors = compute_neighbors(documents, idf=idf)
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        _save_neighbors(neighbors)
+        _save_idf(idf)
+    return len(neighbors)
+
+
+def _dot(vector, other):
+    if len(other) < len(vector):
+        vector, other = other, vector
+    return sum(value * other.get(feature, 0.0) for feature, value in vector.items())
+
+
+def _candidate_ids(pk, tag_ids, category_id):
+    """Posts publicados mais recentes com alguma das tags ou a mesma categoria"""
+    from .models import Post
+
+    condition = Q()
+    if tag_ids:
+        condition |= Q(tags__in=tag_ids)
+    if category_id is not None:
+        condition |= Q(category_id=category_id)
+    if not condition:
+        return []
+    return list(
+        Post.objects.filter(condition, status='published').exclude(pk=pk)
+        .order_by('-published_at').values_list('pk', flat=True).distinct()[:MAX_CANDIDATES]
+    )
+
+
+def _scores(pk, documents, idf):
+    """Pontuação (> 0) de ``pk`` em relação a cada um dos outros documentos: {pk: pontuação}"""
+    vectors = dict(zip([document[0] for document in documents], build_vectors(documents, idf)))
+    scores = {}
+    for other, vector in vectors.items():
+        if other != pk:
+            score = _dot(vectors[pk], vector)
+            if score > 0:
+                scores[other] = score
+    return scores
+
+
+def _related_list(pk, idf, count):
+    """Lista completa de ``pk``, recalculada entre os posts de mesma tag ou categoria"""
+    from .models import Post
+
+    documents = get_documents(Post.objects.filter(pk=pk, status='published'))
+    if not documents:
+        return []
+    _, _, tag_ids, category_id = documents[0]
+    documents += get_documents(Post.objects.filter(pk__in=_candidate_ids(pk, tag_ids, category_id)))
+    return _top(_scores(pk, documents, idf).items(), count)
+
+
+def refresh_related_posts(post):
+    """
+    Atualiza as listas afetadas pelo post salvo: a dele, a dos posts de mesma tag
+    ou categoria e a dos que já o listavam.
+
+    A lista do post é recalculada entre esses candidatos; na de cada candidato
+    o post salvo entra (ou muda de pontuação, ou sai) sem recalcular os demais
+    vizinhos, que podem estar fora do conjunto de candidatos. Uma lista que
+    perde o post (despublicado ou sem nada mais em comum) é recalculada entre
+    os candidatos dela, para voltar a ter ``get_related_count()`` posts.
+    """
+    from .models import Post, RelatedPost
+
+    idf = load_idf()
+    count = get_related_count()
+    listing = list(RelatedPost.objects.filter(related=post).values_list('post_id', flat=True))
+
+    if post.status != 'published':
+        lists = {pk: _related_list(pk, idf, count) for pk in listing}
+        with transaction.atomic():
+            RelatedPost.objects.filter(Q(post=post) | Q(related=post)).delete()
+            RelatedPost.objects.filter(post_id__in=list(lists)).delete()
+            _save_neighbors(lists)
+        return
+
+    tag_ids = list(post.tags.values_list('pk', flat=True))
+    candidate_ids = _candidate_ids(post.pk, tag_ids, post.category_id)
+    affected = list(dict.fromkeys([*candidate_ids, *listing]))
+
+    # A similaridade é simétrica: a pontuação do post em relação a cada
+    # candidato serve para as duas listas
+    scores = _scores(post.pk, get_documents(Post.objects.filter(pk__in=[post.pk, *affected])), idf)
+
+    lists = {post.pk: _top(scores.items(), count)}
+    current = defaultdict(list)
+    for pk, related_id, score in RelatedPost.objects.filter(post_id__in=affected).order_by(
+        'post_id', 'rank'
+    ).values_list('post_id', 'related_id', 'score'):
+        current[pk].append((related_id, score))
+    for pk in affected:
+        found = [(related_id, score) for related_id, score in current[pk] if related_id != post.pk]
+        if pk in scores:
+            found.append((post.pk, scores[pk]))
+        found = _top(found, count)
+        if found == current[pk]:
+            continue
+        if len(found) < len(current[pk]):
+            # O post saiu da lista: os vizinhos seguintes não estão guardados
+            found = _related_list(pk, idf, count)
+        lists[pk] = found
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(lists)).delete()
+        _save_neighbors(lists)
@@ -0,0 +1,89 @@
+"""
+Publicação dos posts agendados.
+
+Posts com ``status='scheduled'`` passam a ``published`` quando chega o seu
+``published_at``. ``publish_due_posts`` encontra os posts vencidos pelo índice
+``(status, published_at)``, trava as linhas (pulando as que outro processo já
+travou) e as publica com um único UPDATE; como
+``QuerySet.update()`` não dispara signals, o que os signals de
+``blog.signals`` fariam em um ``save()`` é feito aqui, em lote: contadores de
+categorias/tags, caches, índice de busca e posts relacionados.
+
+O comando ``publish_scheduled`` roda uma vez (ex.: pelo cron) ou em loop.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from .cache import invalidate_site_context
+from .counters import recount_categories, recount_tags
+from .page_cache import invalidate_tags
+from .related import refresh_related_posts
+from .search import get_search_backend
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def get_due_posts(now=None):
+    """Posts agendados cuja data de publicação já passou"""
+    from .models import Post
+
+    return Post.objects.filter(status='scheduled', published_at__lte=now or timezone.now())
+
+
+def get_next_publication():
+    """Data do próximo post agendado (ou None)"""
+    from .models import Post
+
+    return Post.objects.filter(
+        status='scheduled', published_at__isnull=False
+    ).order_by('published_at').values_list('published_at', flat=True).first()
+
+
+def _after_publish(posts):
+    invalidate_site_context()
+    invalidate_tags('posts', *(f'post:{post.pk}' for post in posts))
+    backend = get_search_backend()
+    for post in posts:
+        backend.index_post(post)
+        try:
+            refresh_related_posts(post)
+        except Exception:
+            # O comando compute_related_posts corrige depois
+            logger.exception('Falha ao recalcular os posts relacionados de %s', post.pk)
+
+
+def publish_due_posts(now=None, batch_size=BATCH_SIZE):
+    """Publica os posts agendados vencidos (até ``batch_size``) e retorna a lista publicada"""
+    from .models import Post
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Posts sendo publicados por outro processo estão travados e ficam de fora
+        pks = list(get_due_posts(now).select_for_update(skip_locked=True).order_by(
+            'published_at'
+        ).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        Post.objects.filter(pk__in=pks, status='scheduled').update(status='published', updated_at=now)
+        # Sem SELECT ... FOR UPDATE (SQLite), outro processo pode ter publicado algum
+        # entre a seleção e o UPDATE: só seguem os que este UPDATE marcou
+        posts = list(Post.objects.filter(pk__in=pks, status='published', updated_at=now))
+        if not posts:
+            return []
+        pks = [post.pk for post in posts]
+
+        recount_categories({post.category_id for post in posts})
+        recount_tags(set(TaggedItem.objects.filter(
+            content_type__app_label=Post._meta.app_label,
+            content_type__model=Post._meta.model_name,
+            object_id__in=pks,
+        ).values_list('tag_id', flat=True)))
+
+        transaction.on_commit(lambda: _after_publish(posts))
+    return posts
@@ -0,0 +1,208 @@
+"""
+Busca de posts com índice de texto completo.
+
+A busca passa por um backend plugável, escolhido pela configuração
+``BLOG_SEARCH_BACKEND`` (caminho pontuado da classe). Por padrão, em SQLite
+é usado ``SQLiteFTS5SearchBackend``, que mantém a tabela virtual FTS5
+``blog_post_fts`` (criada na migração 0008) com o texto sem HTML dos posts
+publicados e ordena os resultados por BM25. Nos demais bancos é usado
+``DatabaseSearchBackend``, equivalente à busca antiga com ``icontains``.
+
+O índice é atualizado a cada save/delete de ``Post`` (ver ``blog.signals``) e
+pode ser reconstruído com o comando ``rebuild_search_index``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .text import html_to_text
+
+
+# Marcadores usados pelo snippet() do FTS5; trocados por <mark> após o escape
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+def highlight_snippet(snippet):
+    """Escapa o snippet e converte os marcadores de destaque em <mark>"""
+    snippet = escape(snippet)
+    snippet = snippet.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(snippet)
+
+
+def get_post_document(post):
+    """Campos indexados de um post: (título, resumo, corpo)"""
+    return (post.title, html_to_text(post.excerpt), post.plain_text or html_to_text(post.content))
+
+
+class BaseSearchBackend:
+    """Interface dos backends de busca de posts"""
+
+    def index_post(self, post):
+        """Adiciona/atualiza o post no índice (ou remove, se não estiver publicado)"""
+        raise NotImplementedError
+
+    def remove_post(self, pk):
+        """Remove o post do índice"""
+        raise NotImplementedError
+
+    def rebuild(self, queryset):
+        """Recria o índice com os posts de ``queryset``; retorna quantos foram indexados"""
+        raise NotImplementedError
+
+    def search(self, query, limit=None):
+        """Retorna a lista de ids dos posts encontrados, do mais relevante ao menos"""
+        raise NotImplementedError
+
+    def snippets(self, query, pks):
+        """Retorna {pk: snippet HTML com os termos destacados} para os posts informados"""
+        return {}
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Busca sem índice, com ``icontains`` direto na tabela de posts"""
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, pk):
+        pass
+
+    def rebuild(self, queryset):
+        return 0
+
+    def search(self, query, limit=None):
+        from .models import Post
+
+        pks = Post.objects.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(excerpt__icontains=query),
+            status='published'
+        ).order_by('-published_at').values_list('pk', flat=True)
+        if limit:
+            pks = pks[:limit]
+        return list(pks)
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """Busca com a tabela virtual FTS5 do SQLite, ranqueada por BM25"""
+
+    table = 'blog_post_fts'
+    # Pesos do BM25 por coluna: título > resumo > corpo
+    weights = (10.0, 4.0, 1.0)
+    snippet_tokens = 24
+
+    def index_post(self, post):
+        if post.status != 'published':
+            self.remove_post(post.pk)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+                [post.pk, *get_post_document(post)]
+            )
+
+    def remove_post(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+    def rebuild(self, queryset):
+        count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for post in queryset.filter(status='published').iterator(chunk_size=500):
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, title, excerpt, body) VALUES (%s, %s, %s, %s)',
+                    [post.pk, *get_post_document(post)]
+                )
+                count += 1
+        return count
+
+    def build_match(self, query):
+        """Converte o texto digitado em uma expressão MATCH segura (termos com AND)"""
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None
+        # Cada termo entre aspas; o último também casa como prefixo
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, query, limit=None):
+        match = self.build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(w) for w in self.weights)
+        sql = (
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+            f'ORDER BY bm25({self.table}, {weights})'
+        )
+        params = [match]
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def snippets(self, query, pks):
+        match = self.build_match(query)
+        if not match or not pks:
+            return {}
+        placeholders = ', '.join(['%s'] * len(pks))
+        sql = (
+            f"SELECT rowid, snippet({self.table}, -1, %s, %s, '…', {self.snippet_tokens}) "
+            f'FROM {self.table} WHERE {self.table} MATCH %s AND rowid IN ({placeholders})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [HIGHLIGHT_START, HIGHLIGHT_END, match, *pks])
+            return {pk: highlight_snippet(snippet) for pk, snippet in cursor.fetchall()}
+
+
+def get_search_backend():
+    """Retorna o backend de busca configurado"""
+    path = getattr(settings, 'BLOG_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5SearchBackend()
+    return DatabaseSearchBackend()
+
+
+class SearchResults:
+    """
+    Sequência preguiçosa de posts encontrados, para uso com o Paginator.
+
+    Guarda apenas os ids ranqueados; os posts (e seus snippets) são buscados
+    somente para a fatia efetivamente exibida.
+    """
+
+    def __init__(self, query, queryset, backend=None, limit=None):
+        self.query = query
+        self.queryset = queryset
+        self.backend = backend or get_search_backend()
+        self.pks = self.backend.search(query, limit=limit)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        pks = self.pks[index]
+        posts = self.queryset.in_bulk(pks)
+        snippets = self.backend.snippets(self.query, pks)
+        results = []
+        for pk in pks:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_snippet = snippets.get(pk)
+                results.append(post)
+        return results
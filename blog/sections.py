@@ -0,0 +1,120 @@
+"""
+Renderização das seções do construtor de páginas.
+
+O HTML de cada seção é guardado no cache de fragmentos com uma chave formada
+por ``Section.pk``, ``Section.updated_at`` e pelas versões dos dados externos
+que a seção exibe (ex.: a lista de produtos nas seções ``products``). Como a
+chave não depende da página, uma seção usada em várias páginas é renderizada
+uma única vez.
+
+Os dados externos de cada tipo de seção vêm de um provedor registrado em
+``SECTION_DATA_PROVIDERS`` e importado só quando usado. ``render_sections``
+consulta o cache de todas as seções da página de uma vez e chama cada provedor
+uma única vez, apenas com as seções do seu tipo que precisam ser renderizadas:
+uma página sem seções de produtos (ou com elas já em cache) não consulta
+produtos, e o provedor não é nem importado se o app não estiver instalado.
+
+Com ``DEBUG`` ativo, cada seção recebe um comentário HTML com o tempo de
+renderização e se veio do cache, e o tempo também é registrado no logger
+``blog.sections``.
+"""
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .cache import get_cache_timeout
+from .page_cache import get_tag_versions
+
+
+logger = logging.getLogger(__name__)
+
+SECTION_KEY = 'blog:section:{pk}:{fingerprint}'
+SECTION_TEMPLATE = 'blog/sections/section_renderer.html'
+
+# Etiquetas (ver blog.page_cache) dos dados externos usados por tipo de seção
+SECTION_DEPENDENCIES = {
+    'products': ('products',),
+}
+
+# Provedores de dados por tipo de seção: (app exigido, caminho da função).
+# A função recebe as seções do tipo e retorna {section.pk: contexto extra}.
+SECTION_DATA_PROVIDERS = {
+    'products': ('ecommerce', 'ecommerce.sections.get_section_products'),
+}
+
+
+def get_section_fingerprint(section):
+    """Identifica a versão do HTML da seção (conteúdo + dependências)"""
+    parts = [section.updated_at.isoformat() if section.updated_at else '']
+    tags = SECTION_DEPENDENCIES.get(section.section_type, ())
+    if tags:
+        versions = get_tag_versions(tags)
+        parts.extend(f'{tag}={versions[tag]}' for tag in sorted(tags))
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_section_provider(section_type):
+    """Função que carrega os dados do tipo de seção (None se não houver ou o app estiver ausente)"""
+    app_label, path = SECTION_DATA_PROVIDERS.get(section_type, (None, None))
+    if path is None or not apps.is_installed(app_label):
+        return None
+    return import_string(path)
+
+
+def load_section_data(sections):
+    """Retorna {section.pk: contexto extra}, com uma chamada de provedor por tipo presente"""
+    by_type = defaultdict(list)
+    for section in sections:
+        by_type[section.section_type].append(section)
+    data = {}
+    for section_type, group in by_type.items():
+        provider = get_section_provider(section_type)
+        if provider is not None:
+            data.update(provider(group))
+    return data
+
+
+def render_sections(sections):
+    """Retorna {section.pk: HTML} das seções, do cache ou renderizando as que faltam"""
+    sections = list(sections)
+    keys = {section.pk: SECTION_KEY.format(pk=section.pk, fingerprint=get_section_fingerprint(section))
+            for section in sections}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [section for section in sections if keys[section.pk] not in cached]
+    data = load_section_data(missing)
+    rendered, elapsed = {}, {}
+    for section in missing:
+        start = time.perf_counter()
+        context = {'section': section, **data.get(section.pk, {})}
+        rendered[keys[section.pk]] = render_to_string(SECTION_TEMPLATE, context)
+        elapsed[section.pk] = (time.perf_counter() - start) * 1000
+    if rendered:
+        cache.set_many(rendered, timeout=get_cache_timeout())
+
+    result = {}
+    for section in sections:
+        key = keys[section.pk]
+        html = cached[key] if key in cached else rendered[key]
+        if settings.DEBUG:
+            status = 'cache' if key in cached else 'renderizada'
+            ms = elapsed.get(section.pk, 0)
+            logger.debug('Seção %s (%s): %.2f ms, %s', section.pk, section.section_type, ms, status)
+            html = f'<!-- seção {section.pk} ({section.section_type}): {ms:.2f} ms, {status} -->\n{html}'
+        result[section.pk] = mark_safe(html)
+    return result
+
+
+def render_section(section):
+    """Retorna o HTML de uma seção, do cache ou renderizando o template"""
+    return render_sections([section])[section.pk]
@@ -0,0 +1,272 @@
+"""
+Signals do blog.
+
+Mantêm os caches de ``blog.cache`` coerentes com o banco de dados.
+"""
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save, pre_delete
+from taggit.models import Tag
+
+from .cache import invalidate_site_context, site_settings_cache
+from .counters import get_post_tag_ids, recount_categories, recount_tags
+from .images import get_image_names, iter_image_fields, schedule_renditions
+from .models import SiteSettings, Page, Category, Post, Theme, Section, PageSection
+from .page_cache import invalidate_tags
+from .related import refresh_related_posts
+from .search import get_search_backend
+from .storage import ContentAddressedStorage, add_reference, remove_reference
+
+
+logger = logging.getLogger(__name__)
+
+
+# Models cujas alterações mudam o contexto global do site
+SITE_CONTEXT_MODELS = (SiteSettings, Page, Category, Post, Theme)
+
+# Models guardados junto com a instância de SiteSettings (home_page e active_theme)
+SITE_SETTINGS_MODELS = (SiteSettings, Page, Theme)
+
+
+def invalidate_site_context_on_change(sender, **kwargs):
+    """Invalida o contexto global quando um model que faz parte dele muda"""
+    invalidate_site_context()
+
+
+for model in SITE_CONTEXT_MODELS:
+    post_save.connect(invalidate_site_context_on_change, sender=model)
+    post_delete.connect(invalidate_site_context_on_change, sender=model)
+
+
+def clear_site_settings_cache(sender, **kwargs):
+    """Descarta as configurações e o tema em cache em todos os processos"""
+    site_settings_cache.clear()
+
+
+for model in SITE_SETTINGS_MODELS:
+    post_save.connect(clear_site_settings_cache, sender=model)
+    post_delete.connect(clear_site_settings_cache, sender=model)
+
+
+def update_search_index(sender, instance, **kwargs):
+    """Mantém o índice de busca em dia com o post salvo"""
+    get_search_backend().index_post(instance)
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    """Remove o post excluído do índice de busca"""
+    get_search_backend().remove_post(instance.pk)
+
+
+post_save.connect(update_search_index, sender=Post)
+post_delete.connect(remove_from_search_index, sender=Post)
+
+
+def remember_counted_state(sender, instance, raw=False, **kwargs):
+    """Guarda o status e a categoria gravados antes do save, para os contadores"""
+    if raw or instance.pk is None:
+        instance._counted_state = None
+        return
+    instance._counted_state = Post.objects.filter(pk=instance.pk).values_list('status', 'category_id').first()
+
+
+def update_post_counts(sender, instance, created, raw=False, **kwargs):
+    """Recalcula as contagens das categorias e tags afetadas pelo post salvo"""
+    if raw:
+        return
+    old_status, old_category_id = getattr(instance, '_counted_state', None) or (None, None)
+    was_published = old_status == 'published'
+    is_published = instance.status == 'published'
+    if not (was_published or is_published):
+        return
+
+    with transaction.atomic():
+        if was_published != is_published or old_category_id != instance.category_id:
+            recount_categories({old_category_id, instance.category_id})
+        if was_published != is_published:
+            recount_tags(get_post_tag_ids(instance))
+
+
+def remember_counted_tags(sender, instance, **kwargs):
+    """Guarda as tags do post antes que a exclusão remova as associações"""
+    instance._counted_tag_ids = get_post_tag_ids(instance) if instance.status == 'published' else set()
+
+
+def update_post_counts_on_delete(sender, instance, **kwargs):
+    if instance.status != 'published':
+        return
+    with transaction.atomic():
+        recount_categories({instance.category_id})
+        recount_tags(getattr(instance, '_counted_tag_ids', set()))
+
+
+def update_tag_counts(sender, instance, action, pk_set, **kwargs):
+    """Recalcula as contagens das tags adicionadas/removidas de um post publicado"""
+    if not isinstance(instance, Post):
+        return
+    if action == 'pre_clear':
+        # clear() não informa pk_set; as tags são lidas antes da remoção
+        instance._cleared_tag_ids = get_post_tag_ids(instance)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_tag_ids', set())
+
+    if pk_set:
+        if instance.status == 'published':
+            recount_tags(pk_set)
+        invalidate_tags('posts', f'post:{instance.pk}')
+
+
+pre_save.connect(remember_counted_state, sender=Post)
+post_save.connect(update_post_counts, sender=Post)
+pre_delete.connect(remember_counted_tags, sender=Post)
+post_delete.connect(update_post_counts_on_delete, sender=Post)
+m2m_changed.connect(update_tag_counts, sender=Post.tags.through)
+
+
+def schedule_related_refresh(post):
+    """Recalcula os posts relacionados do post depois do commit (uma vez por transação)"""
+    if getattr(post, '_related_refresh_pending', False):
+        return
+    post._related_refresh_pending = True
+
+    def refresh():
+        post._related_refresh_pending = False
+        try:
+            refresh_related_posts(post)
+        except Exception:
+            # A lista antiga continua válida; o comando compute_related_posts corrige depois
+            logger.exception('Falha ao recalcular os posts relacionados de %s', post.pk)
+
+    transaction.on_commit(refresh)
+
+
+def refresh_related_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_related_refresh(instance)
+
+
+def refresh_related_on_tags_change(sender, instance, action, **kwargs):
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_related_refresh(instance)
+
+
+post_save.connect(refresh_related_on_save, sender=Post)
+m2m_changed.connect(refresh_related_on_tags_change, sender=Post.tags.through)
+
+
+def remember_image_names(sender, instance, raw=False, **kwargs):
+    """Guarda os arquivos das imagens antes do save, para gerar versões só das trocadas"""
+    fields = [field.attname for field in iter_image_fields(sender)]
+    previous = None
+    if not raw and instance.pk is not None:
+        previous = sender._default_manager.filter(pk=instance.pk).values(*fields).first()
+    instance._old_image_names = previous or {}
+
+
+def generate_image_renditions(sender, instance, raw=False, **kwargs):
+    """Gera as versões responsivas das imagens novas depois do commit (ver blog.images)"""
+    if raw:
+        return
+    previous = getattr(instance, '_old_image_names', {})
+    names = [
+        name for attname, name in get_image_names(instance).items()
+        if name and name != previous.get(attname)
+    ]
+    instance._old_image_names = get_image_names(instance)
+    if names:
+        transaction.on_commit(lambda: [schedule_renditions(name) for name in names])
+
+
+# Todos os models com ImageField (do blog, do e-commerce etc.)
+for model in apps.get_models():
+    if iter_image_fields(model):
+        pre_save.connect(remember_image_names, sender=model)
+        post_save.connect(generate_image_renditions, sender=model)
+
+
+def get_blob_fields(model):
+    """Campos de arquivo do model gravados no storage endereçado por conteúdo"""
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def remember_stored_files(sender, instance, raw=False, **kwargs):
+    """Guarda os arquivos referenciados antes do save, para ajustar as referências"""
+    fields = get_blob_fields(sender)
+    previous = None
+    if not raw and instance.pk is not None:
+        previous = sender._default_manager.filter(pk=instance.pk).values(*[f.attname for f in fields]).first()
+    instance._stored_files = previous or {}
+    # Arquivos enviados neste save: o storage já conta a referência do upload
+    instance._uploaded_files = {f.attname for f in fields if not getattr(instance, f.attname)._committed}
+
+
+def update_blob_references(sender, instance, raw=False, **kwargs):
+    """Conta uma referência para cada arquivo novo e libera os substituídos"""
+    if raw:
+        return
+    previous = getattr(instance, '_stored_files', {})
+    uploaded = getattr(instance, '_uploaded_files', set())
+    for field in get_blob_fields(sender):
+        old = previous.get(field.attname) or ''
+        new = getattr(instance, field.attname).name or ''
+        if field.attname in uploaded:
+            # O upload já contou a referência ao arquivo novo, mesmo que seja o
+            # mesmo blob de antes (conteúdo idêntico): a antiga é liberada
+            if old:
+                remove_reference(old, field.storage)
+        elif old != new:
+            if new:
+                add_reference(new)
+            if old:
+                remove_reference(old, field.storage)
+    instance._stored_files = {field.attname: getattr(instance, field.attname).name for field in get_blob_fields(sender)}
+    instance._uploaded_files = set()
+
+
+def release_blob_references(sender, instance, **kwargs):
+    for field in get_blob_fields(sender):
+        name = getattr(instance, field.attname).name
+        if name:
+            remove_reference(name, field.storage)
+
+
+for model in apps.get_models():
+    if get_blob_fields(model):
+        pre_save.connect(remember_stored_files, sender=model)
+        post_save.connect(update_blob_references, sender=model)
+        post_delete.connect(release_blob_references, sender=model)
+
+
+# Etiquetas do cache de páginas (ver blog.page_cache) afetadas por cada model
+PAGE_CACHE_TAGS = {
+    SiteSettings: lambda obj: ['site'],
+    Theme: lambda obj: ['site'],
+    Page: lambda obj: ['site', f'page:{obj.pk}'],
+    Category: lambda obj: ['site', f'category:{obj.pk}'],
+    Post: lambda obj: ['posts', f'post:{obj.pk}'],
+    Tag: lambda obj: ['posts', f'tag:{obj.pk}'],
+    Section: lambda obj: [f'section:{obj.pk}'],
+    PageSection: lambda obj: [f'page:{obj.page_id}'],
+    'ecommerce.Product': lambda obj: ['products'],
+    'ecommerce.ProductCategory': lambda obj: ['products'],
+}
+
+
+def invalidate_page_cache(sender, instance, **kwargs):
+    """Descarta as páginas em cache que dependem do objeto alterado"""
+    get_tags = PAGE_CACHE_TAGS.get(sender) or PAGE_CACHE_TAGS[sender._meta.label]
+    invalidate_tags(*get_tags(instance))
+
+
+for model in PAGE_CACHE_TAGS:
+    post_save.connect(invalidate_page_cache, sender=model)
+    post_delete.connect(invalidate_page_cache, sender=model)
@@ -0,0 +1,190 @@
+"""
+Sitemaps XML (índice + partições) gerados em streaming.
+
+``/sitemap.xml`` é um índice que aponta para as partições de cada seção
+(posts, páginas, categorias, produtos e categorias de produtos). Cada
+partição cobre uma faixa de ``SITEMAP_LIMIT`` ids e é gerada em streaming,
+lendo o banco em blocos com ``iterator()`` — um sitemap de 50 mil URLs nunca
+fica inteiro na memória.
+
+O índice e as partições respondem a GETs condicionais com ``ETag`` e
+``Last-Modified`` calculados pelo ``updated_at`` mais recente de cada faixa.
+"""
+import hashlib
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.db.models import Count, F, Max
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import condition
+
+
+SITEMAP_LIMIT = 50000
+CHUNK_SIZE = 2000
+
+SLUG_PLACEHOLDER = 'sitemap-slug-placeholder'
+
+
+class SitemapSection:
+    """Uma seção do sitemap: um model, o filtro do que é público e a URL de cada item"""
+
+    def __init__(self, name, model, url_name, filters, lastmod_field='updated_at', app_label='blog'):
+        self.name = name
+        self.model = model
+        self.url_name = url_name
+        self.filters = filters
+        self.lastmod_field = lastmod_field
+        self.app_label = app_label
+
+    def is_available(self):
+        return apps.is_installed(self.app_label)
+
+    def get_queryset(self):
+        return apps.get_model(self.app_label, self.model).objects.filter(**self.filters)
+
+    def get_partitions(self):
+        """Retorna ``{partição: (último updated_at, total de URLs)}``"""
+        aggregates = {'total': Count('pk')}
+        if self.lastmod_field:
+            aggregates['lastmod'] = Max(self.lastmod_field)
+        rows = (
+            self.get_queryset()
+            .annotate(partition=F('pk') / SITEMAP_LIMIT)
+            .values('partition')
+            .annotate(**aggregates)
+            .order_by('partition')
+        )
+        return {row['partition']: (row.get('lastmod'), row['total']) for row in rows}
+
+    def iter_items(self, partition):
+        """(slug, updated_at) dos itens de uma partição, lidos do banco em blocos"""
+        fields = ['slug', self.lastmod_field] if self.lastmod_field else ['slug']
+        queryset = self.get_queryset().filter(
+            pk__gte=partition * SITEMAP_LIMIT, pk__lt=(partition + 1) * SITEMAP_LIMIT
+        ).order_by('pk').values_list(*fields)
+        for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+            yield row[0], row[1] if self.lastmod_field else None
+
+
+SECTIONS = {
+    section.name: section for section in [
+        SitemapSection('posts', 'Post', 'blog:post_detail', {'status': 'published'}),
+        SitemapSection('pages', 'Page', 'blog:page_detail', {'is_published': True}),
+        # Category não tem data de atualização: as URLs vão sem <lastmod>
+        SitemapSection('categories', 'Category', 'blog:category', {'post_count__gt': 0}, lastmod_field=None),
+        SitemapSection('products', 'Product', 'ecommerce:product_detail', {'is_active': True}, app_label='ecommerce'),
+        SitemapSection(
+            'product-categories', 'ProductCategory', 'ecommerce:category_products', {'is_active': True},
+            app_label='ecommerce',
+        ),
+    ]
+}
+
+
+def get_sections():
+    return [section for section in SECTIONS.values() if section.is_available()]
+
+
+def get_section(name):
+    section = SECTIONS.get(name)
+    if section is None or not section.is_available():
+        raise Http404('Sitemap não encontrado.')
+    return section
+
+
+def _format_date(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _make_etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def get_index_state(request):
+    """Partições de todas as seções, calculadas uma vez por requisição"""
+    if not hasattr(request, '_sitemap_index'):
+        request._sitemap_index = [(section, section.get_partitions()) for section in get_sections()]
+    return request._sitemap_index
+
+
+def get_partition_state(request, section, partition):
+    """(último updated_at, total) de uma partição, calculados uma vez por requisição"""
+    if not hasattr(request, '_sitemap_partition'):
+        partitions = get_section(section).get_partitions()
+        if partition not in partitions:
+            raise Http404('Sitemap não encontrado.')
+        request._sitemap_partition = partitions[partition]
+    return request._sitemap_partition
+
+
+def _index_last_modified(request):
+    dates = [
+        lastmod for _, partitions in get_index_state(request)
+        for lastmod, _ in partitions.values() if lastmod
+    ]
+    return max(dates) if dates else None
+
+
+def _index_etag(request):
+    return _make_etag('index', *(
+        f'{section.name}:{number}:{_format_date(lastmod)}:{total}'
+        for section, partitions in get_index_state(request)
+        for number, (lastmod, total) in partitions.items()
+    ))
+
+
+def _partition_last_modified(request, section, partition):
+    return get_partition_state(request, section, partition)[0]
+
+
+def _partition_etag(request, section, partition):
+    lastmod, total = get_partition_state(request, section, partition)
+    return _make_etag(section, partition, _format_date(lastmod), total)
+
+
+def _stream_index(request, state):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for section, partitions in state:
+        for number, (lastmod, _) in partitions.items():
+            location = request.build_absolute_uri(
+                reverse('blog:sitemap_section', kwargs={'section': section.name, 'partition': number})
+            )
+            entry = f'<sitemap><loc>{escape(location)}</loc>'
+            if lastmod:
+                entry += f'<lastmod>{_format_date(lastmod)}</lastmod>'
+            yield entry + '</sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def _stream_urls(request, section, partition):
+    # A URL é resolvida uma vez; cada item só troca o slug
+    prefix, suffix = request.build_absolute_uri(
+        reverse(section.url_name, kwargs={'slug': SLUG_PLACEHOLDER})
+    ).split(SLUG_PLACEHOLDER)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for slug, lastmod in section.iter_items(partition):
+        entry = f'<url><loc>{escape(prefix + slug + suffix)}</loc>'
+        if lastmod:
+            entry += f'<lastmod>{_format_date(lastmod)}</lastmod>'
+        yield entry + '</url>\n'
+    yield '</urlset>\n'
+
+
+@condition(etag_func=_index_etag, last_modified_func=_index_last_modified)
+def sitemap_index_view(request):
+    """Índice com as partições de todas as seções"""
+    return StreamingHttpResponse(
+        _stream_index(request, get_index_state(request)), content_type='application/xml; charset=utf-8'
+    )
+
+
+@condition(etag_func=_partition_etag, last_modified_func=_partition_last_modified)
+def sitemap_section_view(request, section, partition):
+    """Uma partição de uma seção (até ``SITEMAP_LIMIT`` URLs)"""
+    get_partition_state(request, section, partition)
+    return StreamingHttpResponse(
+        _stream_urls(request, get_section(section), partition), content_type='application/xml; charset=utf-8'
+    )
@@ -0,0 +1,241 @@
+"""
+Exportação do conteúdo publicado como site estático.
+
+``export_static`` renderiza a home, a lista de posts, os posts, as páginas,
+as listagens de categorias e tags e o CSS do tema em arquivos HTML/CSS
+(``/post/slug/`` vira ``post/slug/index.html``), prontos para um servidor de
+arquivos estáticos. Os arquivos de ``STATIC_ROOT`` e ``MEDIA_ROOT`` são
+servidos à parte, como hoje.
+
+Cada arquivo tem uma versão (derivada dos ``updated_at`` do que aparece nele)
+guardada no manifesto ``.manifest.json`` do diretório de saída; uma nova
+execução só renderiza os caminhos cuja versão mudou e apaga os que deixaram
+de existir. A renderização é distribuída em um pool de processos.
+
+As páginas são renderizadas com ``request.static_export``: não contam
+visualizações, não passam pelo cache de página e saem sem o formulário de
+comentários, que dependeria de POST e de um token CSRF.
+
+Listagens são exportadas apenas na primeira página: a paginação por cursor
+usa query string, que um servidor estático não distingue.
+"""
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.db.models import Count, Max, Q
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+
+MANIFEST_NAME = '.manifest.json'
+
+_output_dir = None
+_host = None
+
+
+def get_output_dir():
+    return str(getattr(settings, 'STATIC_EXPORT_ROOT', settings.BASE_DIR / 'static_export'))
+
+
+def _version(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _aggregate(queryset):
+    info = queryset.aggregate(last=Max('updated_at'), total=Count('pk'))
+    return info['last'], info['total']
+
+
+def get_site_version():
+    """Versão do que aparece em todas as páginas (configurações, menu, categorias, tema)"""
+    from .models import Category, Page, SiteSettings, Theme
+
+    theme = Theme.get_active_theme()
+    return _version(
+        SiteSettings.objects.values().first(),
+        list(Page.objects.filter(is_published=True, show_in_menu=True).values_list('pk', 'title', 'slug')),
+        list(Category.objects.filter(post_count__gt=0).values_list('pk', 'name', 'slug', 'post_count')),
+        theme.get_css_hash() if theme else None,
+    )
+
+
+def get_page_versions():
+    """Versão das seções de cada página ({page_id: versão})"""
+    from .models import PageSection
+
+    sections = defaultdict(list)
+    for row in PageSection.objects.order_by('page', 'order').values_list(
+        'page_id', 'section_id', 'order', 'is_active', 'section__updated_at'
+    ):
+        sections[row[0]].append(row[1:])
+    return {page_id: _version(rows) for page_id, rows in sections.items()}
+
+
+def get_targets():
+    """Retorna ``{caminho: versão}`` de tudo o que deve ser exportado"""
+    from .models import Page, Post, Section, Theme
+
+    site = get_site_version()
+    published = Post.objects.filter(status='published')
+    posts = _aggregate(published)
+    products = None
+    if apps.is_installed('ecommerce'):
+        # Home e páginas podem ter seções de produtos
+        products = _aggregate(apps.get_model('ecommerce', 'Product').objects.filter(is_active=True))
+    page_versions = get_page_versions()
+
+    targets = {
+        reverse('blog:home'): _version(
+            site, posts, _aggregate(Page.objects.all()), _aggregate(Section.objects.all()), products
+        ),
+        reverse('blog:post_list'): _version(site, posts),
+    }
+
+    theme = Theme.get_active_theme()
+    if theme:
+        css_hash = theme.get_css_hash()
+        targets[reverse('blog:theme_css')] = css_hash
+        targets[reverse('blog:theme_css_versioned', kwargs={'css_hash': css_hash})] = css_hash
+
+    # Posts: o próprio post e os comentários aprovados
+    for slug, updated_at, comments, last_comment in published.annotate(
+        comments_count=Count('comments', filter=Q(comments__is_approved=True)),
+        last_comment=Max('comments__created_at', filter=Q(comments__is_approved=True)),
+    ).values_list('slug', 'updated_at', 'comments_count', 'last_comment').order_by():
+        path = reverse('blog:post_detail', kwargs={'slug': slug})
+        targets[path] = _version(site, updated_at, comments, last_comment)
+
+    for pk, slug, updated_at in Page.objects.filter(is_published=True).values_list('pk', 'slug', 'updated_at'):
+        path = reverse('blog:page_detail', kwargs={'slug': slug})
+        targets[path] = _version(site, updated_at, page_versions.get(pk), products)
+
+    for slug, last, total in published.filter(category__post_count__gt=0).values('category__slug').annotate(
+        last=Max('updated_at'), total=Count('pk')
+    ).values_list('category__slug', 'last', 'total').order_by():
+        targets[reverse('blog:category', kwargs={'slug': slug})] = _version(site, last, total)
+
+    for slug, name, last, total in published.values('tags__slug', 'tags__name').annotate(
+        last=Max('updated_at'), total=Count('pk')
+    ).filter(tags__slug__isnull=False).values_list('tags__slug', 'tags__name', 'last', 'total').order_by():
+        targets[reverse('blog:tag', kwargs={'slug': slug})] = _version(site, name, last, total)
+
+    return targets
+
+
+def get_file_path(output_dir, path):
+    """Arquivo de saída de um caminho (``/post/x/`` -> ``post/x/index.html``)"""
+    relative = path.lstrip('/')
+    if not relative or relative.endswith('/'):
+        relative += 'index.html'
+    return os.path.join(output_dir, *relative.split('/'))
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as temp:
+        json.dump(manifest, temp, indent=0, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_path(path, output_dir=None, host=None):
+    """Renderiza ``path`` como visitante anônimo e grava o arquivo; retorna o status HTTP"""
+    request = RequestFactory().get(path, HTTP_HOST=host or _host or 'localhost')
+    request.user = AnonymousUser()
+    # Renderização para exportação: sem visualização, sem cache de página, sem formulários
+    request.static_export = True
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    if response.status_code != 200:
+        return response.status_code
+
+    file_path = get_file_path(output_dir or _output_dir, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path + '.tmp', 'wb') as output:
+        output.write(response.content)
+    os.replace(file_path + '.tmp', file_path)
+    return response.status_code
+
+
+def _init_worker(output_dir, host):
+    global _output_dir, _host
+    import django
+    from django.apps import apps as app_registry
+
+    # Com o método "spawn" (Windows/macOS) o processo filho começa sem o Django
+    if not app_registry.ready:
+        django.setup()
+    _output_dir, _host = output_dir, host
+
+
+def _worker(path):
+    try:
+        return path, render_path(path), None
+    except Exception as exc:
+        return path, None, f'{type(exc).__name__}: {exc}'
+
+
+def export_site(output_dir=None, workers=None, host=None, force=False):
+    """
+    Exporta o site para ``output_dir`` renderizando só o que mudou.
+
+    Retorna ``(renderizados, removidos, erros)``, onde ``erros`` é uma lista de
+    ``(caminho, mensagem)``.
+    """
+    output_dir = output_dir or get_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    targets = get_targets()
+    manifest = {} if force else load_manifest(output_dir)
+    changed = [path for path, version in targets.items() if manifest.get(path) != version]
+
+    rendered, errors = [], []
+
+    def collect(results):
+        for path, status, error in results:
+            if status == 200:
+                manifest[path] = targets[path]
+                rendered.append(path)
+            else:
+                manifest.pop(path, None)
+                errors.append((path, error or f'HTTP {status}'))
+
+    if workers == 0 or len(changed) <= 1:
+        _init_worker(output_dir, host)
+        collect(map(_worker, changed))
+    else:
+        # Os processos filhos abrem suas próprias conexões
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(output_dir, host)
+        ) as executor:
+            collect(executor.map(_worker, changed, chunksize=16))
+
+    removed = [path for path in list(manifest) if path not in targets]
+    for path in removed:
+        file_path = get_file_path(output_dir, path)
+        try:
+            os.remove(file_path)
+            # Remove também os diretórios que ficaram vazios (ex.: post/slug/)
+            os.removedirs(os.path.dirname(file_path))
+        except OSError:
+            pass
+        del manifest[path]
+
+    save_manifest(output_dir, manifest)
+    return rendered, removed, errors
@@ -0,0 +1,262 @@
+"""
+Armazenamento endereçado por conteúdo (content-addressed) dos uploads.
+
+``ContentAddressedStorage`` calcula o SHA-256 do arquivo enquanto o grava em
+disco em blocos e o guarda uma única vez em ``blobs/ab/cd/<sha256>.<ext>``:
+o mesmo arquivo enviado várias vezes ocupa espaço uma vez só, e o nome de um
+blob nunca muda de conteúdo (backups e sincronização com CDN só precisam
+copiar arquivos novos).
+
+A extensão e o tipo vêm dos primeiros bytes do arquivo (``detect_file_type``),
+não do nome enviado. Cada blob tem uma linha em ``StoredBlob`` com o número
+de referências a ele: o próprio upload conta a sua (na mesma transação que
+cria ou encontra a linha, antes de o arquivo ir para o lugar), e os signals
+em ``blog.signals`` contam as dos demais objetos que passam a usar o blob.
+Quando o último objeto deixa de usá-lo, o blob e os arquivos derivados dele
+(versões responsivas, miniaturas) são apagados, desde que a linha tenha mais
+de ``BLOB_COLLECT_GRACE_PERIOD`` segundos; os mais novos ficam para o comando
+``collect_blobs``.
+
+Os uploads do CKEditor são deduplicados da mesma forma, mas não têm linha em
+``StoredBlob``: quem os usa é o HTML do conteúdo dos posts, cujas referências
+não são contadas, e por isso eles nunca são apagados automaticamente.
+
+Arquivos cujo nome já começa com o hash de um blob (ex.: a versão
+``<sha256>.640w.webp`` gerada por ``blog.images``) são derivados e gravados
+com o nome recebido.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+# (assinatura, deslocamento, mime, extensão, tipo da biblioteca de mídia)
+SIGNATURES = [
+    (b'\xff\xd8\xff', 0, 'image/jpeg', '.jpg', 'image'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'image/png', '.png', 'image'),
+    (b'GIF87a', 0, 'image/gif', '.gif', 'image'),
+    (b'GIF89a', 0, 'image/gif', '.gif', 'image'),
+    (b'WEBP', 8, 'image/webp', '.webp', 'image'),
+    (b'BM', 0, 'image/bmp', '.bmp', 'image'),
+    (b'\x00\x00\x01\x00', 0, 'image/x-icon', '.ico', 'image'),
+    (b'AVI ', 8, 'video/x-msvideo', '.avi', 'video'),
+    (b'ftypqt', 4, 'video/quicktime', '.mov', 'video'),
+    (b'ftyp', 4, 'video/mp4', '.mp4', 'video'),
+    (b'\x1aE\xdf\xa3', 0, 'video/webm', '.webm', 'video'),
+    (b'0&\xb2u\x8ef\xcf\x11', 0, 'video/x-ms-wmv', '.wmv', 'video'),
+    (b'ID3', 0, 'audio/mpeg', '.mp3', 'audio'),
+    (b'OggS', 0, 'audio/ogg', '.ogg', 'audio'),
+    (b'WAVE', 8, 'audio/wav', '.wav', 'audio'),
+    (b'%PDF', 0, 'application/pdf', '.pdf', 'document'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 0, 'application/msword', '.doc', 'document'),
+]
+
+# Formatos do Office baseados em ZIP: identificados pelo conteúdo do pacote
+ZIP_SIGNATURE = b'PK\x03\x04'
+OFFICE_TYPES = [
+    (b'word/', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx', 'document'),
+    (b'xl/', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx', 'document'),
+    (b'ppt/', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx', 'document'),
+]
+UNKNOWN_TYPE = ('application/octet-stream', None, 'other')
+
+SNIFF_SIZE = 2048
+CHUNK_SIZE = 64 * 1024
+
+BLOB_NAME_RE = re.compile(r'^[0-9a-f]{64}')
+
+
+def detect_file_type(head):
+    """Retorna (mime, extensão, tipo) a partir dos primeiros bytes de um arquivo"""
+    for signature, offset, mime, ext, kind in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime, ext, kind
+    if head.startswith(ZIP_SIGNATURE):
+        for marker, mime, ext, kind in OFFICE_TYPES:
+            if marker in head:
+                return mime, ext, kind
+        return 'application/zip', '.zip', 'other'
+    text = head.lstrip()[:256].lower()
+    if text.startswith(b'<svg') or (text.startswith(b'<?xml') and b'<svg' in head.lower()):
+        return 'image/svg+xml', '.svg', 'image'
+    return UNKNOWN_TYPE
+
+
+def sniff_file(file):
+    """Lê o início de um arquivo (sem consumi-lo) e retorna (mime, extensão, tipo)"""
+    position = file.tell() if hasattr(file, 'tell') else None
+    file.seek(0)
+    head = file.read(SNIFF_SIZE)
+    file.seek(position or 0)
+    return detect_file_type(head)
+
+
+def is_derived_name(name):
+    """Indica se o arquivo é um blob ou derivado de um (nome começa com o hash)"""
+    return bool(BLOB_NAME_RE.match(posixpath.basename(name)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Storage em disco que grava cada conteúdo uma única vez, pelo seu SHA-256"""
+
+    blob_root = 'blobs'
+    # Registra o blob em StoredBlob e conta a referência do upload
+    count_references = True
+
+    def __init__(self, blob_root=None, **kwargs):
+        super().__init__(**kwargs)
+        if blob_root is not None:
+            self.blob_root = blob_root.strip('/')
+
+    def get_blob_name(self, digest, ext):
+        return posixpath.join(self.blob_root, digest[:2], digest[2:4], f'{digest}{ext}')
+
+    def get_available_name(self, name, max_length=None):
+        # O nome final só é conhecido depois do hash (em _save)
+        return name
+
+    def _save(self, name, content):
+        if is_derived_name(name):
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
+
+        # Grava em um arquivo temporário calculando o hash em blocos
+        incoming = os.path.join(self.location, self.blob_root, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        sha256 = hashlib.sha256()
+        head = b''
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if len(head) < SNIFF_SIZE:
+                        head += chunk[:SNIFF_SIZE - len(head)]
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+
+            mime, ext, _ = detect_file_type(head)
+            if ext is None:
+                ext = posixpath.splitext(name)[1].lower()
+            blob_name = self.get_blob_name(sha256.hexdigest(), ext)
+            blob_path = self.path(blob_name)
+
+            # A referência é contada antes de o arquivo ir para o lugar: um
+            # collect() concorrente não apaga mais o blob, e se já o apagou o
+            # arquivo é gravado de novo logo abaixo
+            if self.count_references:
+                count_upload(blob_name, sha256=sha256.hexdigest(), size=size, content_type=mime)
+
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                file_move_safe(temp_path, blob_path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(blob_path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return blob_name
+
+    def delete_blob(self, name):
+        """Apaga o blob e os arquivos derivados dele (versões, miniaturas)"""
+        directory, basename = posixpath.split(name)
+        digest = BLOB_NAME_RE.match(basename).group(0)
+        try:
+            _, files = self.listdir(directory)
+        except FileNotFoundError:
+            return
+        for filename in files:
+            if filename.startswith(digest):
+                self.delete(posixpath.join(directory, filename))
+
+
+def get_collect_grace_period():
+    """Idade mínima (segundos) de um blob sem referências para ser apagado"""
+    return getattr(settings, 'BLOB_COLLECT_GRACE_PERIOD', 5 * 60)
+
+
+def count_upload(name, **defaults):
+    """Conta a referência de um upload, criando a linha do blob se for novo"""
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+            return
+        _, created = StoredBlob.objects.get_or_create(name=name, defaults={**defaults, 'refcount': 1})
+        if not created:
+            # Criada por outro upload entre o UPDATE e o INSERT
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def add_reference(name):
+    """Registra mais um objeto usando o blob ``name``"""
+    from .models import StoredBlob
+
+    StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def collect_blob(name, storage):
+    """Apaga o blob se continua sem referências e passou da carência; retorna se apagou"""
+    from .models import StoredBlob
+
+    cutoff = timezone.now() - timedelta(seconds=get_collect_grace_period())
+    with transaction.atomic():
+        # DELETE condicional: um upload do mesmo conteúdo nesse meio tempo já contou
+        # sua referência. O arquivo é apagado antes do commit, com a linha travada
+        if not StoredBlob.objects.filter(name=name, refcount=0, created_at__lte=cutoff).delete()[0]:
+            return False
+        storage.delete_blob(name)
+    return True
+
+
+def collect_unreferenced_blobs(storage=None):
+    """Apaga todos os blobs sem referências fora da carência; retorna quantos"""
+    from .models import StoredBlob
+
+    storage = storage or get_content_storage()
+    cutoff = timezone.now() - timedelta(seconds=get_collect_grace_period())
+    names = list(StoredBlob.objects.filter(refcount=0, created_at__lte=cutoff).values_list('name', flat=True))
+    return sum(collect_blob(name, storage) for name in names)
+
+
+def remove_reference(name, storage):
+    """Remove uma referência ao blob; sem referências, ele é apagado após o commit"""
+    from .models import StoredBlob
+
+    updated = StoredBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    if updated:
+        transaction.on_commit(lambda: collect_blob(name, storage))
+
+
+_content_storage = None
+
+
+def get_content_storage():
+    """Storage dos campos de arquivo dos models (usado em ``storage=``)"""
+    global _content_storage
+    if _content_storage is None:
+        _content_storage = ContentAddressedStorage()
+    return _content_storage
+
+
+class CKEditorContentAddressedStorage(ContentAddressedStorage):
+    """Uploads do CKEditor, deduplicados dentro de ``CKEDITOR_UPLOAD_PATH`` e nunca coletados"""
+
+    count_references = False
+
+    def __init__(self, **kwargs):
+        super().__init__(blob_root=getattr(settings, 'CKEDITOR_UPLOAD_PATH', 'uploads/'), **kwargs)
@@ -1,6 +1,11 @@
 from django import template
-from blog.models import Post, Category
-from django.db.models import Count
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from blog.models import Post, Category, Theme
+from blog.images import FORMATS, get_renditions
+from blog.sections import render_section as render_section_html
+from taggit.models import Tag
 
 register = template.Library()
 
@@ -10,7 +15,7 @@ def get_recent_posts(count=3):
     """Retorna os posts mais recentes publicados"""
     return Post.objects.filter(
         status='published'
-    ).select_related('author', 'category').prefetch_related('tags').order_by('-published_at')[:count]
+    ).select_related('author', 'category').prefetch_related('tags').defer('content', 'plain_text').order_by('-published_at')[:count]
 
 
 @register.simple_tag
@@ -18,15 +23,73 @@ def get_popular_posts(count=5):
     """Retorna os posts mais populares (por visualizações)"""
     return Post.objects.filter(
         status='published'
-    ).select_related('author', 'category').order_by('-views')[:count]
+    ).select_related('author', 'category').defer('content', 'plain_text').order_by('-views')[:count]
 
 
 @register.simple_tag
 def get_categories_with_count():
     """Retorna categorias com contagem de posts"""
-    return Category.objects.annotate(
-        post_count=Count('posts')
-    ).filter(post_count__gt=0).order_by('-post_count')
+    return Category.objects.filter(post_count__gt=0).order_by('-post_count')
+
+
+@register.simple_tag
+def get_popular_tags(count=10):
+    """Retorna as tags com mais posts publicados"""
+    return Tag.objects.filter(
+        post_stats__post_count__gt=0
+    ).select_related('post_stats').order_by('-post_stats__post_count')[:count]
+
+
+@register.simple_tag
+def theme_css_url():
+    """Retorna a URL versionada (com hash do conteúdo) do CSS do tema ativo"""
+    theme = Theme.get_active_theme()
+    if theme:
+        return reverse('blog:theme_css_versioned', kwargs={'css_hash': theme.get_css_hash()})
+    return reverse('blog:theme_css')
+
+
+@register.simple_tag(takes_context=True)
+def render_section(context, section):
+    """Renderiza uma seção do construtor de páginas (com cache de fragmentos)"""
+    # As views de página renderizam todas as seções de uma vez (section_html)
+    rendered = context.get('section_html') or {}
+    if section.pk in rendered:
+        return rendered[section.pk]
+    return render_section_html(section)
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', style='', css_class='', loading='lazy'):
+    """
+    Renderiza uma imagem com ``srcset``/``sizes`` a partir das versões geradas
+    por ``blog.images``: um ``<source>`` por formato (WebP primeiro) e o
+    original como ``src`` de fallback.
+
+    Uso: {% responsive_image product.featured_image product.name sizes="(max-width: 600px) 100vw, 300px" %}
+    """
+    if not image:
+        return ''
+
+    by_format = {}
+    for fmt, width, name in get_renditions(image.name):
+        by_format.setdefault(fmt, []).append((default_storage.url(name), width))
+
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (FORMATS[fmt][2], ', '.join(f'{url} {width}w' for url, width in candidates), sizes)
+        for fmt, candidates in by_format.items()
+    ))
+    img = format_html(
+        '<img src="{}" alt="{}"{}{} loading="{}" decoding="async">',
+        image.url, alt,
+        format_html(' class="{}"', css_class) if css_class else '',
+        format_html(' style="{}"', style) if style else '',
+        loading,
+    )
+    if not sources:
+        return img
+    # display: contents mantém o layout do <img> como se ele fosse filho direto do container
+    return format_html('<picture style="display: contents">{}{}</picture>', sources, img)
 
 
 @register.filter
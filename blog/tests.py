@@ -1,3 +1,307 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from taggit.models import Tag
+
+from .counters import recount_categories
+from .models import Category, Media, Post, SiteSettings, StoredBlob, TagPostCount
+from .pagination import encode_cursor
+from .scheduler import publish_due_posts
+from .view_counter import ENTRY_KEY, _next_sequence, flush_views, get_pending_views, record_view
+
+
+# Intervalo longo: a thread de gravação dos contadores não roda durante os testes
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600)
+class BlogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Contadores pendentes não podem sobrar para o flush do fim do processo
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('autor', 'autor@example.com', 'senha')
+        self.category = Category.objects.create(name='Python')
+        SiteSettings.get_settings()
+        self.client = Client()
+
+    def create_post(self, title, status='published', category=None, tags=(), **kwargs):
+        kwargs.setdefault('published_at', timezone.now())
+        post = Post.objects.create(
+            title=title, author=self.user, content=f'<p>Conteúdo de {title}</p>', status=status,
+            category=category or self.category, **kwargs
+        )
+        if tags:
+            post.tags.add(*tags)
+        return post
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class QueryCountTests(BlogTestCase):
+    """O número de consultas das páginas não cresce com o número de posts, tags ou comentários"""
+
+    def test_post_list_query_count_is_constant(self):
+        for n in range(2):
+            self.create_post(f'Post {n}', tags=[f'tag-{n}', 'comum'])
+        expected = self.count_queries(reverse('blog:post_list'))
+
+        for n in range(2, 8):
+            self.create_post(f'Post {n}', tags=[f'tag-{n}', 'comum'])
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.client.get(reverse('blog:post_list'))
+
+    def test_post_detail_query_count_is_constant(self):
+        post = self.create_post('Principal', tags=['a'])
+        url = post.get_absolute_url()
+        post.comments.create(author=self.user, content='Primeiro', is_approved=True)
+        expected = self.count_queries(url)
+
+        self.create_post('Vizinho', tags=['a'])
+        parent = post.comments.create(author=self.user, content='Outro', is_approved=True)
+        for n in range(4):
+            post.comments.create(author=self.user, content=f'Resposta {n}', parent=parent, is_approved=True)
+        post.tags.add('b', 'c')
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.client.get(url)
+
+
+class PageCacheTests(BlogTestCase):
+    def test_saving_a_post_invalidates_the_cached_list(self):
+        post = self.create_post('Título original')
+        url = reverse('blog:post_list')
+
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        post.title = 'Título novo'
+        post.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Título novo')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+    def test_authenticated_requests_skip_the_cache(self):
+        self.create_post('Post')
+        self.client.force_login(self.user)
+        self.assertFalse(self.client.get(reverse('blog:post_list')).has_header('X-Page-Cache'))
+
+
+class ViewCounterTests(BlogTestCase):
+    def get_views(self, post):
+        post.refresh_from_db()
+        return post.views
+
+    def test_flush_writes_pending_views(self):
+        first = self.create_post('Primeiro')
+        second = self.create_post('Segundo')
+        for _ in range(3):
+            record_view(first)
+        record_view(second)
+        self.assertEqual(get_pending_views(first), 3)
+        self.assertEqual(self.get_views(first), 0)
+
+        self.assertEqual(flush_views(), 4)
+        self.assertEqual((self.get_views(first), self.get_views(second)), (3, 1))
+        self.assertEqual(get_pending_views(first), 0)
+        self.assertEqual(flush_views(), 0)
+
+        # Depois do flush, o objeto volta a ser registrado no diário
+        record_view(first)
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.get_views(first), 4)
+
+    def test_missing_entry_is_waited_for_once(self):
+        post = self.create_post('Post')
+        # Número reservado por uma visualização cuja entrada ainda não foi gravada
+        _next_sequence()
+        record_view(post)
+
+        self.assertEqual(flush_views(), 0)
+        self.assertEqual(self.get_views(post), 0)
+        # No flush seguinte a entrada ausente é dada como perdida
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.get_views(post), 1)
+
+    def test_late_entry_is_flushed(self):
+        post = self.create_post('Post')
+        late = _next_sequence()
+        record_view(post)
+        self.assertEqual(flush_views(), 0)
+
+        cache.set(ENTRY_KEY.format(n=late), (post._meta.label_lower, post.pk))
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.get_views(post), 1)
+
+
+@override_settings(BLOG_MAX_OFFSET_PAGE=2)
+class CursorPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        settings = SiteSettings.get_settings()
+        settings.posts_per_page = 2
+        settings.save()
+        # Datas empatadas: o desempate é pelo id
+        published_at = timezone.now() - timedelta(days=1)
+        self.posts = [self.create_post(f'Post {n}', published_at=published_at) for n in range(7)]
+        self.expected = [post.pk for post in sorted(self.posts, key=lambda post: post.pk, reverse=True)]
+        self.url = reverse('blog:post_list')
+
+    def get_page(self, **params):
+        cache.clear()
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj'], [post.pk for post in response.context['posts']]
+
+    def test_cursor_continues_after_last_numbered_page_without_gaps(self):
+        seen = []
+        for number in (1, 2):
+            page, pks = self.get_page(page=number)
+            seen += pks
+        self.assertIsNotNone(page.next_cursor)
+
+        while page.next_cursor:
+            page, pks = self.get_page(cursor=page.next_cursor)
+            seen += pks
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(page.has_next())
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        page, _ = self.get_page(page=2)
+        page, pks = self.get_page(cursor=page.next_cursor)
+        self.assertEqual(pks, self.expected[4:6])
+        _, pks = self.get_page(cursor=page.previous_cursor)
+        self.assertEqual(pks, self.expected[2:4])
+
+    def test_distant_pages_and_invalid_cursors_are_not_found(self):
+        self.assertEqual(self.client.get(self.url, {'page': 3}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'inválido'}).status_code, 404)
+        # Cursor depois do último post: página vazia
+        oldest = Post.objects.get(pk=self.expected[-1])
+        self.assertEqual(self.client.get(self.url, {'cursor': encode_cursor(oldest, 'n')}).status_code, 404)
+
+
+class CounterTests(BlogTestCase):
+    def get_counts(self, category, *tags):
+        category.refresh_from_db()
+        stats = dict(TagPostCount.objects.filter(tag__name__in=tags).values_list('tag__name', 'post_count'))
+        return category.post_count, [stats.get(tag, 0) for tag in tags]
+
+    def test_counts_follow_publication_category_and_tags(self):
+        other = Category.objects.create(name='Django')
+        post = self.create_post('Post', tags=['a', 'b'])
+        self.create_post('Rascunho', status='draft', tags=['a'])
+        self.assertEqual(self.get_counts(self.category, 'a', 'b'), (1, [1, 1]))
+
+        post.category = other
+        post.save()
+        self.assertEqual(self.get_counts(self.category), (0, []))
+        self.assertEqual(self.get_counts(other), (1, []))
+
+        post.tags.remove(Tag.objects.get(name='b'))
+        self.assertEqual(self.get_counts(other, 'a', 'b'), (1, [1, 0]))
+
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self.get_counts(other, 'a'), (0, [0]))
+
+        post.status = 'published'
+        post.save()
+        post.delete()
+        self.assertEqual(self.get_counts(other, 'a'), (0, [0]))
+
+    def test_recount_fixes_updates_without_signals(self):
+        self.create_post('Post')
+        Post.objects.update(status='draft')
+        self.assertEqual(self.get_counts(self.category), (1, []))
+        recount_categories()
+        self.assertEqual(self.get_counts(self.category), (0, []))
+
+
+class SchedulerTests(BlogTestCase):
+    def test_publishes_only_due_posts(self):
+        now = timezone.now()
+        due = self.create_post('Vencido', status='scheduled', published_at=now - timedelta(minutes=1), tags=['a'])
+        future = self.create_post('Futuro', status='scheduled', published_at=now + timedelta(hours=1))
+
+        self.assertEqual([post.pk for post in publish_due_posts(now=now)], [due.pk])
+        due.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual((due.status, future.status), ('published', 'scheduled'))
+        # Contadores atualizados sem os signals do save()
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.post_count, 1)
+        self.assertEqual(TagPostCount.objects.get(tag__name='a').post_count, 1)
+        self.assertEqual(publish_due_posts(now=now), [])
+
+    def test_publishes_in_batches_with_a_single_update(self):
+        now = timezone.now()
+        for n in range(3):
+            self.create_post(f'Agendado {n}', status='scheduled', published_at=now - timedelta(minutes=3 - n))
+
+        with CaptureQueriesContext(connection) as queries:
+            published = publish_due_posts(now=now, batch_size=2)
+        # Os dois mais antigos
+        self.assertEqual(sorted(post.title for post in published), ['Agendado 0', 'Agendado 1'])
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "blog_post"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([post.title for post in publish_due_posts(now=now, batch_size=2)], ['Agendado 2'])
+
+
+class BlobReferenceTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, data, name='arquivo.pdf'):
+        return ContentFile(data, name=name)
+
+    def get_refcount(self, name):
+        return StoredBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_one_blob(self):
+        first = Media.objects.create(title='a', file=self.upload(b'%PDF-1.4 um'))
+        second = Media.objects.create(title='b', file=self.upload(b'%PDF-1.4 um', name='copia.pdf'))
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.endswith('.pdf'))
+        self.assertEqual(self.get_refcount(first.file.name), 2)
+
+        first.delete()
+        self.assertEqual(self.get_refcount(second.file.name), 1)
+
+    def test_replacing_and_reuploading_adjust_references(self):
+        media = Media.objects.create(title='a', file=self.upload(b'%PDF-1.4 um'))
+        old = media.file.name
+
+        # Mesmo conteúdo enviado de novo para o mesmo campo
+        media.file = self.upload(b'%PDF-1.4 um', name='de-novo.pdf')
+        media.save()
+        self.assertEqual(media.file.name, old)
+        self.assertEqual(self.get_refcount(old), 1)
+
+        media.file = self.upload(b'%PDF-1.4 dois')
+        media.save()
+        self.assertEqual(self.get_refcount(old), 0)
+        self.assertEqual(self.get_refcount(media.file.name), 1)
+
+        # Salvar sem trocar o arquivo não conta outra referência
+        media.title = 'b'
+        media.save()
+        self.assertEqual(self.get_refcount(media.file.name), 1)
@@ -0,0 +1,42 @@
+"""
+Texto derivado do conteúdo HTML dos posts.
+
+As funções daqui são usadas por ``Post.save`` para gravar, uma única vez, o
+texto puro, o resumo, o número de palavras e o tempo de leitura, em vez de
+recalculá-los com filtros de template a cada renderização.
+"""
+import html
+import math
+import re
+
+from django.utils.html import strip_tags
+
+
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 200
+
+
+def html_to_text(value):
+    """Converte HTML (ex.: conteúdo do CKEditor) em texto puro"""
+    text = html.unescape(strip_tags(value or ''))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def make_excerpt(text, max_length=EXCERPT_LENGTH):
+    """Resumo de até ``max_length`` caracteres, sem cortar palavras no meio"""
+    if len(text) <= max_length:
+        return text
+    head = text[:max_length + 1]
+    cut = head.rsplit(' ', 1)[0] if ' ' in head else head[:max_length]
+    return cut.rstrip(' ,;:.-–—') + '…'
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def get_reading_time(word_count):
+    """Tempo de leitura em minutos (no mínimo 1 para textos não vazios)"""
+    if not word_count:
+        return 0
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE))
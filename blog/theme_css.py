@@ -0,0 +1,247 @@
+"""
+Compilação do CSS dos temas.
+
+O CSS de um tema é gerado e minificado quando o tema é salvo, e gravado no
+storage de mídia com o hash do conteúdo no nome (``themes/theme.<hash>.css``),
+junto com as variantes pré-comprimidas em gzip e, se o pacote ``brotli``
+estiver instalado, em brotli. Como o conteúdo de um arquivo nunca muda, o
+navegador pode guardá-lo indefinidamente; ao mudar o tema, muda o hash e,
+com ele, a URL usada em ``base.html``.
+"""
+import gzip
+import hashlib
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+THEME_CSS_DIR = 'themes'
+
+# Extensões das variantes pré-comprimidas, indexadas pelo Content-Encoding
+ENCODING_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+def render_theme_css(theme):
+    """Gera o CSS (não minificado) com as variáveis do tema"""
+    css = f"""
+/* WordPy CMS - CSS Dinâmico do Tema: {theme.name} */
+
+:root {{
+    /* Cores principais */
+    --primary-color: {theme.primary_color};
+    --secondary-color: {theme.secondary_color};
+    --accent-color: {theme.accent_color};
+
+    /* Cores de texto */
+    --text-color: {theme.text_color};
+    --heading-color: {theme.heading_color};
+    --link-color: {theme.link_color};
+    --link-hover-color: {theme.link_hover_color};
+
+    /* Cores de fundo */
+    --background-color: {theme.background_color};
+    --secondary-bg-color: {theme.secondary_bg_color};
+
+    /* Header e Footer */
+    --header-bg-color: {theme.header_bg_color};
+    --header-text-color: {theme.header_text_color};
+    --footer-bg-color: {theme.footer_bg_color};
+    --footer-text-color: {theme.footer_text_color};
+
+    /* Botões */
+    --button-bg-color: {theme.button_bg_color};
+    --button-text-color: {theme.button_text_color};
+    --button-hover-bg-color: {theme.button_hover_bg_color};
+
+    /* Tipografia */
+    --font-family: {theme.font_family};
+    --heading-font-family: {theme.heading_font_family or theme.font_family};
+    --font-size-base: {theme.font_size_base};
+    --line-height: {theme.line_height};
+
+    /* Espaçamento e Layout */
+    --border-radius: {theme.border_radius};
+    --box-shadow: {theme.box_shadow};
+}}
+
+/* Aplicar variáveis do tema */
+body {{
+    font-family: var(--font-family);
+    font-size: var(--font-size-base);
+    line-height: var(--line-height);
+    color: var(--text-color);
+    background: var(--background-color);
+}}
+
+h1, h2, h3, h4, h5, h6 {{
+    font-family: var(--heading-font-family);
+    color: var(--heading-color);
+}}
+
+a {{
+    color: var(--link-color);
+}}
+
+a:hover {{
+    color: var(--link-hover-color);
+}}
+
+header {{
+    background: var(--header-bg-color);
+    color: var(--header-text-color);
+}}
+
+header a {{
+    color: var(--header-text-color);
+}}
+
+footer {{
+    background: var(--footer-bg-color);
+    color: var(--footer-text-color);
+}}
+
+footer a {{
+    color: var(--footer-text-color);
+}}
+
+button, .button, .btn {{
+    background: var(--button-bg-color);
+    color: var(--button-text-color);
+    border-radius: var(--border-radius);
+}}
+
+button:hover, .button:hover, .btn:hover {{
+    background: var(--button-hover-bg-color);
+}}
+
+.sidebar, article, .section {{
+    border-radius: var(--border-radius);
+    box-shadow: var(--box-shadow);
+}}
+
+.section-hero,
+.section-text,
+.section-text-image,
+.section-cta,
+.section-features {{
+    /* Seções podem usar as variáveis de cores */
+}}
+
+/* CSS Customizado do Tema */
+{theme.custom_css}
+"""
+    return css
+
+
+# Trechos copiados sem alteração na minificação: strings entre aspas e url() sem
+# aspas (que podem conter "/*", ";" ou espaços significativos), e comentários
+CSS_LITERALS = re.compile(
+    r'(?P<literal>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\(\s*[^\s"\'()]*\s*\))'
+    r'|/\*.*?\*/',
+    re.DOTALL | re.IGNORECASE,
+)
+LITERAL_PLACEHOLDER = '\x00{}\x00'
+
+
+def minify_css(css):
+    """Remove comentários e espaços desnecessários do CSS, preservando strings e url()"""
+    literals = []
+
+    def protect(match):
+        if match.group('literal') is None:
+            return ''
+        literals.append(match.group('literal'))
+        return LITERAL_PLACEHOLDER.format(len(literals) - 1)
+
+    css = CSS_LITERALS.sub(protect, css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Só o espaço depois de ":"; antes dele o espaço é um seletor descendente
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    # Remove regras que ficaram vazias (ex.: blocos que só tinham comentários)
+    css = re.sub(r'[^{}]+\{\}', '', css)
+    css = re.sub(r'\x00(\d+)\x00', lambda match: literals[int(match.group(1))], css)
+    return css.strip()
+
+
+def parse_accept_encoding(header):
+    """Retorna {codificação: q} do cabeçalho Accept-Encoding (q inválido conta como 0)"""
+    qvalues = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+
+def get_accepted_encodings(header):
+    """Variantes pré-comprimidas aceitas pelo cliente, da preferida para a menos preferida"""
+    qvalues = parse_accept_encoding(header)
+    default = qvalues.get('*', 0.0)
+    accepted = [(qvalues.get(encoding, default), encoding) for encoding in ENCODING_SUFFIXES]
+    # Ordenação estável: no empate vale a ordem de ENCODING_SUFFIXES (brotli antes de gzip)
+    return [encoding for q, encoding in sorted(accepted, key=lambda item: -item[0]) if q > 0]
+
+
+def get_css_path(css_hash, encoding=None):
+    """Caminho, no storage, do CSS compilado (ou de uma variante comprimida)"""
+    return f'{THEME_CSS_DIR}/theme.{css_hash}.css{ENCODING_SUFFIXES.get(encoding, "")}'
+
+
+def compile_theme_css(theme):
+    """Compila o CSS do tema, grava as variantes no storage e retorna o hash"""
+    css = minify_css(render_theme_css(theme)).encode('utf-8')
+    css_hash = hashlib.sha256(css).hexdigest()[:16]
+
+    variants = {None: css, 'gzip': gzip.compress(css, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(css)
+
+    for encoding, data in variants.items():
+        path = get_css_path(css_hash, encoding)
+        # O nome depende do conteúdo: se já existe, é idêntico
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(data))
+
+    return css_hash
+
+
+# Conteúdo já lido do storage, por (hash, encoding). Só guarda arquivos que
+# existem: um hash ausente pode ser compilado depois por outro processo.
+_compiled_css = {}
+_COMPILED_CSS_MAX_ENTRIES = 64
+
+
+def read_compiled_css(css_hash, encoding=None):
+    """Lê o CSS compilado do storage (em cache no processo; retorna None se não existe)"""
+    key = (css_hash, encoding)
+    if key not in _compiled_css:
+        path = get_css_path(css_hash, encoding)
+        if not default_storage.exists(path):
+            return None
+        with default_storage.open(path, 'rb') as f:
+            data = f.read()
+        if len(_compiled_css) >= _COMPILED_CSS_MAX_ENTRIES:
+            _compiled_css.clear()
+        _compiled_css[key] = data
+    return _compiled_css[key]
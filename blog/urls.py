@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, sitemaps, views
 
 app_name = 'blog'
 
@@ -11,5 +11,14 @@ urlpatterns = [
     path('tag/<slug:slug>/', views.TagPostListView.as_view(), name='tag'),
     path('page/<slug:slug>/', views.PageDetailView.as_view(), name='page_detail'),
     path('search/', views.SearchView.as_view(), name='search'),
+    path('feed/', feeds.conditional_feed(feeds.LatestPostsFeed()), name='feed'),
+    path('feed/atom/', feeds.conditional_feed(feeds.LatestPostsAtomFeed()), name='feed_atom'),
+    path('category/<slug:slug>/feed/', feeds.conditional_feed(feeds.CategoryPostsFeed(), 'category'), name='category_feed'),
+    path('category/<slug:slug>/feed/atom/', feeds.conditional_feed(feeds.CategoryPostsAtomFeed(), 'category'), name='category_feed_atom'),
+    path('tag/<slug:slug>/feed/', feeds.conditional_feed(feeds.TagPostsFeed(), 'tag'), name='tag_feed'),
+    path('tag/<slug:slug>/feed/atom/', feeds.conditional_feed(feeds.TagPostsAtomFeed(), 'tag'), name='tag_feed_atom'),
+    path('sitemap.xml', sitemaps.sitemap_index_view, name='sitemap'),
+    path('sitemap-<str:section>-<int:partition>.xml', sitemaps.sitemap_section_view, name='sitemap_section'),
     path('theme.css', views.theme_css_view, name='theme_css'),
+    path('theme.<str:css_hash>.css', views.theme_css_view, name='theme_css_versioned'),
 ]
@@ -0,0 +1,219 @@
+"""
+Contadores de visualização com escrita adiada (write-behind).
+
+Em vez de gravar ``views += 1`` no banco a cada acesso, as visualizações são
+acumuladas no cache do Django e gravadas em lote, no máximo uma vez a cada
+``VIEW_COUNT_FLUSH_INTERVAL`` segundos, com ``UPDATE ... SET views = views + n``
+(um UPDATE por model e por valor de ``n``). A gravação roda numa thread de
+fundo de cada processo, nunca na requisição que registrou a visualização.
+
+Os objetos com visualizações pendentes ficam num diário no cache: a primeira
+visualização de um objeto desde o último flush grava uma entrada própria
+(``views:entry:<n>``, com ``n`` vindo de um contador), sem ler nem reescrever
+um conjunto compartilhado. O flush lê as entradas desde a última posição
+gravada e só avança sobre as que encontrou: uma entrada ausente pode ainda
+estar sendo gravada (o número é reservado antes), e só é dada como perdida se
+continuar ausente no flush seguinte. Só um processo por vez faz o flush
+(``FLUSH_RUNNING_KEY``).
+
+Qualquer model com um campo inteiro ``views`` pode usar ``record_view``. O
+comando ``flush_view_counts`` força a gravação dos contadores pendentes.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+
+
+logger = logging.getLogger(__name__)
+
+COUNT_KEY = 'views:{label}:{pk}'
+REGISTERED_KEY = 'views:registered:{label}:{pk}'
+SEQUENCE_KEY = 'views:sequence'
+ENTRY_KEY = 'views:entry:{n}'
+GAP_KEY = 'views:gap:{n}'
+FLUSHED_KEY = 'views:flushed'
+FLUSH_LOCK_KEY = 'views:flush_lock'
+FLUSH_RUNNING_KEY = 'views:flush_running'
+
+# Entradas do diário lidas por vez no flush
+BATCH_SIZE = 1000
+# Tempo máximo (segundos) de um flush antes que outro possa começar
+FLUSH_RUNNING_TIMEOUT = 5 * 60
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def get_flush_interval():
+    """Intervalo (segundos) entre gravações dos contadores no banco"""
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 60)
+
+
+def get_entry_timeout():
+    """Tempo de vida das entradas do diário e das marcas de registro"""
+    return get_flush_interval() * 5
+
+
+def record_view(obj):
+    """Registra uma visualização de ``obj`` (gravada no banco no próximo flush)"""
+    label = obj._meta.label_lower
+    key = COUNT_KEY.format(label=label, pk=obj.pk)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # A chave expirou entre o add() e o incr()
+            cache.add(key, 1, timeout=None)
+    _register_pending(label, obj.pk)
+    _start_flusher()
+
+
+def _start_flusher():
+    """Inicia, uma vez por processo, a thread que grava os contadores a cada intervalo"""
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            # Com cache local (LocMem) os contadores morrem com o processo
+            atexit.register(_flush_at_exit)
+            _flusher = threading.Thread(target=_flush_periodically, name='view-counter-flush', daemon=True)
+            _flusher.start()
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(get_flush_interval())
+        # Apenas um flush por intervalo entre todos os processos
+        if cache.add(FLUSH_LOCK_KEY, True, timeout=get_flush_interval()):
+            try:
+                flush_views()
+            except Exception:
+                logger.exception('Falha ao gravar os contadores de visualização')
+            finally:
+                # A thread tem as próprias conexões com o banco
+                connections.close_all()
+
+
+def _next_sequence():
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    try:
+        return cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        cache.add(SEQUENCE_KEY, 1, timeout=None)
+        return cache.get(SEQUENCE_KEY, 1)
+
+
+def _register_pending(label, pk):
+    """Grava uma entrada no diário na primeira visualização do objeto desde o último flush"""
+    # A marca expira sozinha: se a entrada se perder (ex.: descartada pelo
+    # cache), o objeto volta a ser registrado depois de alguns intervalos
+    timeout = get_entry_timeout()
+    if cache.add(REGISTERED_KEY.format(label=label, pk=pk), True, timeout=timeout):
+        cache.set(ENTRY_KEY.format(n=_next_sequence()), (label, pk), timeout=timeout)
+
+
+def get_pending_views(obj):
+    """Retorna quantas visualizações de ``obj`` ainda não foram gravadas"""
+    return cache.get(COUNT_KEY.format(label=obj._meta.label_lower, pk=obj.pk)) or 0
+
+
+def flush_views():
+    """
+    Grava no banco as visualizações acumuladas e retorna o total gravado.
+
+    Retorna None, sem gravar nada, se outro processo já está fazendo o flush.
+    """
+    if not cache.add(FLUSH_RUNNING_KEY, True, timeout=FLUSH_RUNNING_TIMEOUT):
+        return None
+    try:
+        end = cache.get(SEQUENCE_KEY) or 0
+        start = cache.get(FLUSHED_KEY) or 0
+        if start > end:
+            # O contador do diário foi descartado pelo cache e recomeçou
+            start = 0
+        total = 0
+        for first in range(start + 1, end + 1, BATCH_SIZE):
+            numbers = range(first, min(first + BATCH_SIZE, end + 1))
+            found = cache.get_many([ENTRY_KEY.format(n=n) for n in numbers])
+            flushed = _contiguous_entries(numbers, found)
+            entry_keys = [ENTRY_KEY.format(n=n) for n in numbers[:flushed]]
+            total += _flush_pending({found[key] for key in entry_keys if key in found})
+            cache.delete_many(entry_keys)
+            if flushed:
+                cache.set(FLUSHED_KEY, numbers[flushed - 1], timeout=None)
+            if flushed < len(numbers):
+                # Entrada ainda não gravada: o restante fica para o próximo flush
+                break
+        return total
+    finally:
+        cache.delete(FLUSH_RUNNING_KEY)
+
+
+def _contiguous_entries(numbers, found):
+    """
+    Quantas entradas do início de ``numbers`` podem ser gravadas agora.
+
+    Para na primeira ausente, a menos que ela já estivesse ausente no flush
+    anterior (entrada perdida: descartada pelo cache ou expirada).
+    """
+    for index, n in enumerate(numbers):
+        if ENTRY_KEY.format(n=n) in found:
+            continue
+        if cache.add(GAP_KEY.format(n=n), True, timeout=get_entry_timeout()):
+            return index
+    return len(numbers)
+
+
+def _flush_pending(pending):
+    """Grava as visualizações dos objetos ``{(label, pk)}``; retorna o total gravado"""
+    if not pending:
+        return 0
+
+    # Visualizações a partir daqui registram o objeto de novo no diário,
+    # inclusive as que chegarem depois da leitura dos contadores
+    cache.delete_many([REGISTERED_KEY.format(label=label, pk=pk) for label, pk in pending])
+
+    keys = {COUNT_KEY.format(label=label, pk=pk): (label, pk) for label, pk in pending}
+    counts = cache.get_many(keys)
+
+    # label -> n -> [pks]: objetos com o mesmo incremento vão no mesmo UPDATE
+    grouped = defaultdict(lambda: defaultdict(list))
+    for key, count in counts.items():
+        if count:
+            label, pk = keys[key]
+            grouped[label][count].append(pk)
+
+    total = 0
+    with transaction.atomic():
+        for label, by_count in grouped.items():
+            model = apps.get_model(label)
+            for count, pks in by_count.items():
+                model.objects.filter(pk__in=pks).update(views=F('views') + count)
+                total += count * len(pks)
+
+    # Desconta apenas o que foi gravado: incrementos concorrentes são preservados
+    for label, by_count in grouped.items():
+        for count, pks in by_count.items():
+            for pk in pks:
+                try:
+                    cache.decr(COUNT_KEY.format(label=label, pk=pk), count)
+                except ValueError:
+                    pass
+
+    return total
+
+
+def _flush_at_exit():
+    try:
+        flush_views()
+    except Exception:
+        logger.exception('Falha ao gravar os contadores de visualização')
@@ -1,26 +1,77 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q, Count
+from django.conf import settings
 from django.contrib import messages
-from django.http import HttpResponse
-from .models import Post, Category, Page, Comment, SiteSettings, Theme
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, Http404
+from django.utils.cache import get_conditional_response
+from .models import Post, Category, Page, Comment, SiteSettings, Theme, Section
+from .cache import get_site_context
+from .conditional import ConditionalGetMixin, latest
+from .page_cache import PageCacheMixin, get_tag_versions
+from .pagination import CursorPaginationMixin
+from .related import get_related_count
+from .search import SearchResults
+from .sections import render_sections
+from .theme_css import get_accepted_encodings, read_compiled_css
+from .view_counter import record_view
 from taggit.models import Tag
 
 
-def get_site_context():
-    """Retorna contexto global do site"""
-    return {
-        'site_settings': SiteSettings.get_settings(),
-        'menu_pages': Page.objects.filter(is_published=True, show_in_menu=True),
-        'categories': Category.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0),
-        'active_theme': Theme.get_active_theme(),
-    }
+def build_comment_tree(comments):
+    """
+    Monta a árvore de comentários em uma única passada.
 
+    Cada comentário recebe o atributo ``reply_list`` com suas respostas (em
+    ordem de criação). Respostas cujo comentário pai não está em ``comments``
+    (ex.: pai não aprovado) são descartadas. Retorna os comentários raiz.
+    """
+    comments = list(comments)
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.reply_list = []
+    for comment in comments:
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            by_id[comment.parent_id].reply_list.append(comment)
+    return roots
 
-class HomeView(TemplateView):
+
+def get_active_page_sections(page):
+    """Seções ativas da página, em ordem"""
+    return list(page.page_sections.filter(is_active=True).select_related('section').order_by('order'))
+
+
+def get_page_dependencies(page, page_sections):
+    """Etiquetas do cache de páginas para uma página e suas seções"""
+    dependencies = {f'page:{page.pk}'}
+    for page_section in page_sections:
+        dependencies.add(f'section:{page_section.section_id}')
+        if page_section.section.section_type == 'products':
+            dependencies.add('products')
+    return dependencies
+
+
+def get_posts_state(queryset):
+    """Estado de uma listagem de posts para o GET condicional: (último updated_at, partes)"""
+    info = queryset.aggregate(last=Max('updated_at'), total=Count('pk'))
+    return info['last'], (info['last'], info['total'])
+
+
+class HomeView(PageCacheMixin, ConditionalGetMixin, TemplateView):
     """View para página inicial - pode ser uma página customizada ou lista de posts"""
 
+    def get_conditional_state(self):
+        # A home pode ser a lista de posts ou uma página com seções (inclusive de produtos)
+        last_post, posts = get_posts_state(Post.objects.filter(status='published'))
+        last_page = Page.objects.aggregate(last=Max('updated_at'))['last']
+        last_section = Section.objects.aggregate(last=Max('updated_at'))['last']
+        products = get_tag_versions(['products'])
+        return latest(last_post, last_page, last_section), (posts, last_page, last_section, products)
+
     def get(self, request, *args, **kwargs):
         site_settings = SiteSettings.get_settings()
 
@@ -33,45 +84,59 @@ class HomeView(TemplateView):
 
     def render_custom_home(self, page):
         """Renderiza página customizada como home"""
-        from ecommerce.models import Product
         context = get_site_context()
         context['page'] = page
-        context['page_sections'] = page.page_sections.filter(is_active=True).select_related('section').order_by('order')
+        context['page_sections'] = get_active_page_sections(page)
+        # Os dados de cada seção (ex.: produtos) são carregados só para as seções presentes
+        context['section_html'] = render_sections(ps.section for ps in context['page_sections'])
         context['is_home'] = True
-        # Adicionar produtos para seções de produtos
-        context['products'] = Product.objects.filter(is_active=True).order_by('-created_at')[:15]
+        self.page = page
+        self.page_sections = context['page_sections']
         return render(self.request, 'blog/home_page.html', context)
 
     def render_post_list(self):
         """Renderiza lista de posts como home (fallback)"""
-        posts = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags').order_by('-published_at')[:10]
+        posts = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags').defer('content', 'plain_text').order_by('-published_at', '-pk')[:10]
         context = get_site_context()
         context['posts'] = posts
         context['is_home'] = True
         return render(self.request, 'blog/post_list.html', context)
 
+    def get_cache_dependencies(self):
+        dependencies = super().get_cache_dependencies() | {'posts'}
+        if getattr(self, 'page', None):
+            dependencies |= get_page_dependencies(self.page, self.page_sections)
+        return dependencies
+
 
-class PostListView(ListView):
+class PostListView(PageCacheMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Lista de posts publicados"""
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
     paginate_by = 10
 
+    def get_conditional_state(self):
+        return get_posts_state(Post.objects.filter(status='published'))
+
     def get_queryset(self):
         queryset = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
-        return queryset.order_by('-published_at')
+        # Listagens usam os campos derivados (resumo, tempo de leitura), nunca o conteúdo
+        return queryset.defer('content', 'plain_text').order_by('-published_at', '-pk')
 
     def get_paginate_by(self, queryset):
         return SiteSettings.get_settings().posts_per_page
 
+    def get_cache_dependencies(self):
+        return super().get_cache_dependencies() | {'posts'}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update(get_site_context())
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(ConditionalGetMixin, DetailView):
     """Detalhes de um post"""
     model = Post
     template_name = 'blog/post_detail.html'
@@ -80,26 +145,54 @@ class PostDetailView(DetailView):
     def get_queryset(self):
         return Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
 
-    def get_object(self):
-        obj = super().get_object()
-        # Incrementar visualizações
-        obj.views += 1
-        obj.save(update_fields=['views'])
-        return obj
+    def get_conditional_state(self):
+        approved = Q(comments__is_approved=True)
+        row = Post.objects.filter(status='published', slug=self.kwargs['slug']).annotate(
+            comments_count=Count('comments', filter=approved),
+            last_comment=Max('comments__created_at', filter=approved),
+        ).values_list('pk', 'updated_at', 'comments_count', 'last_comment').first()
+        if row is None:
+            return None
+        return latest(row[1], row[3]), row
+
+    def not_modified(self, state):
+        # Uma revalidação também é uma visualização
+        record_view(Post(pk=state[1][0]))
+
+    def get(self, request, *args, **kwargs):
+        # O post é buscado uma única vez por requisição
+        self.object = self.get_object()
+        # Incrementar visualizações (gravadas em lote, ver blog.view_counter);
+        # a renderização do export_static não conta
+        if not getattr(request, 'static_export', False):
+            record_view(self.object)
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update(get_site_context())
+        post = self.object
 
-        # Comentários aprovados
-        post = self.get_object()
-        context['comments'] = post.comments.filter(is_approved=True, parent=None).select_related('author')
+        # Comentários aprovados: uma consulta, árvore montada em memória
+        comments = post.comments.filter(is_approved=True).select_related('author')
+        context['comments'] = build_comment_tree(comments)
+        # O site estático não recebe POST: a exportação sai sem o formulário (e sem o token CSRF)
+        context['show_comment_form'] = not getattr(self.request, 'static_export', False)
 
-        # Posts relacionados
-        context['related_posts'] = Post.objects.filter(
+        # Posts relacionados: lista pré-calculada (ver blog.related), lida pelo índice
+        count = get_related_count()
+        related_posts = list(Post.objects.filter(
             status='published',
-            category=post.category
-        ).exclude(pk=post.pk)[:3]
+            related_from__post=post
+        ).defer('content', 'plain_text').order_by('related_from__rank')[:count])
+        if not related_posts and post.category_id:
+            # Post ainda sem lista calculada
+            related_posts = list(Post.objects.filter(
+                status='published',
+                category=post.category
+            ).exclude(pk=post.pk).defer('content', 'plain_text')[:count])
+        context['related_posts'] = related_posts
 
         return context
 
@@ -149,19 +242,22 @@ class PostDetailView(DetailView):
         return redirect(post.get_absolute_url())
 
 
-class CategoryPostListView(ListView):
+class CategoryPostListView(PageCacheMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Lista de posts por categoria"""
     model = Post
     template_name = 'blog/category_posts.html'
     context_object_name = 'posts'
     paginate_by = 10
 
+    def get_conditional_state(self):
+        return get_posts_state(Post.objects.filter(status='published', category__slug=self.kwargs['slug']))
+
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
         return Post.objects.filter(
             status='published',
             category=self.category
-        ).select_related('author', 'category').order_by('-published_at')
+        ).select_related('author', 'category').defer('content', 'plain_text').order_by('-published_at', '-pk')
 
     def get_paginate_by(self, queryset):
         return SiteSettings.get_settings().posts_per_page
@@ -172,20 +268,26 @@ class CategoryPostListView(ListView):
         context['category'] = self.category
         return context
 
+    def get_cache_dependencies(self):
+        return super().get_cache_dependencies() | {'posts', f'category:{self.category.pk}'}
+
 
-class TagPostListView(ListView):
+class TagPostListView(PageCacheMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Lista de posts por tag"""
     model = Post
     template_name = 'blog/tag_posts.html'
     context_object_name = 'posts'
     paginate_by = 10
 
+    def get_conditional_state(self):
+        return get_posts_state(Post.objects.filter(status='published', tags__slug=self.kwargs['slug']))
+
     def get_queryset(self):
         self.tag = get_object_or_404(Tag, slug=self.kwargs['slug'])
         return Post.objects.filter(
             status='published',
             tags__in=[self.tag]
-        ).select_related('author', 'category').order_by('-published_at')
+        ).select_related('author', 'category').defer('content', 'plain_text').order_by('-published_at', '-pk')
 
     def get_paginate_by(self, queryset):
         return SiteSettings.get_settings().posts_per_page
@@ -196,8 +298,11 @@ class TagPostListView(ListView):
         context['tag'] = self.tag
         return context
 
+    def get_cache_dependencies(self):
+        return super().get_cache_dependencies() | {'posts', f'tag:{self.tag.pk}'}
+
 
-class PageDetailView(DetailView):
+class PageDetailView(PageCacheMixin, ConditionalGetMixin, DetailView):
     """Detalhes de uma página"""
     model = Page
     template_name = 'blog/page_detail.html'
@@ -206,37 +311,44 @@ class PageDetailView(DetailView):
     def get_queryset(self):
         return Page.objects.filter(is_published=True)
 
+    def get_conditional_state(self):
+        row = Page.objects.filter(is_published=True, slug=self.kwargs['slug']).annotate(
+            last_section=Max('page_sections__section__updated_at'),
+        ).values_list('pk', 'updated_at', 'last_section').first()
+        if row is None:
+            return None
+        # page:<pk> muda com as seções adicionadas/removidas; products, com os produtos exibidos
+        tags = get_tag_versions([f'page:{row[0]}', 'products'])
+        return latest(row[1], row[2]), (row, tags)
+
     def get_context_data(self, **kwargs):
-        from ecommerce.models import Product
         context = super().get_context_data(**kwargs)
         context.update(get_site_context())
 
-        # Adicionar seções da página
-        page = self.get_object()
-        context['page_sections'] = page.page_sections.filter(is_active=True).select_related('section').order_by('order')
-
-        # Adicionar produtos para seções de produtos
-        context['products'] = Product.objects.filter(is_active=True).order_by('-created_at')[:15]
+        # Seções da página, renderizadas de uma vez (dados carregados por tipo de seção)
+        page = self.object
+        context['page_sections'] = get_active_page_sections(page)
+        context['section_html'] = render_sections(ps.section for ps in context['page_sections'])
+        self.page_sections = context['page_sections']
 
         return context
 
+    def get_cache_dependencies(self):
+        return super().get_cache_dependencies() | get_page_dependencies(self.object, self.page_sections)
+
 
 class SearchView(ListView):
-    """Busca de posts"""
+    """Busca de posts (ranqueada pelo índice de texto completo, ver blog.search)"""
     model = Post
     template_name = 'blog/search.html'
     context_object_name = 'posts'
     paginate_by = 10
 
     def get_queryset(self):
-        query = self.request.GET.get('q', '')
+        query = self.request.GET.get('q', '').strip()
         if query:
-            return Post.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(excerpt__icontains=query),
-                status='published'
-            ).select_related('author', 'category').order_by('-published_at')
+            queryset = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags').defer('content', 'plain_text')
+            return SearchResults(query, queryset, limit=getattr(settings, 'BLOG_SEARCH_MAX_RESULTS', 1000))
         return Post.objects.none()
 
     def get_paginate_by(self, queryset):
@@ -255,121 +367,47 @@ def about_view(request):
     return render(request, 'blog/about.html', context)
 
 
-def theme_css_view(request):
-    """Gera CSS dinâmico baseado no tema ativo"""
+def theme_css_view(request, css_hash=None):
+    """Serve o CSS compilado do tema ativo (ou de uma versão específica pelo hash)"""
     theme = Theme.get_active_theme()
 
-    if not theme:
-        # Retorna CSS vazio se não há tema
-        return HttpResponse('/* Nenhum tema configurado */', content_type='text/css')
-
-    # Gerar CSS com as variáveis do tema
-    css = f"""
-/* WordPy CMS - CSS Dinâmico do Tema: {theme.name} */
-
-:root {{
-    /* Cores principais */
-    --primary-color: {theme.primary_color};
-    --secondary-color: {theme.secondary_color};
-    --accent-color: {theme.accent_color};
-
-    /* Cores de texto */
-    --text-color: {theme.text_color};
-    --heading-color: {theme.heading_color};
-    --link-color: {theme.link_color};
-    --link-hover-color: {theme.link_hover_color};
-
-    /* Cores de fundo */
-    --background-color: {theme.background_color};
-    --secondary-bg-color: {theme.secondary_bg_color};
-
-    /* Header e Footer */
-    --header-bg-color: {theme.header_bg_color};
-    --header-text-color: {theme.header_text_color};
-    --footer-bg-color: {theme.footer_bg_color};
-    --footer-text-color: {theme.footer_text_color};
-
-    /* Botões */
-    --button-bg-color: {theme.button_bg_color};
-    --button-text-color: {theme.button_text_color};
-    --button-hover-bg-color: {theme.button_hover_bg_color};
-
-    /* Tipografia */
-    --font-family: {theme.font_family};
-    --heading-font-family: {theme.heading_font_family or theme.font_family};
-    --font-size-base: {theme.font_size_base};
-    --line-height: {theme.line_height};
-
-    /* Espaçamento e Layout */
-    --border-radius: {theme.border_radius};
-    --box-shadow: {theme.box_shadow};
-}}
-
-/* Aplicar variáveis do tema */
-body {{
-    font-family: var(--font-family);
-    font-size: var(--font-size-base);
-    line-height: var(--line-height);
-    color: var(--text-color);
-    background: var(--background-color);
-}}
-
-h1, h2, h3, h4, h5, h6 {{
-    font-family: var(--heading-font-family);
-    color: var(--heading-color);
-}}
-
-a {{
-    color: var(--link-color);
-}}
-
-a:hover {{
-    color: var(--link-hover-color);
-}}
-
-header {{
-    background: var(--header-bg-color);
-    color: var(--header-text-color);
-}}
-
-header a {{
-    color: var(--header-text-color);
-}}
-
-footer {{
-    background: var(--footer-bg-color);
-    color: var(--footer-text-color);
-}}
-
-footer a {{
-    color: var(--footer-text-color);
-}}
-
-button, .button, .btn {{
-    background: var(--button-bg-color);
-    color: var(--button-text-color);
-    border-radius: var(--border-radius);
-}}
-
-button:hover, .button:hover, .btn:hover {{
-    background: var(--button-hover-bg-color);
-}}
-
-.sidebar, article, .section {{
-    border-radius: var(--border-radius);
-    box-shadow: var(--box-shadow);
-}}
-
-.section-hero,
-.section-text,
-.section-text-image,
-.section-cta,
-.section-features {{
-    /* Seções podem usar as variáveis de cores */
-}}
-
-/* CSS Customizado do Tema */
-{theme.custom_css}
-"""
-
-    return HttpResponse(css, content_type='text/css')
+    if css_hash is None:
+        if not theme:
+            # Retorna CSS vazio se não há tema
+            return HttpResponse('/* Nenhum tema configurado */', content_type='text/css')
+        css_hash = theme.get_css_hash()
+        # URL sem versão: o navegador pode guardar, mas precisa revalidar
+        cache_control = 'public, max-age=0, must-revalidate'
+    else:
+        # URL versionada: o conteúdo de um hash nunca muda
+        cache_control = 'public, max-age=31536000, immutable'
+
+    # A variante é escolhida (e um hash desconhecido vira 404) antes do GET
+    # condicional: cada codificação tem o próprio ETag
+    encoding, css = None, None
+    for candidate in get_accepted_encodings(request.headers.get('Accept-Encoding', '')):
+        css = read_compiled_css(css_hash, candidate)
+        if css is not None:
+            encoding = candidate
+            break
+    if css is None:
+        css = read_compiled_css(css_hash)
+    if css is None and theme and css_hash == theme.get_css_hash():
+        # Arquivos ausentes no storage (ex.: servidor novo): recompila o tema ativo.
+        # Só para o hash atual, para que URLs inventadas não disparem a compilação
+        theme.get_css_hash(recompile=True)
+        css = read_compiled_css(css_hash)
+    if css is None:
+        raise Http404('CSS de tema não encontrado.')
+
+    etag = f'"{css_hash}-{encoding}"' if encoding else f'"{css_hash}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(css, content_type='text/css; charset=utf-8')
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding'
+    return response
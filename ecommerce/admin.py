@@ -1,8 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from django.utils.html import format_html
 from .models import (
     ProductCategory, Product, ProductImage, Cart, CartItem, Order, OrderItem
 )
+from .search import get_product_search_backend
 
 
 class ProductImageInline(admin.TabularInline):
@@ -65,9 +67,10 @@ class ProductAdmin(admin.ModelAdmin):
         'views'
     ]
     list_filter = ['is_active', 'is_featured', 'stock_status', 'category', 'created_at']
-    search_fields = ['name', 'sku', 'description', 'short_description']
+    # A busca usa o índice de busca de produtos (ver get_search_results)
+    search_fields = ['name', 'sku', 'short_description']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['views', 'created_at', 'updated_at']
+    readonly_fields = ['reserved_quantity', 'views', 'created_at', 'updated_at']
 
     fieldsets = [
         ('Informações Básicas', {
@@ -80,7 +83,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ['price', 'compare_price', 'cost_price']
         }),
         ('Estoque', {
-            'fields': ['stock_quantity', 'stock_status']
+            'fields': ['stock_quantity', 'reserved_quantity', 'stock_status']
         }),
         ('Mídia', {
             'fields': ['featured_image']
@@ -102,6 +105,19 @@ class ProductAdmin(admin.ModelAdmin):
 
     actions = ['activate_products', 'deactivate_products', 'mark_as_featured']
 
+    def get_search_results(self, request, queryset, search_term):
+        """Busca pelo índice de texto completo (SKU exato, prefixos, descrição) em vez de LIKE nas colunas"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Todos os produtos encontrados, sem limite, já cruzados com os filtros da lista
+        backend = get_product_search_backend()
+        queryset = backend.filter_queryset(search_term, queryset)
+        if ORDER_VAR not in request.GET:
+            # Sem ordenação escolhida na lista, segue a relevância
+            queryset = queryset.order_by(*backend.ordering, '-pk')
+        return queryset, False
+
     def price_display(self, obj):
         """Exibe o preço com formatação"""
         if obj.has_discount:
@@ -167,18 +183,20 @@ class CartItemInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     """Admin para carrinhos"""
-    list_display = ['user', 'total_items', 'subtotal_display', 'is_active', 'updated_at']
+    # Totais guardados no próprio carrinho: a lista não consulta os itens
+    list_display = ['user', 'item_count', 'subtotal_display', 'is_active', 'updated_at']
+    list_select_related = ['user']
     list_filter = ['is_active', 'created_at', 'updated_at']
     search_fields = ['user__username', 'user__email', 'session_key']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['item_count', 'subtotal', 'created_at', 'updated_at']
 
     inlines = [CartItemInline]
 
     def subtotal_display(self, obj):
         """Exibe o subtotal do carrinho"""
         return format_html(
-            '<span style="font-weight: bold;">R$ {:.2f}</span>',
-            obj.subtotal
+            '<span style="font-weight: bold;">R$ {}</span>',
+            f'{obj.subtotal:.2f}'
         )
     subtotal_display.short_description = 'Subtotal'
 
@@ -0,0 +1,409 @@
+"""
+Catálogo de produtos: filtros, contagens e paginação.
+
+A listagem de produtos pode ser filtrada por categoria (incluindo as
+subcategorias), faixa de preço (``ECOMMERCE_PRICE_BANDS``), status de estoque
+e desconto, e é paginada (``ECOMMERCE_PRODUCTS_PER_PAGE``).
+
+O número de produtos de cada opção dos filtros não é agregado a cada
+requisição: vem da tabela ``ProductFacetCount``, que os signals em
+``ecommerce.signals`` atualizam pela diferença entre os filtros em que o
+produto estava e os em que passou a estar, a cada produto salvo ou excluído.
+As contagens são do catálogo ativo inteiro, sem considerar os demais filtros
+selecionados. Alterações que não disparam signals (``QuerySet.update()``,
+mudança das faixas de preço) são corrigidas com o comando
+``rebuild_catalog_facets``.
+
+O total da paginação também vem dessa tabela quando há no máximo um filtro e
+nenhuma busca; nos demais casos é um ``COUNT`` da consulta filtrada. Com
+busca, os produtos seguem a ordem de relevância do índice de busca
+(``ecommerce.search``).
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils.functional import cached_property
+
+from .models import Product, ProductCategory, ProductFacetCount
+from .search import ProductSearchResults
+
+
+FACET_CATEGORY = 'categoria'
+FACET_PRICE = 'preco'
+FACET_STOCK = 'estoque'
+FACET_DISCOUNT = 'desconto'
+# Total de produtos ativos (valor vazio)
+FACET_TOTAL = 'total'
+
+FACETS = [FACET_CATEGORY, FACET_PRICE, FACET_STOCK, FACET_DISCOUNT]
+
+FACET_LABELS = {
+    FACET_CATEGORY: 'Categoria',
+    FACET_PRICE: 'Preço',
+    FACET_STOCK: 'Disponibilidade',
+    FACET_DISCOUNT: 'Promoção',
+}
+
+DISCOUNT_VALUE = 'sim'
+
+# Campos do produto dos quais os filtros dependem
+FACET_FIELDS = ['is_active', 'category_id', 'price', 'compare_price', 'stock_status']
+
+
+def get_products_per_page():
+    return getattr(settings, 'ECOMMERCE_PRODUCTS_PER_PAGE', 24)
+
+
+def _decimal(value):
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _format_price(value):
+    return format(value.normalize(), 'f')
+
+
+def get_price_bands():
+    """Faixas de preço ``[(valor, mínimo, máximo)]``; o máximo da última faixa é None"""
+    limits = sorted(Decimal(str(limit)) for limit in getattr(settings, 'ECOMMERCE_PRICE_BANDS', [50, 100, 200, 500]))
+    bands = []
+    lower = Decimal('0')
+    for upper in limits + [None]:
+        value = f'{_format_price(lower)}-{_format_price(upper) if upper is not None else ""}'
+        bands.append((value, lower, upper))
+        lower = upper
+    return bands
+
+
+def get_price_band(price):
+    """Valor da faixa de preço em que ``price`` se encaixa (mínimo incluso, máximo não)"""
+    price = _decimal(price)
+    if price is None:
+        return None
+    for value, lower, upper in get_price_bands():
+        if price >= lower and (upper is None or price < upper):
+            return value
+    return None
+
+
+def get_price_band_label(lower, upper):
+    if upper is None:
+        return f'Acima de R$ {_format_price(lower)}'
+    if not lower:
+        return f'Até R$ {_format_price(upper)}'
+    return f'R$ {_format_price(lower)} a R$ {_format_price(upper)}'
+
+
+class CategoryTree:
+    """Hierarquia das categorias de produtos, carregada com uma única consulta"""
+
+    def __init__(self):
+        self.categories = {}
+        self.children = defaultdict(list)
+        for category in ProductCategory.objects.only(
+            'pk', 'parent_id', 'name', 'slug', 'is_active', 'order'
+        ).order_by('order', 'name'):
+            self.categories[category.pk] = category
+            self.children[category.parent_id].append(category.pk)
+        self.by_slug = {category.slug: category for category in self.categories.values()}
+
+    def ancestors(self, pk):
+        """A categoria e todas as acima dela"""
+        result = []
+        while pk is not None and pk in self.categories and pk not in result:
+            result.append(pk)
+            pk = self.categories[pk].parent_id
+        return result
+
+    def descendants(self, pk):
+        """A categoria e todas as subcategorias, em qualquer nível"""
+        result, pending = [], [pk]
+        while pending:
+            current = pending.pop()
+            if current in result:
+                continue
+            result.append(current)
+            pending.extend(self.children.get(current, []))
+        return result
+
+    def walk(self, parent=None, depth=0):
+        """Percorre as categorias ativas em ordem, retornando ``(categoria, profundidade)``"""
+        for pk in self.children.get(parent, []):
+            category = self.categories[pk]
+            if category.is_active:
+                yield category, depth
+                yield from self.walk(pk, depth + 1)
+
+
+def get_facet_values(product):
+    """Campos de ``product`` dos quais os filtros dependem"""
+    return {field: getattr(product, field) for field in FACET_FIELDS}
+
+
+def get_stored_facet_values(pk):
+    """
+    Campos dos filtros do produto como estão gravados no banco (None se não existir).
+
+    A linha fica travada até o fim da transação (``Product.save`` abre uma):
+    dois saves simultâneos do mesmo produto calculam a diferença um depois do
+    outro, e não a mesma diferença duas vezes.
+    """
+    if pk is None:
+        return None
+    return Product.objects.select_for_update().filter(pk=pk).values(*FACET_FIELDS).first()
+
+
+def get_product_facets(values, tree=None):
+    """Pares ``(filtro, valor)`` em que entra um produto com os campos ``values``"""
+    if not values or not values['is_active']:
+        return set()
+
+    facets = {(FACET_TOTAL, ''), (FACET_STOCK, values['stock_status'])}
+    band = get_price_band(values['price'])
+    if band:
+        facets.add((FACET_PRICE, band))
+    price, compare_price = _decimal(values['price']), _decimal(values['compare_price'])
+    if price is not None and compare_price and compare_price > price:
+        facets.add((FACET_DISCOUNT, DISCOUNT_VALUE))
+    if values['category_id']:
+        # O produto conta também para as categorias acima da sua
+        tree = tree or CategoryTree()
+        facets.update((FACET_CATEGORY, str(pk)) for pk in tree.ancestors(values['category_id']))
+    return facets
+
+
+def update_facet_counts(old_facets, new_facets):
+    """Aplica às contagens a diferença entre os filtros antigos e novos de um produto"""
+    removed, added = old_facets - new_facets, new_facets - old_facets
+    if not removed and not added:
+        return
+    with transaction.atomic():
+        for facet, value in removed:
+            ProductFacetCount.objects.filter(facet=facet, value=value, product_count__gt=0).update(
+                product_count=F('product_count') - 1
+            )
+        for facet, value in added:
+            updated = ProductFacetCount.objects.filter(facet=facet, value=value).update(
+                product_count=F('product_count') + 1
+            )
+            if not updated:
+                count, created = ProductFacetCount.objects.get_or_create(
+                    facet=facet, value=value, defaults={'product_count': 1}
+                )
+                if not created:
+                    ProductFacetCount.objects.filter(pk=count.pk).update(product_count=F('product_count') + 1)
+
+
+def count_facets(facets=None):
+    """Conta no banco os produtos ativos de cada valor de filtro: ``{(filtro, valor): n}``"""
+    facets = set(facets or FACETS + [FACET_TOTAL])
+    active = Product.objects.filter(is_active=True).order_by()
+    counts = Counter()
+
+    if FACET_TOTAL in facets:
+        counts[(FACET_TOTAL, '')] = active.count()
+    if FACET_CATEGORY in facets:
+        tree = CategoryTree()
+        for category_id, total in active.filter(category__isnull=False).values('category').annotate(
+            total=Count('pk')
+        ).values_list('category', 'total'):
+            for pk in tree.ancestors(category_id):
+                counts[(FACET_CATEGORY, str(pk))] += total
+    if FACET_PRICE in facets:
+        bands = get_price_bands()
+        totals = active.aggregate(**{
+            f'band_{index}': Count('pk', filter=get_price_filter(value))
+            for index, (value, lower, upper) in enumerate(bands)
+        })
+        for index, (value, lower, upper) in enumerate(bands):
+            counts[(FACET_PRICE, value)] = totals[f'band_{index}']
+    if FACET_STOCK in facets:
+        for status, total in active.values('stock_status').annotate(total=Count('pk')).values_list(
+            'stock_status', 'total'
+        ):
+            counts[(FACET_STOCK, status)] = total
+    if FACET_DISCOUNT in facets:
+        counts[(FACET_DISCOUNT, DISCOUNT_VALUE)] = active.filter(compare_price__gt=F('price')).count()
+    return {key: total for key, total in counts.items() if total}
+
+
+def rebuild_facet_counts(facets=None):
+    """Recalcula do zero as contagens dos filtros informados (todos, se None)"""
+    facets = list(facets or FACETS + [FACET_TOTAL])
+    counts = count_facets(facets)
+    with transaction.atomic():
+        ProductFacetCount.objects.filter(facet__in=facets).delete()
+        ProductFacetCount.objects.bulk_create(
+            [ProductFacetCount(facet=facet, value=value, product_count=total)
+             for (facet, value), total in counts.items()],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def get_price_filter(value):
+    """Q da faixa de preço ``value``, ou None se não for uma faixa configurada"""
+    for band, lower, upper in get_price_bands():
+        if band == value:
+            condition = Q(price__gte=lower)
+            if upper is not None:
+                condition &= Q(price__lt=upper)
+            return condition
+    return None
+
+
+class FacetOption:
+    def __init__(self, value, label, count, selected, query, depth=0):
+        self.value = value
+        self.label = label
+        self.count = count
+        self.selected = selected
+        self.query = query
+        self.depth = depth
+
+
+class Facet:
+    def __init__(self, name, options):
+        self.name = name
+        self.label = FACET_LABELS[name]
+        self.options = options
+
+
+class CatalogPaginator(Paginator):
+    """Paginator cujo total pode vir pronto (da tabela de contagens)"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        if self._known_count is not None:
+            return self._known_count
+        return super().count
+
+
+class Catalog:
+    """
+    Produtos ativos filtrados pelos parâmetros da requisição.
+
+    ``category`` fixa uma categoria (página da categoria), cujas subcategorias
+    também entram; valores de filtro inválidos são ignorados.
+    """
+
+    def __init__(self, params, category=None, search_query=None):
+        self.params = params
+        self.tree = CategoryTree()
+        self.search_query = search_query
+        self.category = category
+        self.selected = {}
+
+        category_slug = params.get(FACET_CATEGORY)
+        if category is None and category_slug in self.tree.by_slug:
+            self.category = self.tree.by_slug[category_slug]
+            self.selected[FACET_CATEGORY] = category_slug
+        if get_price_filter(params.get(FACET_PRICE)) is not None:
+            self.selected[FACET_PRICE] = params[FACET_PRICE]
+        if params.get(FACET_STOCK) in dict(Product.STOCK_STATUS):
+            self.selected[FACET_STOCK] = params[FACET_STOCK]
+        if params.get(FACET_DISCOUNT) == DISCOUNT_VALUE:
+            self.selected[FACET_DISCOUNT] = DISCOUNT_VALUE
+
+    def get_queryset(self):
+        products = Product.objects.filter(is_active=True)
+        if self.category is not None:
+            products = products.filter(category_id__in=self.tree.descendants(self.category.pk))
+        if FACET_PRICE in self.selected:
+            products = products.filter(get_price_filter(self.selected[FACET_PRICE]))
+        if FACET_STOCK in self.selected:
+            products = products.filter(stock_status=self.selected[FACET_STOCK])
+        if FACET_DISCOUNT in self.selected:
+            products = products.filter(compare_price__gt=F('price'))
+        return products.select_related('category').defer('description').order_by('-created_at', '-pk')
+
+    def get_known_count(self):
+        """Total de produtos pela tabela de contagens, quando a seleção é de no máximo um filtro"""
+        if self.search_query:
+            return None
+        filters = [(facet, value) for facet, value in self.selected.items() if facet != FACET_CATEGORY]
+        if self.category is not None:
+            filters.append((FACET_CATEGORY, str(self.category.pk)))
+        if len(filters) > 1:
+            return None
+        facet, value = filters[0] if filters else (FACET_TOTAL, '')
+        # Sem a linha (tabela ainda não calculada), conta na própria consulta
+        return ProductFacetCount.objects.filter(facet=facet, value=value).values_list(
+            'product_count', flat=True
+        ).first()
+
+    def get_object_list(self):
+        """Produtos filtrados; com busca, na ordem de relevância"""
+        if self.search_query:
+            return ProductSearchResults(self.search_query, self.get_queryset())
+        return self.get_queryset()
+
+    def paginate(self, page_number, per_page=None):
+        paginator = CatalogPaginator(
+            self.get_object_list(), per_page or get_products_per_page(), count=self.get_known_count()
+        )
+        return paginator.get_page(page_number)
+
+    def get_query(self, **changes):
+        """Query string atual (sem a página) com ``changes`` aplicadas; None remove o parâmetro"""
+        params = {key: value for key, value in self.params.items() if key != 'page' and value}
+        for key, value in changes.items():
+            if value is None:
+                params.pop(key, None)
+            else:
+                params[key] = value
+        return urlencode(params)
+
+    def get_option(self, facet, value, label, count, depth=0):
+        selected = self.selected.get(facet) == value
+        return FacetOption(value, label, count, selected, self.get_query(**{facet: None if selected else value}), depth)
+
+    def get_facets(self):
+        """Filtros e opções para a barra lateral, com as contagens pré-calculadas"""
+        counts = defaultdict(dict)
+        for facet, value, total in ProductFacetCount.objects.filter(
+            facet__in=FACETS, product_count__gt=0
+        ).values_list('facet', 'value', 'product_count'):
+            counts[facet][value] = total
+
+        def visible(facet, value):
+            return counts[facet].get(value) or self.selected.get(facet) == value
+
+        categories = [
+            self.get_option(FACET_CATEGORY, category.slug, category.name,
+                            counts[FACET_CATEGORY].get(str(category.pk), 0), depth)
+            for category, depth in self.tree.walk()
+            if visible(FACET_CATEGORY, str(category.pk)) or self.selected.get(FACET_CATEGORY) == category.slug
+        ]
+        prices = [
+            self.get_option(FACET_PRICE, value, get_price_band_label(lower, upper), counts[FACET_PRICE].get(value, 0))
+            for value, lower, upper in get_price_bands()
+            if visible(FACET_PRICE, value)
+        ]
+        stock = [
+            self.get_option(FACET_STOCK, value, label, counts[FACET_STOCK].get(value, 0))
+            for value, label in Product.STOCK_STATUS
+            if visible(FACET_STOCK, value)
+        ]
+        discount = [
+            self.get_option(FACET_DISCOUNT, DISCOUNT_VALUE, 'Em promoção', counts[FACET_DISCOUNT].get(DISCOUNT_VALUE, 0))
+        ] if visible(FACET_DISCOUNT, DISCOUNT_VALUE) else []
+
+        return [
+            Facet(name, options)
+            for name, options in zip(FACETS, [categories, prices, stock, discount])
+            if options
+        ]
@@ -0,0 +1,113 @@
+"""
+Fechamento de pedidos (checkout) em uma única transação.
+
+O estoque de cada produto é baixado com um ``UPDATE`` condicional
+(``stock_quantity = stock_quantity - n WHERE stock_quantity >= n``): o banco
+decide qual compra leva as últimas unidades, sem ler o produto antes nem
+depender do que o carrinho viu quando o item foi adicionado. As unidades
+reservadas pelo próprio carrinho (``ecommerce.reservations``) contam como
+disponíveis para ele e são consumidas no mesmo ``UPDATE``; as reservadas por
+outros carrinhos, não. Se algum item
+não puder ser atendido, a transação inteira é desfeita (nenhum estoque
+baixado, nenhum pedido criado) e ``CheckoutError`` lista os itens com
+problema.
+
+Os itens do pedido são criados com um único ``bulk_create``, que não chama
+``OrderItem.save()``: por isso o ``total_price`` e os dados do produto no
+momento da compra (nome e SKU) são preenchidos aqui.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from blog.page_cache import invalidate_tags
+
+from .models import Cart, Order, OrderItem, Product, StockReservation
+from .reservations import get_cart_reservations
+
+
+class CheckoutError(Exception):
+    """Itens do carrinho sem estoque suficiente (ou indisponíveis) no fechamento"""
+
+    def __init__(self, items):
+        self.items = items
+        names = ', '.join(item.product.name for item in items)
+        super().__init__(f'Estoque insuficiente para: {names}')
+
+
+def decrement_stock(items, reserved=None):
+    """
+    Baixa o estoque dos itens; retorna os que não puderam ser atendidos.
+
+    ``reserved`` é ``{product_id: unidades reservadas pelo carrinho}``, que são
+    liberadas junto com a baixa. Os produtos são atualizados em ordem de id,
+    para que dois checkouts simultâneos travem as linhas na mesma ordem.
+    """
+    reserved = reserved or {}
+    now = timezone.now()
+    failed = []
+    for item in sorted(items, key=lambda item: item.product_id):
+        held = reserved.get(item.product_id, 0)
+        updated = Product.objects.filter(
+            pk=item.product_id, is_active=True,
+            stock_quantity__gte=F('reserved_quantity') - held + item.quantity,
+        ).update(
+            stock_quantity=F('stock_quantity') - item.quantity,
+            reserved_quantity=Greatest(F('reserved_quantity') - held, 0),
+            updated_at=now,
+        )
+        if not updated:
+            failed.append(item)
+    return failed
+
+
+def place_order(cart, user, shipping_cost=Decimal('0.00'), tax=Decimal('0.00')):
+    """
+    Cria o pedido com os itens do carrinho, baixa o estoque e fecha o carrinho.
+
+    Levanta ``CheckoutError`` (sem alterar nada) se algum item não tiver
+    estoque; levanta ``ValueError`` se o carrinho estiver vazio.
+    """
+    with transaction.atomic():
+        items = list(cart.items.select_related('product'))
+        if not items:
+            raise ValueError('Carrinho vazio')
+
+        failed = decrement_stock(items, get_cart_reservations(cart))
+        if failed:
+            raise CheckoutError(failed)
+
+        subtotal = sum((item.total_price for item in items), Decimal('0.00'))
+        order = Order.objects.create(
+            user=user,
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            tax=tax,
+            total=subtotal + shipping_cost + tax,
+            status='pending',
+            payment_status='pending',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                product_name=item.product.name,
+                product_sku=item.product.sku,
+                quantity=item.quantity,
+                price=item.price,
+                total_price=item.total_price,
+            )
+            for item in items
+        ])
+
+        cart.items.all().delete()
+        StockReservation.objects.filter(cart=cart).delete()
+        Cart.objects.filter(pk=cart.pk).update(is_active=False, updated_at=timezone.now())
+        cart.is_active = False
+
+        # UPDATE não dispara os signals que invalidam as páginas com produtos
+        transaction.on_commit(lambda: invalidate_tags('products'))
+    return order
@@ -0,0 +1,45 @@
+"""
+Totais desnormalizados dos carrinhos.
+
+``Cart.item_count`` e ``Cart.subtotal`` guardam a quantidade de unidades e o
+valor dos itens, para que o carrinho, o checkout e a lista de carrinhos do
+admin não precisem percorrer os itens a cada acesso.
+
+Os totais são recalculados (e não incrementados) por um único ``UPDATE`` com
+subconsultas sobre os itens do carrinho afetado, disparado pelos signals em
+``ecommerce.signals`` a cada item criado, alterado ou excluído. Alterações que
+não disparam signals (como ``QuerySet.update()``) podem ser corrigidas com o
+comando ``recount_carts``; ``Cart.objects.with_totals()`` calcula os mesmos
+valores direto dos itens, para relatórios.
+"""
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def recount_carts(pks=None):
+    """Recalcula ``item_count`` e ``subtotal`` dos carrinhos informados (todos, se ``pks`` for None)"""
+    from .models import Cart, CartItem
+
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    quantity = items.annotate(total=Sum('quantity')).values('total')
+    subtotal = items.annotate(
+        total=Sum(F('quantity') * F('price'), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+    ).values('total')
+
+    queryset = Cart.objects.all()
+    if pks is not None:
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return 0
+        queryset = queryset.filter(pk__in=pks)
+    with transaction.atomic():
+        return queryset.update(
+            item_count=Coalesce(Subquery(quantity), Value(0)),
+            subtotal=Coalesce(
+                Subquery(subtotal), Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
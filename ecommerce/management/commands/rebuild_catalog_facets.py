@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.catalog import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as contagens de produtos dos filtros do catálogo (categoria, preço, estoque e promoção)'
+
+    def handle(self, *args, **options):
+        total = rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS(f'Contagens recalculadas: {total} valor(es) de filtro.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.models import Product
+from ecommerce.search import get_product_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca com todos os produtos'
+
+    def handle(self, *args, **options):
+        backend = get_product_search_backend()
+        count = backend.rebuild(Product.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} produto(s) indexado(s) com {backend.__class__.__name__}.'
+        ))
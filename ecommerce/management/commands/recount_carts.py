@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.counters import recount_carts
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o número de itens e o subtotal de todos os carrinhos'
+
+    def handle(self, *args, **options):
+        total = recount_carts()
+        self.stdout.write(self.style.SUCCESS(f'Totais recalculados: {total} carrinho(s).'))
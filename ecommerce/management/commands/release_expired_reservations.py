@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ecommerce.reservations import BATCH_SIZE, recount_reserved, release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Devolve ao estoque as reservas de carrinho vencidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Continua rodando e devolve as reservas vencidas a cada intervalo',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=60,
+            help='Intervalo (segundos) entre verificações no modo --loop (padrão: 60)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Reservas devolvidas por transação (padrão: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Antes de começar, recalcula o total reservado de cada produto a partir das reservas',
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            total = recount_reserved()
+            self.stdout.write(f'Total reservado recalculado em {total} produto(s).')
+
+        if not options['loop']:
+            total = release_expired_reservations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{total} reserva(s) vencida(s) devolvida(s).'))
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                total = release_expired_reservations(batch_size=options['batch_size'])
+                if total:
+                    self.stdout.write(f'{total} reserva(s) vencida(s) devolvida(s).')
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:30
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='featured_image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='ecommerce/products/%Y/%m/', verbose_name='Imagem Principal'),
+        ),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.get_content_storage, upload_to='ecommerce/categories/%Y/%m/', verbose_name='Imagem'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=blog.storage.get_content_storage, upload_to='ecommerce/products/%Y/%m/', verbose_name='Imagem'),
+        ),
+    ]
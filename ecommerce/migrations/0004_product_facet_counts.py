@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:44
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def fill_facet_counts(apps, schema_editor):
+    """Calcula as contagens iniciais dos filtros do catálogo"""
+    from ecommerce.catalog import DISCOUNT_VALUE, get_price_bands
+
+    Product = apps.get_model('ecommerce', 'Product')
+    ProductCategory = apps.get_model('ecommerce', 'ProductCategory')
+    ProductFacetCount = apps.get_model('ecommerce', 'ProductFacetCount')
+
+    active = Product.objects.filter(is_active=True).order_by()
+    counts = Counter({('total', ''): active.count()})
+
+    parents = dict(ProductCategory.objects.values_list('pk', 'parent_id'))
+    for category_id, total in active.filter(category__isnull=False).values('category').annotate(
+        total=Count('pk')
+    ).values_list('category', 'total'):
+        seen = set()
+        while category_id is not None and category_id not in seen:
+            seen.add(category_id)
+            counts[('categoria', str(category_id))] += total
+            category_id = parents.get(category_id)
+
+    for value, lower, upper in get_price_bands():
+        band = Q(price__gte=lower) & (Q(price__lt=upper) if upper is not None else Q())
+        counts[('preco', value)] = active.filter(band).count()
+    for status, total in active.values('stock_status').annotate(total=Count('pk')).values_list('stock_status', 'total'):
+        counts[('estoque', status)] = total
+    counts[('desconto', DISCOUNT_VALUE)] = active.filter(compare_price__gt=F('price')).count()
+
+    ProductFacetCount.objects.bulk_create(
+        [ProductFacetCount(facet=facet, value=value, product_count=total)
+         for (facet, value), total in counts.items() if total],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20, verbose_name='Filtro')),
+                ('value', models.CharField(blank=True, max_length=100, verbose_name='Valor')),
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Nº de Produtos')),
+            ],
+            options={
+                'verbose_name': 'Contagem de Produtos por Filtro',
+                'verbose_name_plural': 'Contagens de Produtos por Filtro',
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(fill_facet_counts, migrations.RunPython.noop),
+    ]
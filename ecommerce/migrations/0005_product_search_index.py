@@ -0,0 +1,54 @@
+import html
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def html_to_text(value):
+    # Cópia congelada de blog.text.html_to_text: a migração não depende do código do app
+    text = html.unescape(strip_tags(value or ''))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_fts_table(apps, schema_editor):
+    """Cria a tabela FTS5 de busca de produtos (apenas em SQLite com FTS5) e indexa os produtos"""
+    if schema_editor.connection.vendor != 'sqlite' or not has_fts5(schema_editor.connection):
+        return
+
+    # prefix='2 3': índices de prefixo para as buscas por termos incompletos
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ecommerce_product_fts USING fts5("
+        "name, sku, short_description, description, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    Product = apps.get_model('ecommerce', 'Product')
+    for product in Product.objects.iterator(chunk_size=500):
+        schema_editor.execute(
+            'INSERT INTO ecommerce_product_fts (rowid, name, sku, short_description, description) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [product.pk, product.name, product.sku, product.short_description, html_to_text(product.description)]
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS ecommerce_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_product_facet_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
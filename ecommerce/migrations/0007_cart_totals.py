@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:50
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_cart_totals(apps, schema_editor):
+    """Calcula os totais iniciais dos carrinhos"""
+    Cart = apps.get_model('ecommerce', 'Cart')
+    CartItem = apps.get_model('ecommerce', 'CartItem')
+
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    quantity = items.annotate(total=Sum('quantity')).values('total')
+    subtotal = items.annotate(
+        total=Sum(F('quantity') * F('price'), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+    ).values('total')
+    Cart.objects.update(
+        item_count=Coalesce(Subquery(quantity), Value(0)),
+        subtotal=Coalesce(
+            Subquery(subtotal), Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Nº de Itens'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='Subtotal'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
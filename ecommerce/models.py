@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from blog.storage import get_content_storage
+
 
 class ProductCategory(models.Model):
     """Categorias de produtos"""
@@ -26,6 +30,7 @@ class ProductCategory(models.Model):
 
     image = models.ImageField(
         upload_to='ecommerce/categories/%Y/%m/',
+        storage=get_content_storage,
         blank=True,
         null=True,
         verbose_name=_('Imagem')
@@ -145,6 +150,13 @@ class Product(models.Model):
         verbose_name=_('Quantidade em Estoque')
     )
 
+    reserved_quantity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Quantidade Reservada'),
+        help_text=_('Unidades reservadas em carrinhos (ver ecommerce/reservations.py)')
+    )
+
     stock_status = models.CharField(
         max_length=20,
         choices=STOCK_STATUS,
@@ -154,6 +166,7 @@ class Product(models.Model):
 
     featured_image = models.ImageField(
         upload_to='ecommerce/products/%Y/%m/',
+        storage=get_content_storage,
         blank=True,
         null=True,
         verbose_name=_('Imagem Principal')
@@ -209,10 +222,29 @@ class Product(models.Model):
         verbose_name = _('Produto')
         verbose_name_plural = _('Produtos')
         ordering = ['-created_at']
+        indexes = [
+            # Vitrine (ativos por data) e produtos de uma categoria; parciais porque
+            # filter(is_active=True) vira WHERE "is_active" no SQLite
+            models.Index(fields=['created_at'], condition=Q(is_active=True), name='ecommerce_product_active_idx'),
+            models.Index(fields=['category', 'created_at'], condition=Q(is_active=True), name='ecommerce_product_cat_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # O contador de reservas só muda por UPDATE atômico (ver ecommerce/reservations.py);
+        # salvar um produto carregado antes não pode sobrescrevê-lo
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved_quantity'
+            ]
+        # Uma transação por save: os signals leem os filtros gravados (com a linha
+        # travada) e aplicam a diferença às contagens do catálogo antes do commit
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def has_discount(self):
         """Verifica se o produto tem desconto"""
@@ -225,6 +257,43 @@ class Product(models.Model):
             return int(((self.compare_price - self.price) / self.compare_price) * 100)
         return 0
 
+    @property
+    def available_quantity(self):
+        """Estoque que ainda pode ir para um carrinho (descontadas as reservas)"""
+        return max(self.stock_quantity - self.reserved_quantity, 0)
+
+
+class ProductFacetCount(models.Model):
+    """
+    Número de produtos ativos por valor de filtro do catálogo (ver ecommerce/catalog.py).
+
+    Atualizado incrementalmente pelos signals a cada produto salvo ou excluído;
+    recalculado por completo com: python manage.py rebuild_catalog_facets
+    """
+    facet = models.CharField(
+        max_length=20,
+        verbose_name=_('Filtro')
+    )
+
+    value = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_('Valor')
+    )
+
+    product_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Nº de Produtos')
+    )
+
+    class Meta:
+        verbose_name = _('Contagem de Produtos por Filtro')
+        verbose_name_plural = _('Contagens de Produtos por Filtro')
+        unique_together = ['facet', 'value']
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.product_count}"
+
 
 class ProductImage(models.Model):
     """Imagens adicionais dos produtos"""
@@ -237,6 +306,7 @@ class ProductImage(models.Model):
 
     image = models.ImageField(
         upload_to='ecommerce/products/%Y/%m/',
+        storage=get_content_storage,
         verbose_name=_('Imagem')
     )
 
@@ -265,6 +335,24 @@ class ProductImage(models.Model):
         return f"{self.product.name} - Imagem {self.order}"
 
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Anota ``items_quantity`` e ``items_subtotal`` calculados pelos itens em SQL.
+
+        Para relatórios e conferência: a exibição usa os campos ``item_count`` e
+        ``subtotal``, mantidos a cada alteração dos itens.
+        """
+        return self.annotate(
+            items_quantity=Coalesce(Sum('items__quantity'), Value(0)),
+            items_subtotal=Coalesce(
+                Sum(F('items__quantity') * F('items__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
 class Cart(models.Model):
     """Carrinho de compras"""
     user = models.ForeignKey(
@@ -286,6 +374,21 @@ class Cart(models.Model):
         verbose_name=_('Ativo')
     )
 
+    # Totais desnormalizados, recalculados a cada alteração dos itens (ver ecommerce/counters.py)
+    item_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Nº de Itens')
+    )
+
+    subtotal = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name=_('Subtotal')
+    )
+
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name=_('Criado em')
@@ -296,6 +399,8 @@ class Cart(models.Model):
         verbose_name=_('Atualizado em')
     )
 
+    objects = CartQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Carrinho')
         verbose_name_plural = _('Carrinhos')
@@ -304,21 +409,70 @@ class Cart(models.Model):
     def __str__(self):
         return f"Carrinho de {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        # Os totais só mudam pelo recálculo em ecommerce/counters.py; salvar um
+        # carrinho carregado antes não pode sobrescrevê-los
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('item_count', 'subtotal')
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def total_items(self):
         """Retorna o total de itens no carrinho"""
-        return sum(item.quantity for item in self.items.all())
-
-    @property
-    def subtotal(self):
-        """Retorna o subtotal do carrinho"""
-        return sum(item.total_price for item in self.items.all())
+        return self.item_count
 
     def get_total(self):
         """Alias para subtotal - retorna o total do carrinho"""
         return self.subtotal
 
 
+class StockReservation(models.Model):
+    """
+    Unidades de um produto seguradas para um carrinho até ``expires_at``.
+
+    A soma das reservas de cada produto fica em ``Product.reserved_quantity``;
+    as vencidas são devolvidas pelo comando release_expired_reservations.
+    """
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name=_('Carrinho')
+    )
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name=_('Produto')
+    )
+
+    quantity = models.PositiveIntegerField(
+        verbose_name=_('Quantidade')
+    )
+
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name=_('Expira em')
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Criado em')
+    )
+
+    class Meta:
+        verbose_name = _('Reserva de Estoque')
+        verbose_name_plural = _('Reservas de Estoque')
+        unique_together = ['cart', 'product']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} (carrinho {self.cart_id})"
+
+
 class CartItem(models.Model):
     """Itens do carrinho"""
     cart = models.ForeignKey(
@@ -507,6 +661,11 @@ class Order(models.Model):
         verbose_name = _('Pedido')
         verbose_name_plural = _('Pedidos')
         ordering = ['-created_at']
+        indexes = [
+            # Contagens por status e pedidos recentes do dashboard
+            models.Index(fields=['status', 'created_at'], name='ecommerce_order_status_idx'),
+            models.Index(fields=['created_at'], name='ecommerce_order_created_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.order_number}"
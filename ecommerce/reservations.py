@@ -0,0 +1,132 @@
+"""
+Reservas de estoque dos carrinhos.
+
+Adicionar um produto ao carrinho (ou mudar sua quantidade) reserva as
+unidades por ``ECOMMERCE_RESERVATION_TTL`` segundos. O total reservado de
+cada produto fica no contador ``Product.reserved_quantity``, alterado apenas
+por ``UPDATE`` condicional: uma reserva só é aceita se
+``stock_quantity - reserved_quantity`` cobrir o acréscimo, de modo que o
+disponível (``Product.available_quantity``) nunca precisa somar as reservas
+a cada requisição e dois carrinhos não seguram a mesma unidade.
+
+No checkout (``ecommerce.checkout``) as reservas do carrinho são consumidas
+junto com a baixa do estoque. As vencidas são devolvidas em lote pelo comando
+``release_expired_reservations``; quando uma reserva é recusada, as vencidas
+do próprio produto são devolvidas na hora e a reserva é tentada de novo.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+BATCH_SIZE = 500
+
+
+def get_reservation_ttl():
+    return getattr(settings, 'ECOMMERCE_RESERVATION_TTL', 15 * 60)
+
+
+def _add_reserved(product_id, delta):
+    """Soma ``delta`` ao contador do produto; acréscimos só se houver disponível"""
+    products = Product.objects.filter(pk=product_id)
+    if delta > 0:
+        return products.filter(stock_quantity__gte=F('reserved_quantity') + delta).update(
+            reserved_quantity=F('reserved_quantity') + delta
+        )
+    return products.update(reserved_quantity=Greatest(F('reserved_quantity') + delta, 0))
+
+
+def reserve(cart, product, quantity, retry=True):
+    """
+    Ajusta a reserva de ``product`` no carrinho para ``quantity`` unidades e renova o prazo.
+
+    Retorna False (sem alterar nada) se não houver estoque disponível para o acréscimo.
+    """
+    expires_at = timezone.now() + timedelta(seconds=get_reservation_ttl())
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(cart=cart, product=product).first()
+        delta = quantity - (reservation.quantity if reservation else 0)
+        if delta and not _add_reserved(product.pk, delta):
+            # Sem disponível: devolve as reservas vencidas deste produto (inclusive a
+            # deste carrinho, se vencida) e tenta de novo
+            if retry and release_expired_reservations(product_id=product.pk):
+                return reserve(cart, product, quantity, retry=False)
+            return False
+        if reservation is None:
+            StockReservation.objects.create(cart=cart, product=product, quantity=quantity, expires_at=expires_at)
+        else:
+            StockReservation.objects.filter(pk=reservation.pk).update(quantity=quantity, expires_at=expires_at)
+    return True
+
+
+def release(cart, product):
+    """Devolve a reserva de ``product`` no carrinho"""
+    with transaction.atomic():
+        quantity = StockReservation.objects.select_for_update().filter(
+            cart=cart, product=product
+        ).values_list('quantity', flat=True).first()
+        if quantity is None:
+            return
+        StockReservation.objects.filter(cart=cart, product=product).delete()
+        _add_reserved(product.pk, -quantity)
+
+
+def release_cart(cart):
+    """Devolve todas as reservas do carrinho"""
+    with transaction.atomic():
+        _release(StockReservation.objects.filter(cart=cart))
+
+
+def get_cart_reservations(cart):
+    """Unidades reservadas pelo carrinho: ``{product_id: quantidade}`` (trava as reservas)"""
+    return dict(StockReservation.objects.select_for_update().filter(cart=cart).values_list('product_id', 'quantity'))
+
+
+def _release(reservations, skip_locked=False):
+    """Apaga as reservas e devolve as unidades aos contadores, um UPDATE por produto"""
+    rows = list(reservations.select_for_update(skip_locked=skip_locked).values_list('pk', 'product_id', 'quantity'))
+    if not rows:
+        return 0
+    StockReservation.objects.filter(pk__in=[pk for pk, product_id, quantity in rows]).delete()
+    released = Counter()
+    for pk, product_id, quantity in rows:
+        released[product_id] += quantity
+    for product_id, quantity in released.items():
+        _add_reserved(product_id, -quantity)
+    return len(rows)
+
+
+def release_expired_reservations(now=None, product_id=None, batch_size=BATCH_SIZE):
+    """Devolve as reservas vencidas (de todos os produtos ou só de ``product_id``); retorna quantas"""
+    now = now or timezone.now()
+    expired = StockReservation.objects.filter(expires_at__lte=now)
+    if product_id is not None:
+        expired = expired.filter(product_id=product_id)
+    total = 0
+    while True:
+        with transaction.atomic():
+            batch = StockReservation.objects.filter(
+                pk__in=list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size]),
+                expires_at__lte=now,
+            )
+            # Reservas sendo renovadas ou consumidas agora ficam para a próxima passada
+            released = _release(batch, skip_locked=True)
+        total += released
+        if released < batch_size:
+            return total
+
+
+def recount_reserved():
+    """Recalcula ``reserved_quantity`` de todos os produtos a partir das reservas existentes"""
+    reserved = StockReservation.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    with transaction.atomic():
+        return Product.objects.update(reserved_quantity=Coalesce(Subquery(reserved), Value(0)))
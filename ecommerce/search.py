@@ -0,0 +1,213 @@
+"""
+Busca de produtos com índice de texto completo.
+
+Segue o desenho da busca de posts (``blog.search``): um backend plugável,
+escolhido por ``ECOMMERCE_SEARCH_BACKEND``, que em SQLite com FTS5 é por
+padrão ``SQLiteFTS5ProductSearchBackend``, com a tabela virtual FTS5
+``ecommerce_product_fts`` (criada na migração 0005) ranqueada por BM25 com
+pesos nome > SKU > descrição curta > descrição. Cada termo digitado casa
+também como prefixo ("cam" encontra "camiseta"), servido pelos índices de
+prefixo da tabela. Um SKU digitado exatamente aparece sempre em primeiro.
+Sem FTS5 (outros bancos ou SQLite compilado sem a extensão) a busca usa
+``icontains`` direto na tabela de produtos.
+
+O backend restringe e ordena o próprio queryset da listagem (loja com os
+filtros do catálogo, ou admin) em SQL: os filtros valem antes de qualquer
+limite de resultados.
+
+Todos os produtos são indexados, inclusive os inativos, para que a mesma
+busca sirva à loja (que filtra os ativos) e ao admin. O índice é atualizado a
+cada save/delete de ``Product`` (ver ``ecommerce.signals``) e pode ser
+reconstruído com o comando ``rebuild_product_search_index``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from blog.search import SearchResults
+from blog.text import html_to_text
+
+
+def get_product_document(product):
+    """Campos indexados de um produto: (nome, SKU, descrição curta, descrição)"""
+    return (product.name, product.sku, product.short_description, html_to_text(product.description))
+
+
+def get_search_max_results():
+    return getattr(settings, 'ECOMMERCE_SEARCH_MAX_RESULTS', 1000)
+
+
+def find_sku(query):
+    """Ids dos produtos cujo SKU é exatamente o texto digitado (pelo índice único do SKU)"""
+    from .models import Product
+
+    query = query.strip()
+    if not query:
+        return []
+    return list(Product.objects.filter(sku__in={query, query.upper()}).values_list('pk', flat=True))
+
+
+def sku_order(skus):
+    """0 para os produtos cujo SKU é o texto digitado, 1 para os demais"""
+    return Case(When(pk__in=skus, then=Value(0)), default=Value(1))
+
+
+_fts5_available = None
+
+
+def fts5_available():
+    """Indica se o SQLite em uso foi compilado com FTS5 (verificado uma vez por processo)"""
+    global _fts5_available
+    if _fts5_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            _fts5_available = bool(cursor.fetchone()[0])
+    return _fts5_available
+
+
+class BaseProductSearchBackend:
+    """Interface dos backends de busca de produtos"""
+
+    # Ordem dos resultados de filter_queryset(): SKU exato primeiro, depois a relevância
+    ordering = ('search_sku', 'search_rank')
+
+    def index_product(self, product):
+        """Adiciona/atualiza o produto no índice"""
+        raise NotImplementedError
+
+    def remove_product(self, pk):
+        """Remove o produto do índice"""
+        raise NotImplementedError
+
+    def rebuild(self, queryset):
+        """Recria o índice com os produtos de ``queryset``; retorna quantos foram indexados"""
+        raise NotImplementedError
+
+    def filter_queryset(self, query, queryset):
+        """Restringe ``queryset`` aos produtos encontrados, com as anotações usadas em ``ordering``"""
+        raise NotImplementedError
+
+    def snippets(self, query, pks):
+        return {}
+
+
+class DatabaseProductSearchBackend(BaseProductSearchBackend):
+    """Busca sem índice, com ``icontains`` direto na tabela de produtos"""
+
+    ordering = ('search_sku', '-created_at')
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, pk):
+        pass
+
+    def rebuild(self, queryset):
+        return 0
+
+    def filter_queryset(self, query, queryset):
+        skus = find_sku(query)
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(description__icontains=query) |
+            Q(pk__in=skus)
+        ).annotate(search_sku=sku_order(skus))
+
+
+class SQLiteFTS5ProductSearchBackend(BaseProductSearchBackend):
+    """Busca com a tabela virtual FTS5 do SQLite, ranqueada por BM25"""
+
+    table = 'ecommerce_product_fts'
+    # Pesos do BM25 por coluna: nome > SKU > descrição curta > descrição
+    weights = (10.0, 6.0, 4.0, 1.0)
+
+    def _insert(self, cursor, product):
+        cursor.execute(
+            f'INSERT INTO {self.table} (rowid, name, sku, short_description, description) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [product.pk, *get_product_document(product)]
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [product.pk])
+            self._insert(cursor, product)
+
+    def remove_product(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+    def rebuild(self, queryset):
+        count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for product in queryset.only(
+                'pk', 'name', 'sku', 'short_description', 'description'
+            ).iterator(chunk_size=500):
+                self._insert(cursor, product)
+                count += 1
+        return count
+
+    def build_match(self, query):
+        """Converte o texto digitado em uma expressão MATCH segura (termos com AND, todos como prefixo)"""
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def filter_queryset(self, query, queryset):
+        skus = find_sku(query)
+        match = self.build_match(query)
+        if not match:
+            return queryset.filter(pk__in=skus).annotate(search_sku=sku_order(skus), search_rank=Value(0.0))
+        quote = connection.ops.quote_name
+        opts = queryset.model._meta
+        weights = ', '.join(str(w) for w in self.weights)
+        # Ids encontrados pelo índice, cruzados com os filtros do queryset no próprio
+        # banco; o BM25 é calculado só para as linhas do resultado
+        found = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {quote(opts.db_table)}.{quote(opts.pk.column)}',
+            [match], output_field=FloatField(),
+        )
+        return queryset.filter(Q(pk__in=found) | Q(pk__in=skus)).annotate(
+            search_sku=sku_order(skus), search_rank=rank,
+        )
+
+
+def get_product_search_backend():
+    """Retorna o backend de busca de produtos configurado"""
+    path = getattr(settings, 'ECOMMERCE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite' and fts5_available():
+        return SQLiteFTS5ProductSearchBackend()
+    return DatabaseProductSearchBackend()
+
+
+def search_product_ids(query, queryset, limit=None, backend=None):
+    """Ids ranqueados dos produtos de ``queryset`` encontrados, até ``limit``"""
+    backend = backend or get_product_search_backend()
+    pks = backend.filter_queryset(query, queryset).order_by(*backend.ordering, 'pk').values_list('pk', flat=True)
+    return list(pks[:limit or get_search_max_results()])
+
+
+class ProductSearchResults(SearchResults):
+    """
+    Produtos encontrados em ``queryset`` (já filtrado), na ordem do ranking.
+
+    Como ``blog.search.SearchResults``: só os produtos da fatia exibida são
+    carregados.
+    """
+
+    def __init__(self, query, queryset, limit=None):
+        self.query = query
+        self.queryset = queryset
+        self.backend = get_product_search_backend()
+        self.pks = search_product_ids(query, queryset, limit, self.backend)
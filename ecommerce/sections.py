@@ -0,0 +1,31 @@
+"""
+Dados das seções ``products`` do construtor de páginas (ver ``blog.sections``).
+"""
+from collections import defaultdict
+
+from .models import Product
+
+
+def get_section_products(sections):
+    """
+    Retorna {section.pk: {'products': [...]}} para as seções de produtos.
+
+    Seções com a mesma categoria e o mesmo filtro de destaque compartilham uma
+    única consulta, limitada ao maior ``items_limit`` entre elas.
+    """
+    groups = defaultdict(list)
+    for section in sections:
+        groups[(section.products_category, section.products_featured)].append(section)
+
+    data = {}
+    for (category_slug, featured), group in groups.items():
+        products = Product.objects.filter(is_active=True)
+        if category_slug:
+            products = products.filter(category__slug=category_slug)
+        if featured:
+            products = products.filter(is_featured=True)
+        limit = max(section.items_limit for section in group)
+        products = list(products.defer('description').order_by('-created_at')[:limit])
+        for section in group:
+            data[section.pk] = {'products': products[:section.items_limit]}
+    return data
@@ -0,0 +1,104 @@
+"""
+Signals do e-commerce.
+
+Mantêm as contagens dos filtros do catálogo (``ecommerce.catalog``), o
+índice de busca de produtos (``ecommerce.search``), as reservas de estoque
+(``ecommerce.reservations``) e os totais dos carrinhos (``ecommerce.counters``)
+em dia com produtos, categorias e carrinhos.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .catalog import (
+    FACET_CATEGORY, get_facet_values, get_product_facets, get_stored_facet_values,
+    rebuild_facet_counts, update_facet_counts,
+)
+from .counters import recount_carts
+from .models import Cart, CartItem, Product, ProductCategory
+from .reservations import release_cart
+from .search import get_product_search_backend
+
+
+def remember_product_facets(sender, instance, raw=False, **kwargs):
+    """Guarda os filtros em que o produto estava antes de ser salvo"""
+    instance._old_facets = set() if raw else get_product_facets(get_stored_facet_values(instance.pk))
+
+
+def update_product_facets(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_facet_counts(getattr(instance, '_old_facets', set()), get_product_facets(get_facet_values(instance)))
+    instance._old_facets = set()
+
+
+def remove_product_facets(sender, instance, **kwargs):
+    update_facet_counts(get_product_facets(get_facet_values(instance)), set())
+
+
+pre_save.connect(remember_product_facets, sender=Product)
+post_save.connect(update_product_facets, sender=Product)
+post_delete.connect(remove_product_facets, sender=Product)
+
+
+def update_product_search_index(sender, instance, raw=False, **kwargs):
+    """Mantém o índice de busca em dia com o produto salvo"""
+    if not raw:
+        get_product_search_backend().index_product(instance)
+
+
+def remove_from_product_search_index(sender, instance, **kwargs):
+    get_product_search_backend().remove_product(instance.pk)
+
+
+post_save.connect(update_product_search_index, sender=Product)
+post_delete.connect(remove_from_product_search_index, sender=Product)
+
+
+def remember_category_parent(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        instance._old_parent_id = sender.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+
+
+def recount_moved_category(sender, instance, created, raw=False, **kwargs):
+    """Uma categoria que mudou de pai leva seus produtos para as contagens das novas categorias acima"""
+    if created or raw:
+        return
+    if getattr(instance, '_old_parent_id', instance.parent_id) != instance.parent_id:
+        rebuild_facet_counts([FACET_CATEGORY])
+    instance._old_parent_id = instance.parent_id
+
+
+def recount_deleted_category(sender, instance, **kwargs):
+    # Os produtos da categoria excluída ficam sem categoria (SET_NULL, sem signals)
+    rebuild_facet_counts([FACET_CATEGORY])
+
+
+pre_save.connect(remember_category_parent, sender=ProductCategory)
+post_save.connect(recount_moved_category, sender=ProductCategory)
+post_delete.connect(recount_deleted_category, sender=ProductCategory)
+
+
+def release_cart_reservations(sender, instance, **kwargs):
+    """Devolve ao estoque as reservas de um carrinho excluído (a cascata não passa pelos contadores)"""
+    release_cart(instance)
+
+
+pre_delete.connect(release_cart_reservations, sender=Cart)
+
+
+def remember_item_cart(sender, instance, raw=False, **kwargs):
+    """Guarda o carrinho anterior do item, caso ele mude de carrinho"""
+    instance._old_cart_id = None
+    if instance.pk is not None and not raw:
+        instance._old_cart_id = sender.objects.filter(pk=instance.pk).values_list('cart_id', flat=True).first()
+
+
+def recount_item_cart(sender, instance, raw=False, **kwargs):
+    """Recalcula os totais do carrinho do item criado, alterado ou excluído"""
+    if raw:
+        return
+    recount_carts([instance.cart_id, getattr(instance, '_old_cart_id', None)])
+
+
+pre_save.connect(remember_item_cart, sender=CartItem)
+post_save.connect(recount_item_cart, sender=CartItem)
+post_delete.connect(recount_item_cart, sender=CartItem)
@@ -1,3 +1,164 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .checkout import CheckoutError, decrement_stock, place_order
+from .models import Cart, CartItem, Order, OrderItem, Product, StockReservation
+from .reservations import release_expired_reservations, reserve
+
+
+class EcommerceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'senha')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def create_product(self, sku, stock_quantity, **kwargs):
+        return Product.objects.create(
+            name=f'Produto {sku}', slug=sku.lower(), sku=sku, description='Descrição',
+            price=Decimal('10.00'), stock_quantity=stock_quantity, **kwargs
+        )
+
+    def add_item(self, product, quantity, cart=None):
+        return CartItem.objects.create(cart=cart or self.cart, product=product, quantity=quantity, price=product.price)
+
+    def get_stock(self, product):
+        product.refresh_from_db()
+        return product.stock_quantity, product.reserved_quantity
+
+
+class PlaceOrderTests(EcommerceTestCase):
+    def test_place_order_decrements_stock_and_closes_cart(self):
+        first = self.create_product('A-1', 5)
+        second = self.create_product('B-1', 3)
+        self.add_item(first, 2)
+        self.add_item(second, 3)
+
+        order = place_order(self.cart, self.user)
+
+        self.assertEqual(self.get_stock(first), (3, 0))
+        self.assertEqual(self.get_stock(second), (0, 0))
+        self.assertEqual(order.subtotal, Decimal('50.00'))
+        self.assertEqual(
+            sorted(OrderItem.objects.filter(order=order).values_list('product_sku', 'quantity', 'total_price')),
+            [('A-1', 2, Decimal('20.00')), ('B-1', 3, Decimal('30.00'))],
+        )
+        self.cart.refresh_from_db()
+        self.assertFalse(self.cart.is_active)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_one_failing_item_rolls_back_the_whole_order(self):
+        available = self.create_product('A-1', 5)
+        short = self.create_product('B-1', 1)
+        self.add_item(available, 2)
+        self.add_item(short, 2)
+
+        with self.assertRaises(CheckoutError) as raised:
+            place_order(self.cart, self.user)
+
+        self.assertEqual([item.product_id for item in raised.exception.items], [short.pk])
+        # A baixa do primeiro produto também foi desfeita
+        self.assertEqual(self.get_stock(available), (5, 0))
+        self.assertEqual(self.get_stock(short), (1, 0))
+        self.assertFalse(Order.objects.exists())
+        self.cart.refresh_from_db()
+        self.assertTrue(self.cart.is_active)
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_inactive_product_fails_checkout(self):
+        product = self.create_product('A-1', 5, is_active=False)
+        self.add_item(product, 1)
+
+        with self.assertRaises(CheckoutError):
+            place_order(self.cart, self.user)
+        self.assertEqual(self.get_stock(product), (5, 0))
+
+    def test_empty_cart_is_refused(self):
+        with self.assertRaises(ValueError):
+            place_order(self.cart, self.user)
+
+
+class DecrementStockTests(EcommerceTestCase):
+    """Limite do UPDATE condicional: ``stock_quantity >= reserved - held + n``"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_cart = Cart.objects.create(user=self.user, session_key='outro')
+        # 5 em estoque, 2 reservadas por este carrinho e 1 por outro
+        self.product = self.create_product('A-1', 5)
+        Product.objects.filter(pk=self.product.pk).update(reserved_quantity=3)
+
+    def test_exactly_available_units_are_sold(self):
+        # 5 >= 3 - 2 + 4
+        failed = decrement_stock([self.add_item(self.product, 4)], reserved={self.product.pk: 2})
+        self.assertEqual(failed, [])
+        self.assertEqual(self.get_stock(self.product), (1, 1))
+
+    def test_one_unit_over_available_is_refused(self):
+        # 5 < 3 - 2 + 5: a unidade reservada pelo outro carrinho não pode ser vendida
+        item = self.add_item(self.product, 5)
+        self.assertEqual(decrement_stock([item], reserved={self.product.pk: 2}), [item])
+        self.assertEqual(self.get_stock(self.product), (5, 3))
+
+    def test_reservations_of_other_carts_are_not_available(self):
+        # Sem reservas próprias: 5 >= 3 + 2, mas 5 < 3 + 3
+        self.assertEqual(decrement_stock([self.add_item(self.product, 2)]), [])
+        self.assertEqual(self.get_stock(self.product), (3, 3))
+        item = self.add_item(self.product, 1, cart=self.other_cart)
+        self.assertEqual(decrement_stock([item]), [item])
+
+
+class ReservationTests(EcommerceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_cart = Cart.objects.create(user=self.user, session_key='outro')
+        self.product = self.create_product('A-1', 3)
+
+    def expire(self, cart):
+        StockReservation.objects.filter(cart=cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_reserve_is_refused_without_available_stock(self):
+        self.assertTrue(reserve(self.other_cart, self.product, 2))
+        self.assertFalse(reserve(self.cart, self.product, 2))
+        self.assertEqual(self.get_stock(self.product), (3, 2))
+        self.assertFalse(StockReservation.objects.filter(cart=self.cart).exists())
+        # Reduzir a própria reserva é sempre aceito
+        self.assertTrue(reserve(self.other_cart, self.product, 1))
+        self.assertEqual(self.get_stock(self.product), (3, 1))
+
+    def test_refused_reserve_releases_expired_reservations_and_retries(self):
+        self.assertTrue(reserve(self.other_cart, self.product, 3))
+        self.expire(self.other_cart)
+
+        self.assertTrue(reserve(self.cart, self.product, 2))
+        self.assertEqual(self.get_stock(self.product), (3, 2))
+        self.assertEqual(
+            list(StockReservation.objects.values_list('cart_id', 'quantity')),
+            [(self.cart.pk, 2)],
+        )
+
+    def test_retry_is_refused_when_unexpired_reservations_hold_the_stock(self):
+        self.assertTrue(reserve(self.other_cart, self.product, 3))
+        self.assertFalse(reserve(self.cart, self.product, 1))
+        self.assertEqual(self.get_stock(self.product), (3, 3))
+
+    def test_release_expired_reservations_in_batches(self):
+        carts = [Cart.objects.create(user=self.user, session_key=f'carrinho-{n}') for n in range(5)]
+        second = self.create_product('B-1', 10)
+        for cart in carts:
+            self.assertTrue(reserve(cart, second, 2))
+        for cart in carts[:4]:
+            self.expire(cart)
 
-# Create your tests here.
+        # 4 vencidas em lotes de 3: duas passadas, a última incompleta encerra o laço
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(release_expired_reservations(batch_size=3), 4)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 2)
+        self.assertEqual(self.get_stock(second), (10, 2))
+        self.assertEqual(list(StockReservation.objects.values_list('cart_id', flat=True)), [carts[4].pk])
+        self.assertEqual(release_expired_reservations(batch_size=3), 0)
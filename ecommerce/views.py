@@ -1,47 +1,80 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import Max
+from blog.conditional import conditional_page, latest
+from blog.page_cache import get_tag_versions
+from blog.view_counter import record_view
+from .catalog import Catalog
+from .checkout import CheckoutError, place_order
 from .models import Product, ProductCategory, Cart, CartItem, Order
+from .reservations import release, reserve
 
 
-def product_list(request):
-    """Lista de produtos"""
-    products = Product.objects.filter(is_active=True).select_related('category').order_by('-created_at')
+def get_catalog_state():
+    """
+    Estado das listagens de produtos para o GET condicional.
 
-    # Busca
-    search_query = request.GET.get('q')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(short_description__icontains=search_query)
-        )
+    Usa só a versão da etiqueta ``products`` do cache de páginas (alterada a
+    cada save/delete de produto ou categoria e a cada pedido fechado), sem
+    consultar o banco; por isso essas listagens respondem só com ``ETag``.
+    """
+    return None, get_tag_versions(['products'])
+
+
+def get_product_list_state(request):
+    # A busca e o filtro estão na query string, que já faz parte do ETag
+    return get_catalog_state()
+
+
+def get_product_state(request, slug):
+    # reserved_quantity: o disponível exibido muda com as reservas dos carrinhos
+    row = Product.objects.filter(slug=slug, is_active=True).values_list(
+        'pk', 'updated_at', 'category_id', 'reserved_quantity'
+    ).first()
+    if row is None:
+        return None
+    # Produtos relacionados: os ativos da mesma categoria
+    related = Product.objects.filter(category_id=row[2], is_active=True).aggregate(last=Max('updated_at'))
+    return latest(row[1], related['last']), (row, related['last'])
 
-    # Filtro por categoria
-    category_slug = request.GET.get('categoria')
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
 
-    # Categorias para o filtro
-    categories = ProductCategory.objects.filter(is_active=True)
+def record_product_revalidation(request, state):
+    # Uma revalidação também é uma visualização
+    record_view(Product(pk=state[1][0][0]))
+
+
+def get_category_products_state(request, slug):
+    # Categoria inexistente: a view responde 404, que nunca leva validadores
+    return get_catalog_state()
+
+
+@conditional_page(get_product_list_state)
+def product_list(request):
+    """Lista de produtos, paginada e com filtros (ver ecommerce/catalog.py)"""
+    search_query = request.GET.get('q')
+    catalog = Catalog(request.GET, search_query=search_query)
+    page_obj = catalog.paginate(request.GET.get('page'))
 
     context = {
-        'products': products,
-        'categories': categories,
+        'products': page_obj,
+        'page_obj': page_obj,
+        'catalog': catalog,
+        'facets': catalog.get_facets(),
+        'page_query': catalog.get_query(),
         'search_query': search_query,
     }
 
     return render(request, 'ecommerce/product_list.html', context)
 
 
+@conditional_page(get_product_state, not_modified=record_product_revalidation)
 def product_detail(request, slug):
     """Detalhes de um produto"""
     product = get_object_or_404(Product, slug=slug, is_active=True)
 
-    # Incrementar visualizações
-    product.views += 1
-    product.save(update_fields=['views'])
+    # Incrementar visualizações (gravadas em lote, ver blog.view_counter)
+    record_view(product)
 
     # Produtos relacionados (mesma categoria)
     related_products = Product.objects.filter(
@@ -57,17 +90,19 @@ def product_detail(request, slug):
     return render(request, 'ecommerce/product_detail.html', context)
 
 
+@conditional_page(get_category_products_state)
 def category_products(request, slug):
     """Produtos de uma categoria"""
     category = get_object_or_404(ProductCategory, slug=slug, is_active=True)
-    products = Product.objects.filter(
-        category=category,
-        is_active=True
-    ).order_by('-created_at')
+    # Inclui os produtos das subcategorias
+    catalog = Catalog(request.GET, category=category)
+    page_obj = catalog.paginate(request.GET.get('page'))
 
     context = {
         'category': category,
-        'products': products,
+        'products': page_obj,
+        'page_obj': page_obj,
+        'page_query': catalog.get_query(),
     }
 
     return render(request, 'ecommerce/category_products.html', context)
@@ -92,31 +127,26 @@ def add_to_cart(request, product_id):
     """Adicionar produto ao carrinho"""
     product = get_object_or_404(Product, id=product_id, is_active=True)
 
-    # Verificar estoque
-    if product.stock_quantity <= 0:
-        messages.error(request, 'Produto sem estoque disponível.')
-        return redirect('ecommerce:product_detail', slug=product.slug)
-
     # Obter ou criar carrinho
     cart, created = Cart.objects.get_or_create(user=request.user, is_active=True)
+    cart_item = CartItem.objects.filter(cart=cart, product=product).first()
+    quantity = cart_item.quantity + 1 if cart_item else 1
 
-    # Obter ou criar item no carrinho
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1, 'price': product.price}
-    )
+    # Reservar as unidades por um tempo (ver ecommerce/reservations.py)
+    if not reserve(cart, product, quantity):
+        if cart_item:
+            messages.warning(request, 'Quantidade máxima em estoque atingida.')
+            return redirect('ecommerce:cart_view')
+        messages.error(request, 'Produto sem estoque disponível.')
+        return redirect('ecommerce:product_detail', slug=product.slug)
 
-    if not created:
+    if cart_item:
         # Se já existe, incrementar quantidade
-        if cart_item.quantity < product.stock_quantity:
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, f'{product.name} adicionado ao carrinho!')
-        else:
-            messages.warning(request, 'Quantidade máxima em estoque atingida.')
+        cart_item.quantity = quantity
+        cart_item.save()
     else:
-        messages.success(request, f'{product.name} adicionado ao carrinho!')
+        CartItem.objects.create(cart=cart, product=product, quantity=1, price=product.price)
+    messages.success(request, f'{product.name} adicionado ao carrinho!')
 
     return redirect('ecommerce:cart_view')
 
@@ -124,8 +154,9 @@ def add_to_cart(request, product_id):
 @login_required
 def remove_from_cart(request, item_id):
     """Remover item do carrinho"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    cart_item = get_object_or_404(CartItem.objects.select_related('cart', 'product'), id=item_id, cart__user=request.user)
     product_name = cart_item.product.name
+    release(cart_item.cart, cart_item.product)
     cart_item.delete()
 
     messages.success(request, f'{product_name} removido do carrinho.')
@@ -136,13 +167,14 @@ def remove_from_cart(request, item_id):
 def update_cart_item(request, item_id):
     """Atualizar quantidade de item no carrinho"""
     if request.method == 'POST':
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        cart_item = get_object_or_404(CartItem.objects.select_related('cart', 'product'), id=item_id, cart__user=request.user)
         quantity = int(request.POST.get('quantity', 1))
 
         if quantity <= 0:
+            release(cart_item.cart, cart_item.product)
             cart_item.delete()
             messages.success(request, 'Item removido do carrinho.')
-        elif quantity <= cart_item.product.stock_quantity:
+        elif reserve(cart_item.cart, cart_item.product, quantity):
             cart_item.quantity = quantity
             cart_item.save()
             messages.success(request, 'Carrinho atualizado.')
@@ -163,31 +195,17 @@ def checkout(request):
         return redirect('ecommerce:product_list')
 
     if request.method == 'POST':
-        # Criar pedido
-        order = Order.objects.create(
-            user=request.user,
-            total=cart.get_total(),
-            status='pending',
-            payment_status='pending'
-        )
-
-        # Adicionar itens do carrinho ao pedido
-        for cart_item in cart_items:
-            order.items.create(
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.price
-            )
-
-            # Atualizar estoque
-            product = cart_item.product
-            product.stock_quantity -= cart_item.quantity
-            product.save()
-
-        # Limpar carrinho
-        cart_items.delete()
-        cart.is_active = False
-        cart.save()
+        # Pedido, itens e baixa de estoque em uma única transação (ver ecommerce/checkout.py)
+        try:
+            order = place_order(cart, request.user)
+        except CheckoutError as e:
+            for item in e.items:
+                messages.error(request, f'Estoque insuficiente para {item.product.name}.')
+            return redirect('ecommerce:cart_view')
+        except ValueError:
+            # Carrinho esvaziado por outra requisição (ex.: clique duplo)
+            messages.warning(request, 'Seu carrinho está vazio.')
+            return redirect('ecommerce:product_list')
 
         messages.success(request, 'Pedido realizado com sucesso!')
         return redirect('ecommerce:order_success', order_id=order.id)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
@@ -137,6 +138,11 @@ class Message(models.Model):
         verbose_name = _('Mensagem')
         verbose_name_plural = _('Mensagens')
         ordering = ['created_at']
+        indexes = [
+            # Mensagens de uma conversa em ordem e contagem das não lidas
+            models.Index(fields=['conversation', 'created_at'], name='messaging_message_conv_idx'),
+            models.Index(fields=['conversation', 'sender'], condition=Q(is_read=False), name='messaging_message_unread_idx'),
+        ]
 
     def __str__(self):
         preview = self.content[:50]
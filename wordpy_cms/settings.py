@@ -137,6 +137,10 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # CKEditor Settings
 CKEDITOR_UPLOAD_PATH = 'uploads/'
+# Uploads do editor deduplicados pelo conteúdo (ver blog/storage.py)
+CKEDITOR_STORAGE_BACKEND = 'blog.storage.CKEditorContentAddressedStorage'
+# Blobs sem referências mais novos que isto (segundos) ficam para o comando collect_blobs
+BLOB_COLLECT_GRACE_PERIOD = 5 * 60
 CKEDITOR_IMAGE_BACKEND = 'pillow'
 CKEDITOR_CONFIGS = {
     'default': {
@@ -146,6 +150,69 @@ CKEDITOR_CONFIGS = {
     },
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Em produção com vários workers, use um backend compartilhado (Redis/Memcached)
+# para que as invalidações feitas por um processo valham para todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'wordpy-cms',
+    }
+}
+
+# Tempo de vida (segundos) do contexto global do site em cache
+BLOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Tempo de vida (segundos) das páginas em cache para visitantes anônimos
+# (invalidadas antes disso quando um objeto do qual dependem é alterado)
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Intervalo (segundos) para gravar no banco os contadores de visualização
+# acumulados no cache (ver blog/view_counter.py e o comando flush_view_counts)
+VIEW_COUNT_FLUSH_INTERVAL = 60
+
+# Busca de posts (ver blog/search.py). Se vazio, usa FTS5 no SQLite e
+# icontains nos demais bancos.
+BLOG_SEARCH_BACKEND = None
+BLOG_SEARCH_MAX_RESULTS = 1000
+
+# Última página das listagens acessível por número (?page=N); depois dela a
+# navegação segue por cursor (ver blog/pagination.py)
+BLOG_MAX_OFFSET_PAGE = 20
+
+# Posts relacionados guardados e exibidos por post (ver blog/related.py).
+# Recalculados com: python manage.py compute_related_posts
+BLOG_RELATED_POSTS = 3
+
+# Versões responsivas das imagens enviadas (ver blog/images.py).
+# Com RESPONSIVE_IMAGE_WORKERS = 0 as versões são geradas na própria requisição.
+RESPONSIVE_IMAGE_WIDTHS = [320, 640, 960, 1280]
+RESPONSIVE_IMAGE_FORMATS = ['webp', 'jpeg']
+RESPONSIVE_IMAGE_QUALITY = 80
+RESPONSIVE_IMAGE_WORKERS = 2
+
+# Diretório do site estático gerado por: python manage.py export_static
+# (ver blog/static_export.py)
+STATIC_EXPORT_ROOT = BASE_DIR / 'static_export'
+
+# Catálogo de produtos (ver ecommerce/catalog.py): produtos por página e limites
+# das faixas de preço do filtro. Ao mudar as faixas, recalcule as contagens com:
+# python manage.py rebuild_catalog_facets
+ECOMMERCE_PRODUCTS_PER_PAGE = 24
+ECOMMERCE_PRICE_BANDS = [50, 100, 200, 500]
+
+# Busca de produtos (ver ecommerce/search.py). Se vazio, usa FTS5 no SQLite e
+# icontains nos demais bancos.
+ECOMMERCE_SEARCH_BACKEND = None
+ECOMMERCE_SEARCH_MAX_RESULTS = 1000
+
+# Tempo (segundos) que as unidades adicionadas ao carrinho ficam reservadas
+# (ver ecommerce/reservations.py). As vencidas são devolvidas por:
+# python manage.py release_expired_reservations --loop
+ECOMMERCE_RESERVATION_TTL = 15 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 